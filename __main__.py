@@ -1,5 +1,6 @@
 import club_sandwich
 from tools.prompts import p_choice
+from tools import benchmark
 
 def main() -> None:
     """
@@ -7,9 +8,13 @@ def main() -> None:
     """
     programs = (
         ('Create schedule'                      , club_sandwich.create_schedule),
+        ('Create schedule (instrumented)'       , club_sandwich.create_schedule_instrumented),
+        ('Create schedule (profiled)'           , club_sandwich.create_schedule_profiled),
+        ('Create schedule (traced)'             , club_sandwich.create_schedule_traced),
         ('Pre-process votes'                    , club_sandwich.process_votes_only),
         ('Print input specifications'           , club_sandwich.print_input_specs),
         ('Resave reports to refresh formatting' , club_sandwich.resave_all_reports),
+        ('Run benchmarks'                       , benchmark.track_benchmarks),
     )
 
     while True:
@@ -0,0 +1,202 @@
+"""
+Upper bounds on what the distributions of the worlds of a school can achieve,
+cheap enough to compute before searching, so that the best score found can
+be reported along with how far it could at most be from the best possible.
+
+The bound on the score is over all worlds of the school (see score_bound),
+from maximum flows (see flow.py) through relaxations of the distribution
+with no days at all: each club can take as many places as its most
+instances have, on whatever days. Its percentages have denominators that
+depend on the distribution, so only the terms that can be bounded soundly
+are: the 1st choice % (the students who always try their 1st choice are
+known beforehand), the unchosen penalties (the days no choice or preselect
+can fill), and the range penalty (the clubs must take every student on every
+available day). The other terms are taken at their best (100% of each
+choice, no mixedness penalties), so the bound is loose: real schools' best
+scores are often 60-80% below it. The gap to it (see optimality_gap) is a
+guarantee, but only an upper limit on how far a score is from the best
+possible, mostly useful as a report.
+Students with the same part in a relaxation are one node, with their
+capacities multiplied (see School.group_students).
+"""
+from __future__ import annotations
+
+from flow import FlowNetwork
+from report import CHOICE_WEIGHTS, RANGE_WEIGHT, UNCHOSEN_WEIGHTS
+import week
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from club import Club
+    from school import School
+    from student import Student
+
+def club_places(school: School, club: Club) -> int:
+    """
+    Return the most student days the given club can take in any world: its
+    places in as many instances as it can run, and any preselects forced into
+    it beyond them.
+    """
+    n_instances = min(club.max_instances, (club.max_instances_per_day * week.N_DAYS_IN[club.pre_days]) // club.days_per_instance)
+    places = club.upper * club.days_per_instance * int(n_instances)
+    for preselects in school.preselects.values():
+        for (club_code, n_times, _, _, force) in preselects:
+            if force and (club_code == club.code):
+                places += club.days_per_instance * n_times
+    return places
+
+def _add_clubs(network: FlowNetwork, school: School, sink: int) -> list[int]:
+    """
+    Add a node for each club of the school to the given network, with an edge
+    to the sink for its places (see club_places), and return them by club id.
+    """
+    nodes = [-1] * len(school.club_list)
+    for club in school.clubs.values():
+        nodes[club.id] = network.add_node()
+        network.add_edge(nodes[club.id], sink, club_places(school, club))
+    return nodes
+
+def _wanted_key(student: Student) -> tuple[tuple[int], tuple[tuple[int, int]], int]:
+    """
+    Return what a student's part in the unchosen days bound depends on: their
+    choices and preselects (by club id), and how many days they are available.
+    """
+    return (tuple(sorted(student.choice_ids.values())), tuple(sorted(student.pre_ids.items())), week.N_DAYS_IN[student.days_unavailable])
+
+def unchosen_days_bound(school: School) -> int:
+    """
+    Return a lower bound on the days students spend in clubs they did not
+    choose (nor were preselected for), in any distribution of any world of
+    the school: their available days, less the most days their choices and
+    preselects can fill, by maximum flow from students to clubs.
+    """
+    network = FlowNetwork(2)
+    (source, sink) = (0, 1)
+    clubs = _add_clubs(network, school, sink)
+    club_list = school.club_list
+
+    n_available = 0
+    for members in school.group_students(_wanted_key):
+        (choice_ids, pre_ids, n_days_unavailable) = _wanted_key(members[0])
+        n_days = (week.N_DAYS - n_days_unavailable) * len(members)
+        n_available += n_days
+
+        # A club chosen more than once counts once for each choice
+        wanted = {}
+        for club_id in choice_ids:
+            wanted[club_id] = wanted.get(club_id, 0) + club_list[club_id].days_per_instance
+        for (club_id, n_times) in pre_ids:
+            wanted[club_id] = wanted.get(club_id, 0) + club_list[club_id].days_per_instance * n_times
+
+        student = network.add_node()
+        network.add_edge(source, student, n_days)
+        for (club_id, n) in wanted.items():
+            network.add_edge(student, clubs[club_id], n * len(members))
+
+    return n_available - network.max_flow(source, sink)
+
+def _first_choice_key(student: Student) -> tuple[int|None, bool]:
+    """
+    Return what a student's part in the 1st choice bound depends on: their
+    1st choice (by club id, if they have one), and whether they always try
+    it (see first_choice_bound).
+    """
+    return (student.choice_ids.get(1), (not student.pre_ids) and (student.days_unavailable != week.ALL_DAYS))
+
+def first_choice_bound(school: School) -> float:
+    """
+    Return an upper bound on the % of students who get their 1st choice if
+    it was needed (see Report), in any distribution of any world of the school.
+
+    Students without preselects and with a day available always try their
+    1st choice first, so always count in the denominator; at most as many
+    of their days as the maximum flow into their 1st choices are gotten.
+    The others may or may not count; the % is highest if they all do, and
+    all get it.
+    """
+    network = FlowNetwork(2)
+    (source, sink) = (0, 1)
+    clubs = _add_clubs(network, school, sink)
+
+    (n_certain, n_others) = (0, 0)
+    for members in school.group_students(_first_choice_key):
+        (club_id, certain) = _first_choice_key(members[0])
+        if club_id is None:
+            continue
+        n_days = school.club_list[club_id].days_per_instance * len(members)
+        if certain:
+            n_certain += n_days
+            network.add_edge(source, clubs[club_id], n_days)
+        else:
+            n_others += n_days
+
+    if not (n_certain + n_others):
+        return 100.0
+    return (network.max_flow(source, sink) + n_others) / (n_certain + n_others) * 100
+
+def _fewest_instances(school: School, choice_ids: tuple[int], pre_ids: tuple[tuple[int, int]], n_days: int) -> int:
+    """
+    Return the fewest club instances a student with the given choices and
+    preselects (by club id) can fill their given number of days with: the
+    longest of their clubs first, each once per choice or preselect, and
+    Study Halls (see World.distribute_leftovers) for the rest.
+    """
+    club_list = school.club_list
+    lengths = [club_list[club_id].days_per_instance for club_id in choice_ids]
+    lengths += [club_list[club_id].days_per_instance for (club_id, n_times) in pre_ids for _ in range(n_times)]
+
+    n_instances = 0
+    for length in sorted(lengths, reverse=True):
+        if n_days <= 0:
+            break
+        n_days -= length
+        n_instances += 1
+
+    study_hall = school.clubs.get('Study Hall')
+    longest = study_hall.days_per_instance if study_hall is not None else max(club.days_per_instance for club in club_list)
+    return n_instances + max(0, -(-n_days // longest))
+
+def range_bound(school: School) -> int:
+    """
+    Return a lower bound on the range of students in clubs (see Report), in
+    any distribution of any world of the school.
+
+    The upper clubs average at least as many students as all clubs do, and
+    every student is in enough instances to fill their available days. The
+    lower clubs average at most as many as the clubs with the fewest places.
+    """
+    clubs = list(school.clubs.values())
+    n_sample = len(clubs) // 10
+    if not n_sample:
+        return 0
+
+    n_members = 0
+    for members in school.group_students(_wanted_key):
+        (choice_ids, pre_ids, n_days_unavailable) = _wanted_key(members[0])
+        n_members += _fewest_instances(school, choice_ids, pre_ids, week.N_DAYS - n_days_unavailable) * len(members)
+
+    most = sorted(club_places(school, club) // club.days_per_instance for club in clubs)
+    return max(0, n_members // len(clubs) - sum(most[:n_sample]) // n_sample)
+
+def score_bound(school: School) -> int:
+    """
+    Return an upper bound on the score of any distribution of any world of
+    the given school (see module docs).
+    """
+    bound = CHOICE_WEIGHTS[0] * first_choice_bound(school) + sum(CHOICE_WEIGHTS[1:]) * 100
+
+    # Each student's unchosen days cost the least per day in the cheapest
+    # number of them, as a % of all students' days
+    cost_per_day = min(UNCHOSEN_WEIGHTS[min(n, len(UNCHOSEN_WEIGHTS)) - 1] / n for n in range(1, week.N_DAYS + 1))
+    bound -= cost_per_day * unchosen_days_bound(school) / (week.N_DAYS * len(school.student_list)) * 100
+
+    bound -= RANGE_WEIGHT * range_bound(school) ** 2
+
+    return int(bound)
+
+def optimality_gap(score: int, bound: int) -> float:
+    """
+    Return the gap between the given score and the bound on it, as a share
+    of the bound (0 if the score reaches it).
+    """
+    return max(0, bound - score) / abs(bound) if bound else 0.0
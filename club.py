@@ -1,10 +1,11 @@
 from __future__ import annotations
-import itertools
 from math import inf
 import math
 import random
 from club_instance import ClubInstance
 from teacher import Teacher
+from instrumentation import INSTRUMENTATION
+import week
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -13,7 +14,8 @@ if TYPE_CHECKING:
 
 class Club:
     """
-    Represents a club option. Identified by a code. May have a teacher set.
+    Represents a club option. Identified by a code, and by a dense integer id
+    once the school has assigned ids. May have a teacher set.
 
     The pre-chosen options for days, minimum and maximum number of instances
     (groups of students), number of days each instance requires, and maximum
@@ -29,11 +31,18 @@ class Club:
     A club has a repulsion factor pairwise with every other club. This number
     represents how often it is co-chosen with the other club, and hence how
     much it should be "repelled" from appearing on the same day as the other,
-    lest a student only be able to get into one.
+    lest a student only be able to get into one. Repulsions are kept in a list
+    indexed by the other club's id.
+
+    Sets of days (pre-chosen, available, taken, and each instance's) are
+    bitmasks (see week.py); days used are counted in a day-indexed list.
+
+    Instances are kept in a list, in key order. Students placed in this club
+    (and students excluded from it) are tracked by id.
     """
     __slots__ = (
         'school',
-        'code', 'teacher',
+        'id', 'code', 'teacher',
         'min_instances', 'max_instances', 'days_per_instance', 'max_instances_per_day',
         'decided_instances',
         'pre_days', 'days_used_counts',
@@ -41,13 +50,14 @@ class Club:
         'instances', 'votes',
         'grades', 'genders',
         'prelist', 'priority_list', 'whitelist', 'blacklist',
-        'closed', 'excluded_students',
-        'repulsions')
+        'closed', 'excluded_students', 'exclusive_clubs',
+        'repulsions', 'total_repulsion')
 
     school: School
+    id: int
     code: str
     teacher: Teacher|None
-    pre_days: set[int]
+    pre_days: int
     votes: dict[int|str, int]
     lower: int
     upper: int
@@ -56,33 +66,41 @@ class Club:
     days_per_instance: int
     max_instances_per_day: int
     decided_instances: int|None
-    instances: dict[str, ClubInstance]
-    days_used_counts: dict[int, int]
+    instances: list[ClubInstance]
+    days_used_counts: list[int]
     grades: set[int]
     genders: set[str]
     prelist: set[str]
     whitelist: set[str]
     blacklist: set[str]
-    excluded_students: set[str]
+    excluded_students: set[int]
+    exclusive_clubs: list[Club]
     priority_list: set[str]
     closed: bool
-    repulsions: dict[str, int]
+    repulsions: list[int]
+    total_repulsion: int
     
-    def __init__(self: Club, school: School, code: str) -> None:
-        """Initialize this Club. Leave metadata empty for now."""
+    def __init__(self: Club, school: School, id: int, code: str) -> None:
+        """
+        Initialize this Club. Leave metadata empty for now.
+        The id is provisional until the school assigns ids.
+        """
         self.school = school
+        self.id = id
         self.code = code
-        self.excluded_students = {}
-        self.repulsions = {}
-        self.instances = {}
-        self.days_used_counts = {}
+        self.excluded_students = set()
+        self.exclusive_clubs = []
+        self.repulsions = []
+        self.total_repulsion = 0
+        self.instances = []
+        self.days_used_counts = [0] * week.N_DAYS
 
         # Meta to be set later
         self.teacher = None
         self.lower = 6
         self.upper = 30
         self.prelist = set()
-        self.pre_days = set()
+        self.pre_days = 0
         self.min_instances = 1
         self.max_instances = inf
         self.days_per_instance = 1
@@ -95,17 +113,27 @@ class Club:
         self.priority_list = set()
         self.closed = False
 
-    def add_pre_vote(self: Club) -> None:
-        """Register the fact that this club was pre-selected for a student."""
-        self.votes['pre'] += 1
-        self.votes['weighted'] += 5
+    def __getstate__(self: Club) -> tuple[None, dict[str, object]]:
+        """
+        Return this club's state for pickling. Repulsions shared by the school
+        (see problem.py) are left out; the school points the club at them.
+        """
+        state = {slot: getattr(self, slot) for slot in self.__slots__ if hasattr(self, slot)}
+        if self.school.shared is not None:
+            state['repulsions'] = None
+        return (None, state)
 
-    def add_vote(self: Club, key: int) -> None:
-        """Register the fact that this club was a student's keyth choice."""
-        self.votes[key] = self.votes.get(key, 0) + 1
-        self.votes['12345'] += 1
-        self.votes['123'] += (key < 4)
-        self.votes['weighted'] += (6 - key)
+    def add_pre_vote(self: Club, n: int=1) -> None:
+        """Register the fact that this club was pre-selected for n students."""
+        self.votes['pre'] += n
+        self.votes['weighted'] += 5 * n
+
+    def add_vote(self: Club, key: int, n: int=1) -> None:
+        """Register the fact that this club was n students' keyth choice."""
+        self.votes[key] = self.votes.get(key, 0) + n
+        self.votes['12345'] += n
+        self.votes['123'] += (key < 4) * n
+        self.votes['weighted'] += (6 - key) * n
 
     def reset_votes(self: Club) -> None:
         """Untally all added votes so they can be recalculated."""
@@ -144,25 +172,33 @@ class Club:
         than the maximum number of groups on it.
         """
         return all((
-            (day in self.pre_days),
+            (self.pre_days & (1 << day)),
             (self.teacher is None) or (self.teacher.is_day_free(day)),
-            (self.days_used_counts.get(day, 0) < self.max_instances_per_day)
+            (self.days_used_counts[day] < self.max_instances_per_day)
         ))
 
-    def available_days(self: Club) -> set[int]:
+    def available_days(self: Club) -> int:
         """
-        Return the set of available days. Days are 0-indexed from Tuesday.
+        Return the set of available days. Days are 0-indexed from the first
+        day of the week.
         """
-        base = set(filter(lambda i: self.day_is_available(i), self.pre_days))
+        base = self.pre_days
+        if self.teacher is not None:
+            base &= self.teacher.free_days
+
+        for day in week.DAYS_IN[base]:
+            if self.days_used_counts[day] >= self.max_instances_per_day:
+                base &= ~(1 << day)
+
         return self.school.filter_split_days(self, base)
 
-    def taken_days(self: Club) -> set[int]:
+    def taken_days(self: Club) -> int:
         """
         Return the set of days used by all instances of this club.
         """
-        days = set()
-        for i in self.instances.values():
-            days = days.union(i.days)
+        days = 0
+        for i in self.instances:
+            days |= i.days
         return days
 
     def register_pre_student(self: Club, student_name: str) -> None:
@@ -181,7 +217,7 @@ class Club:
         self.priority_list.add(student_name)
 
     def set_meta(self: Club, teacher: Teacher|None,
-            t: bool, w: bool, r: bool,
+            days: int,
             min_instances: int, max_instances: int, days_per_instance: int, max_instances_per_day: int, 
             decided_instances: int|None,
             lower: int, upper: int, 
@@ -190,7 +226,7 @@ class Club:
         """
         Set all the metadata for this club.
 
-        T, W, R are interpreted as 0, 1, 2 for the zero-indexed day system.
+        Days are the set of days the club can run on, as a bitmask.
         A specific number of decided instances overrules minimum and maximum.   
         """
 
@@ -205,12 +241,7 @@ class Club:
         self.genders = genders
         self.closed = closed
 
-        # Interpret T, W, R as zero-indexed days
-        self.pre_days = set()
-        for (i, flag) in enumerate((t, w, r)):
-            if flag:
-                self.pre_days.add(i)
-        
+        self.pre_days = days
         self.min_instances = min_instances
         self.max_instances = max_instances
         self.days_per_instance = days_per_instance
@@ -241,16 +272,11 @@ class Club:
         Untally its contribution to our count of days used.
         Remove the record of its being used from our teacher, if we have one.
         """
-        del self.instances[instance.key]
-
-        for day in instance.days:
-            if day in self.days_used_counts:
+        self.instances.remove(instance)
 
-                # Not really a necessary distinction
-                if self.days_used_counts[day] == 0:
-                    del self.days_used_counts[day]
-                else:
-                    self.days_used_counts[day] -= 1
+        for day in week.DAYS_IN[instance.days]:
+            if self.days_used_counts[day] > 0:
+                self.days_used_counts[day] -= 1
 
             if self.teacher is not None:
                 self.teacher.reset_day(day)
@@ -271,8 +297,7 @@ class Club:
         its student distribution reset does not mean the clubs the excluded
         students were in had their student distributions reset!
         """
-        for key in self.instances.copy():
-            i = self.instances[key]
+        for i in self.instances[:]:
             if i.expanded:
                 self.remove_instance(i)
             else:
@@ -288,8 +313,7 @@ class Club:
         """
         self.reset_student_distribution()
 
-        for key in self.instances.copy():
-            i = self.instances[key]
+        for i in self.instances[:]:
             self.remove_instance(i)
 
         self.re_key_instances()
@@ -304,18 +328,18 @@ class Club:
         """
         return chr(65 + len(self.instances) + offset)
 
-    def create_instance(self: Club, days: set[int], expanded: bool=False) -> ClubInstance:
+    def create_instance(self: Club, days: int, expanded: bool=False) -> ClubInstance:
         """
         Create a new instance of this club on the given day(s).
         Mark whether this is a creation through expansion.
         """
         key = self._next_instance_key()
         instance = ClubInstance(self, key, days, expanded)
-        self.instances[key] = instance
+        self.instances.append(instance)
 
         # Add to day used counts
-        for day in days:
-            self.days_used_counts[day] = self.days_used_counts.get(day, 0) + 1
+        for day in week.DAYS_IN[days]:
+            self.days_used_counts[day] += 1
 
         # Set used on teacher side
         if self.teacher is not None:
@@ -324,7 +348,7 @@ class Club:
         # print(f'for {self.code} created instance on days {days}')
         return instance
 
-    def _get_least_repulsive_instance(self: Club, student: Student, options: tuple[ClubInstance]=tuple(), force: bool=False, forced_days: set[int]=set(), forced_nondays: set[int]=set()) -> ClubInstance:
+    def _get_least_repulsive_instance(self: Club, student: Student, options: tuple[ClubInstance]=tuple(), force: bool=False, forced_days: int=0, forced_nondays: int=0) -> ClubInstance:
         """
         Return the instance that has the least repulsion with the student.
         Instance-student repulsion, explained in the instance's method docs,
@@ -348,7 +372,7 @@ class Club:
 
         return options[0]
 
-    def _get_instance_options(self: Club, student: Student, force: bool=False, forced_days: set[int]=set(), forced_nondays: set[int]=set()) -> tuple[ClubInstance]:
+    def _get_instance_options(self: Club, student: Student, force: bool=False, forced_days: int=0, forced_nondays: int=0) -> tuple[ClubInstance]:
         """
         Return a tuple of the instances in this club that the student can join.
 
@@ -364,21 +388,21 @@ class Club:
         Specifically, choices gotten can't handle erasing existing choices.
         """
         
-        def _days_filter(i: ClubInstance) -> set[int]:
+        def _days_filter(i: ClubInstance) -> int:
             """
             Return the set of days in the given instance that also respect
             the forced days and forced nondays limitations.
             """
             days = i.days
             if forced_days:
-                days = days.intersection(forced_days)
-            return days.difference(forced_nondays)
+                days &= forced_days
+            return days & ~forced_nondays
 
         # Filter by instances that match the required days and nondays
-        valid_instances = tuple(filter(_days_filter, self.instances.values()))
+        valid_instances = tuple(filter(_days_filter, self.instances))
 
         # Filter by instances the student is not already in (even if forced!)
-        valid_instances = tuple(filter(lambda i: student not in i.students, valid_instances))
+        valid_instances = tuple(filter(lambda i: student.id not in i.students, valid_instances))
 
         # Only check if the student can actually be added if not forcing
         if force:
@@ -388,12 +412,12 @@ class Club:
 
     def exclude_student(self: Club, student: Student) -> None:
         """
-        Add the given student's name to our exclusion list (because they have
+        Add the given student's id to our exclusion list (because they have
         joined a club that is exclusive with ours).
         """
-        self.excluded_students.add(student.name)
+        self.excluded_students.add(student.id)
 
-    def _try_to_expand_instances(self: Club, student: Student, force: bool=False, forced_days: set[int]=set(), forced_nondays: set[int]=set()) -> tuple[bool, ClubInstance|None]:
+    def _try_to_expand_instances(self: Club, student: Student, force: bool=False, forced_days: int=0, forced_nondays: int=0) -> tuple[bool, ClubInstance|None]:
         """
         Try to expand this club's instances to accommodate another student.
         Return the result as a boolean, and the new instance or None if failed.
@@ -402,41 +426,38 @@ class Club:
         
         # Already more instances than the max?
         if len(self.instances) >= self.max_instances:
+            if INSTRUMENTATION.enabled:
+                all_full = all(i.is_full() for i in self.instances)
+                INSTRUMENTATION.event('placement failures: full' if all_full else 'placement failures: no options')
             return False, None
         
         # Not enough usable days for a new instance?
         usable_days = self.available_days()
         
         # Narrow down the usable days
-        usable_days = usable_days.difference(forced_nondays)
+        usable_days &= ~forced_nondays
         if forced_days:
-            usable_days = usable_days.intersection(forced_days)
+            usable_days &= forced_days
 
         if not force:
-            usable_days = usable_days.intersection(student.free_days())
+            usable_days &= student.free_days()
 
         # Fail if not enough
-        if len(usable_days) < self.days_per_instance:
+        if week.N_DAYS_IN[usable_days] < self.days_per_instance:
+            if INSTRUMENTATION.enabled:
+                INSTRUMENTATION.event('placement failures: no days')
             return False, None
 
         # Welp, looks like we can make one that the student can get into!
-        options = []
-        
-        # For each set of days, depending on how many we need for an instance,
+        # For each set of usable days of the size we need for an instance,
         # create a temporary instance to be considered for expansion
-        
-        # TODO This is the 3rd or 4th time writing this logic; refactor!
-
-        if self.days_per_instance == 3:
-            options.append(ClubInstance(self, f'expand-0', usable_days.copy(), True))
+        options = []
+        for (i, days) in enumerate(week.subsets_of(usable_days, self.days_per_instance)):
+            options.append(ClubInstance(self, f'expand-{i}', days, True))
 
-        elif self.days_per_instance == 2:
-            for (i, pair) in enumerate(itertools.pairwise(usable_days)):
-                options.append(ClubInstance(self, f'expand-{i}', set(pair), True))
-        
-        elif self.days_per_instance == 1:
-            for (i, day) in enumerate(usable_days):
-                options.append(ClubInstance(self, f'expand-{i}', {day}, True))
+        if INSTRUMENTATION.enabled:
+            INSTRUMENTATION.event('expansion candidates built', len(options))
+            INSTRUMENTATION.event('expansions created')
 
         instance = self._get_least_repulsive_instance(student, options, force, forced_days, forced_nondays)
 
@@ -445,7 +466,7 @@ class Club:
 
         return True, instance
 
-    def add_student(self: Club, student: Student, force: bool=False, forced_days: set[int]=set(), forced_nondays: set[int]=set()) -> bool:
+    def add_student(self: Club, student: Student, force: bool=False, forced_days: int=0, forced_nondays: int=0) -> bool:
         """
         Add the given student to this club, if possible. Return True iff
         the operation succeeds. It will fail if there are no instances
@@ -455,10 +476,18 @@ class Club:
         2. Limit options based on the days the student is forced to use or not
            use, if any.
         3. If there are any, 
+
+        When instrumented, every call counts as a placement attempt. It either
+        ends in a success or a failure (by reason), or expands the instances
+        and retries; hence attempts = successes + failures + retries.
         """
+        if INSTRUMENTATION.enabled:
+            INSTRUMENTATION.event('placement attempts')
 
         # Prevent students who are in a mutually exclusive club, unless forced
-        if (not force) and (student.name in self.excluded_students):
+        if (not force) and (student.id in self.excluded_students):
+            if INSTRUMENTATION.enabled:
+                INSTRUMENTATION.event('placement failures: exclusion')
             return False
 
         # Are there options?
@@ -469,11 +498,12 @@ class Club:
             instance = self._get_least_repulsive_instance(student, options, force)
             instance.add_student(student)
 
+            if INSTRUMENTATION.enabled:
+                INSTRUMENTATION.event('placement successes')
+
             # Register exclusions with other clubs
-            if self.code in self.school.exclusions:
-                for other_code in self.school.exclusions[self.code]:
-                    for other_club in self.school.get_all_clubs_for_code(other_code):
-                        other_club.exclude_student(student)
+            for other_club in self.exclusive_clubs:
+                other_club.exclude_student(student)
 
             return True
 
@@ -486,11 +516,15 @@ class Club:
 
             else:
                 # Try to add the student
+                if INSTRUMENTATION.enabled:
+                    INSTRUMENTATION.event('placement retries')
                 success = self.add_student(student, force, forced_days, forced_nondays)
 
                 # If it didn't succeed anyway, remove the expanded instance
                 if not success:
                     self.remove_instance(instance)
+                    if INSTRUMENTATION.enabled:
+                        INSTRUMENTATION.event('expansions rolled back')
 
                 return success
 
@@ -541,29 +575,14 @@ class Club:
         But a club that can run more than once, uses one day per instance,
         and could be offered on Tues, Wed, or Thurs would return False.
         """
-        return (len(self.pre_days) * self.max_instances_per_day) <= (self.min_instances * self.days_per_instance)
+        return (week.N_DAYS_IN[self.pre_days] * self.max_instances_per_day) <= (self.min_instances * self.days_per_instance)
 
-    def _sets_of_taken_days(self: Club) -> list[set[int]]:
+    def _sets_of_taken_days(self: Club) -> tuple[int]:
         """
-        Return a list of sets of days occupied by this club's instances.
-
-        TODO This logic has been implemented more than once.
+        Return the sets of days an instance of this club could occupy
+        within the days taken by its instances.
         """
-        sets_of_days = []
-        taken_days = self.taken_days()
-
-        if self.days_per_instance == 3:
-            sets_of_days.append(taken_days)
-
-        elif self.days_per_instance == 2:
-            for pair in itertools.pairwise(taken_days):
-                sets_of_days.append(set(pair))
-
-        elif self.days_per_instance == 1:
-            for day in taken_days:
-                sets_of_days.append({day})
-        
-        return sets_of_days
+        return week.subsets_of(self.taken_days(), self.days_per_instance)
 
     def balance_instances_on_same_day(self: Club) -> None:
         """
@@ -581,7 +600,7 @@ class Club:
 
         # For each set of days taken in this club, get matching instances
         for set_of_days in self._sets_of_taken_days():                
-            instances = list(filter(lambda i: i.days == set_of_days, self.instances.values()))
+            instances = list(filter(lambda i: i.days == set_of_days, self.instances))
             if len(instances) < 2:
                 continue
             
@@ -612,12 +631,9 @@ class Club:
         and assign each one a new key.
         This eliminates potential gaps after removing instances.
         """
-        instances = sorted(self.instances.values(), key=lambda i: sorted(i.days))
-        self.instances = {}
-        for (i, instance) in enumerate(instances):
-            key = self._next_instance_key()
-            instance.key = key
-            self.instances[key] = instance
+        self.instances.sort(key=lambda i: week.DAYS_IN[i.days])
+        for (i, instance) in enumerate(self.instances):
+            instance.key = chr(65 + i)
 
     def get_ideal_n_instances(self: Club) -> int:
         """
@@ -627,7 +643,7 @@ class Club:
         # base = min(self.max_instances, self.votes[0] // self.upper)
         base = math.ceil(self.votes['123'] / self.upper)
         refined = max(self.min_instances, base)
-        return min(refined, self.max_instances_per_day * len(self.pre_days))
+        return min(refined, self.max_instances_per_day * week.N_DAYS_IN[self.pre_days])
 
     def repulsion(self: Club, other: Club) -> int:
         """
@@ -636,7 +652,7 @@ class Club:
         TODO This is probably just redundant storage; can be looked up
         based on the school's record.
         """
-        return self.repulsions[other.code] if other.code in self.repulsions else 0
+        return self.repulsions[other.id]
 
     def mixedness(self: Club, expected: dict[object, float]) -> tuple[float]:
         """
@@ -646,7 +662,7 @@ class Club:
         mixed_grades = []
         mixed_genders = []
 
-        for instance in self.instances.values():
+        for instance in self.instances:
             mixed_grade, mixed_gender = instance.mixedness(expected)
             mixed_grades.append(mixed_grade)
             mixed_genders.append(mixed_gender)
@@ -658,6 +674,6 @@ class Club:
         return self.code
 
     def __hash__(self: Club) -> int:
-        """Return a has value of this club (a hash of its code)."""
-        return hash(self.code)
+        """Return a hash value of this club (its id)."""
+        return self.id
     
\ No newline at end of file
@@ -1,4 +1,6 @@
 from __future__ import annotations
+from instrumentation import INSTRUMENTATION
+import week
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -18,16 +20,19 @@ class ClubInstance:
     so that they can be purged without affecting the main distribution.
 
     Instance keys are not permanent. They are re-keyed if others are deleted.
+
+    Students are tracked by id; the school's student list resolves them.
+    The days are a set of days as a bitmask (see week.py).
     """
     __slots__ = ('key', 'club', 'days', 'students', 'expanded')
 
     club: Club
     key: str
-    days: set[int]
-    students: set[Student]
+    days: int
+    students: set[int]
     expanded: bool
     
-    def __init__(self: ClubInstance, club: Club, key: str, days: set[int], expanded: bool=False) -> None:
+    def __init__(self: ClubInstance, club: Club, key: str, days: int, expanded: bool=False) -> None:
         """Set the club's core values. No special processing is done."""
         self.club = club
         self.key = key
@@ -51,7 +56,7 @@ class ClubInstance:
 
         TODO This behaviour may be changed later using an optional flag.
         """
-        self.students.add(student)
+        self.students.add(student.id)
         student.add_to_club(self)
 
     def reset_students(self: ClubInstance) -> None:
@@ -72,7 +77,7 @@ class ClubInstance:
         Return True iff the given student has enough free days
         to be added to this instance.
         """
-        return len(self.days.intersection(student.free_days())) >= self.club.days_per_instance
+        return week.N_DAYS_IN[self.days & student.free_days()] >= self.club.days_per_instance
 
     def repulsion(self: ClubInstance, student: Student) -> int:
         """
@@ -84,21 +89,19 @@ class ClubInstance:
         shared with other clubs that the student hopes to take, weighted by
         whether that club is the student's 1st, 2nd, 3rd, 4th, or 4th choice.
         """
-        days_to_repulsion = {}
-
-        # Get all clubs the student is still trying to get into
-        for key in student.remaining_choice_indices():            
-            club_code = student.choices[key]
-            club = self.club.school.clubs[club_code] # lol :')
+        if INSTRUMENTATION.enabled:
+            INSTRUMENTATION.event('repulsion evaluations')
 
-            # For any days that would be free for the student, tally conflicts
-            for day in club.taken_days().intersection(student.free_days()):
-                days_to_repulsion[day] = days_to_repulsion.get(day, 0) + (6 - key)
+        clubs = self.club.school.club_list
+        free_days = student.free_days()
 
-        # Our repulsion score is the sum of tallies for days that we also share
+        # Get all clubs the student is still trying to get into
+        # For any days that would be free for the student and that we also
+        # share, tally conflicts; the sum of the tallies is our repulsion
         repulsion = 0
-        for day in self.days:
-            repulsion += days_to_repulsion.get(day, 0)
+        for key in student.remaining_choice_indices():            
+            club = clubs[student.choice_ids[key]]
+            repulsion += week.N_DAYS_IN[club.taken_days() & free_days & self.days] * (6 - key)
         
         return repulsion
 
@@ -125,7 +128,9 @@ class ClubInstance:
             proportions[key] = 0
 
         # Tally students of each type
-        for student in self.students:
+        students = self.club.school.student_list
+        for student_id in self.students:
+            student = students[student_id]
             proportions[student.grade] += 1
             proportions[student.gender] += 1
 
@@ -1,3 +1,5 @@
+# Must come first: the hot modules imported below are then the compiled ones, if built
+import compiled
 from functools import total_ordering
 from multiprocessing.spawn import prepare
 from school import School
@@ -5,12 +7,59 @@ import parse
 import save
 from world import World
 import worlds
-import time
-
+import week
+import search
+import pipeline
+import placement
+import bounds
+import random
+from instrumentation import INSTRUMENTATION
+from profiler import SamplingProfiler
+from tracing import Tracer
+
+# Worlds to test, shared evenly between the subtrees the search is cut into
+# (see search.py): with fewer worlds than subtrees, the first subtrees each
+# test their first world, rather than the search testing its first worlds
 N_WORLDS_TO_TEST = 1
 N_STUDENT_CONFIGURATIONS_PER_WORLD = 100
 N_BEST = 1
 
+# Worker processes to search with, the depth to cut the search into
+# subtrees at (None to choose, aiming for search.N_SUBTREES; a depth of 1
+# keeps the worlds tested closest to the search's own order), and the seed
+# (None for a random one)
+N_WORKERS = 1
+SPLIT_DEPTH = None
+SEED = None
+
+# Seed the search with the club placement of a max-k-cut of repulsions (see
+# placement.py), searching only under its first CUT_ROOT_DEPTH placements
+# (None to search everywhere; past its last placement, test just its world)
+CUT_ROOT_DEPTH = None
+
+# Test the worlds a model of their scores predicts best, out of more
+# candidates, learning as they are tested (see surrogate.py; not when PIPELINE).
+# Each subtree warms its model up on its first worlds, so this only helps
+# with large budgets per subtree (N_WORLDS_TO_TEST over the subtrees searched)
+SURROGATE = False
+
+# Score every world on a sample of students first, and only test the best
+# of them in full (see fidelity.py; not when PIPELINE)
+COARSE_TO_FINE = False
+
+# Stream distributions through a pipeline of worker processes instead,
+# saving the best worlds' reports in the background (see pipeline.py)
+PIPELINE = False
+
+# Time each phase of the run and save a summary (see instrumentation.py)
+INSTRUMENT = False
+
+# Sample the call stack during the run and save a profile (see profiler.py)
+PROFILE = False
+
+# Record a timeline of the run as Chrome trace events (see tracing.py)
+TRACE = False
+
 def prepare_school() -> School:
     """
     Ingest all the data and return a school object:
@@ -22,33 +71,46 @@ def prepare_school() -> School:
     """
     school = School()
 
-    # Needs to be done first to prepare for clubs later
-    parse.parse_merges(school)
-    parse.parse_splits(school)
-    parse.parse_nice_names(school)
+    with INSTRUMENTATION.phase('prepare: parse'):
 
-    parse.parse_students(school)
-    parse.parse_clubs(school)
-    parse.parse_preselects(school)
-    parse.parse_whitelists(school)
-    parse.parse_exclusions(school)
+        # Needs to be done first to prepare for clubs later
+        parse.parse_days()
+        parse.parse_merges(school)
+        parse.parse_splits(school)
+        parse.parse_nice_names(school)
 
-    school.calculate_proportions()
+        parse.parse_students(school)
+        parse.parse_clubs(school)
+        parse.parse_preselects(school)
+        parse.parse_whitelists(school)
+        parse.parse_exclusions(school)
+
+        school.calculate_proportions()
 
     # Tally votes to aid auto-filtering, and save raw data to help human decision-making
-    school.tally_votes()
-    save.save_summary_votes_csv(school, 'raw')
-    save.save_all_club_votes_csvs(school, 'raw')
+    with INSTRUMENTATION.phase('prepare: tally votes'):
+        school.tally_votes()
+    with INSTRUMENTATION.phase('prepare: save votes'):
+        save.save_summary_votes_csv(school, 'raw')
+        save.save_all_club_votes_csvs(school, 'raw')
 
-    school.remove_students_who_arent_eligible()
-    school.remove_clubs_that_cannot_run()
+    with INSTRUMENTATION.phase('prepare: filter'):
+        school.remove_students_who_arent_eligible()
+        school.remove_clubs_that_cannot_run()
 
-    # Resave filtered data
-    school.tally_votes()
-    save.save_summary_votes_csv(school, 'filtered')
-    save.save_all_club_votes_csvs(school, 'filtered')
+    # From here on, the engine works on ids rather than names and codes
+    with INSTRUMENTATION.phase('prepare: assign ids'):
+        school.assign_ids()
 
-    school.calculate_repulsions()
+    # Resave filtered data
+    with INSTRUMENTATION.phase('prepare: tally votes'):
+        school.tally_votes()
+    with INSTRUMENTATION.phase('prepare: save votes'):
+        save.save_summary_votes_csv(school, 'filtered')
+        save.save_all_club_votes_csvs(school, 'filtered')
+
+    with INSTRUMENTATION.phase('prepare: calculate repulsions'):
+        school.calculate_repulsions()
     # school.calculate_reactivities()
 
     return school
@@ -60,71 +122,80 @@ def get_best_worlds(school: School, validate_early: bool=False) -> list[tuple[in
 
     With early validation, processing is greatly slowed, but invalid worlds are
     filtered out beforehand.
-    """
-    
-    # Counters
-    n_tested = 0
-    n_valid = 0
-    start = time.perf_counter()
 
-    # Separate out these so we don't affect the original order
-    best = []
-    clubs = list(school.clubs.values())
-    students = list(school.students.values())
+    The search is cut into subtrees (see search.py), evaluated by N_WORKERS
+    processes; the same seed gives the same best worlds with any number.
+    Without a set SEED, a random one is used (and printed, to rerun with).
 
-    # Some things can be affected between creation and first distribution
-    for s in students:
-        s.reset_distribution()
-    for c in clubs:
-        c.reset_student_distribution()
+    With PIPELINE, distributions are instead streamed to the workers (see
+    pipeline.py), and the best worlds' reports are saved as they change.
 
-    # Go through all worlds, in all student configurations
-    for _ in worlds.generate_worlds(school, clubs, N_WORLDS_TO_TEST):
-        for __ in range(N_STUDENT_CONFIGURATIONS_PER_WORLD):
-    
-            # Create and distribute! Student order is handled by the world
-            world = World(school, clubs[:], students[:])
-            world.distribute()
-
-            # Validate early (intensive process)
-            if validate_early:
-                valid, msg = world.validate()
-                n_valid += valid
-            else:
-                valid = True
-
-            # Calculate score (intensive process)
-            score = world.score()
-
-            if valid:
-
-                # Add it to the list of best in the proper place
-                if len(best) < N_BEST:
-                    best.append((score, world))
-                elif score > best[0][0]:
-                    best[0] = (score, world)
-
-                best.sort(key=lambda t: t[0])
-
-            # Reset student-only distributions
-            for s in students:
-                s.reset_distribution()
-            for c in clubs:
-                c.reset_student_distribution()
-
-            # Progress counter
-            n_tested += 1
-            if not (n_tested % max(10, min(1_000, ((N_WORLDS_TO_TEST * N_STUDENT_CONFIGURATIONS_PER_WORLD) // 100)))):
-                stem = f'{time.perf_counter() - start:,.2f} seconds: Tested {n_tested:,} worlds'
-                if validate_early:
-                    stem += f', {n_valid} valid'
-                print(stem)
-        
-        # Reset instance/day distributions too
-        for c in clubs:
-            c.reset_entire_distribution()
-        for s in students:
-            s.reset_distribution()
+    With a CUT_ROOT_DEPTH, only the worlds under that many placements of a
+    max-k-cut of the clubs' repulsions are searched (see placement.py).
+    With SURROGATE, the worlds tested are those predicted best (see
+    surrogate.py). With COARSE_TO_FINE, they are those that do best on a
+    sample of the students (see fidelity.py). Either way, the best worlds'
+    reports are of full distributions, and validated when saved.
+
+    The best score is reported along with its gap to a bound on the score
+    of any world (see bounds.py). The bound is loose, so the gap says how
+    far the best could at most be from the best possible, not how far it is.
+
+    Fairness statistics of all the distributions are printed and saved at
+    the end (see fairness.py).
+
+    Raise ValueError if PIPELINE is combined with options it does not support.
+    """
+    if PIPELINE:
+        unsupported = [name for (name, value) in (('SURROGATE', SURROGATE), ('COARSE_TO_FINE', COARSE_TO_FINE)) if value]
+        if unsupported:
+            raise ValueError(f'PIPELINE does not support {", ".join(unsupported)}; switch them or PIPELINE off')
+
+    seed = SEED if SEED is not None else random.randrange(2 ** 32)
+    print(f'Seed: {seed}')
+
+    # Describe the worlds there are to go through
+    clubs = list(school.clubs.values())
+    with INSTRUMENTATION.phase('describe search space'):
+        print(worlds.describe_search_space(school, clubs))
+
+    # Place clubs by a max-k-cut to seed the search with
+    root = ()
+    if CUT_ROOT_DEPTH is not None:
+        with INSTRUMENTATION.phase('place by cut'):
+            layout = placement.place_by_cut(school, clubs)
+            root = worlds.layout_path(school, clubs, layout)[:CUT_ROOT_DEPTH]
+        print(f'Seeding the search with {len(root):,} placements of a cut losing {placement.lost_repulsion(clubs, layout):,} repulsion')
+
+    # Bound the score any world can reach, to measure the best against
+    with INSTRUMENTATION.phase('bound score'):
+        bound = bounds.score_bound(school)
+    print(f'No world can score over {bound:,}')
+
+    # Go through all worlds, in all student configurations, skipping any
+    # world with the same layout as one already tested
+    if PIPELINE:
+        best, n_duplicates, stats = pipeline.run_pipeline(
+            school, N_WORLDS_TO_TEST, N_STUDENT_CONFIGURATIONS_PER_WORLD, N_BEST, seed,
+            N_WORKERS, validate_early, save_best_world_report, root
+        )
+    else:
+        best, n_duplicates, stats = search.search_worlds(
+            school, N_WORLDS_TO_TEST, N_STUDENT_CONFIGURATIONS_PER_WORLD, N_BEST, seed,
+            N_WORKERS, SPLIT_DEPTH, validate_early, root, SURROGATE, COARSE_TO_FINE
+        )
+
+    if n_duplicates:
+        print(f'Skipped {n_duplicates:,} duplicate worlds')
+        INSTRUMENTATION.count('duplicate worlds skipped', n_duplicates)
+
+    if best:
+        print(f'Best score: {best[-1][0]:,}, at most {bounds.optimality_gap(best[-1][0], bound):.1%} of the bound below the best possible')
+
+    # Report on the fairness of all the distributions, not just the best
+    with INSTRUMENTATION.phase('save fairness'):
+        print(stats.format_summary(school))
+        save.save_fairness_csvs(school, stats)
 
     return best
 
@@ -132,38 +203,106 @@ def print_world_contents(world: World) -> None:
     """
     Print the contents of the given world (clubs -> instances -> days, n_students).
     """
-    for (club, instances) in sorted(world.report.clubs.items(), key=lambda item: item[0].lower()):
-        print(club)
-        for (key, data) in instances.items():
-            str_days = '/'.join((save.INT_TO_DAY_LETTER[d] for d in data['days']))
-            print(' ' * 8 + f'{key:<2} : {len(data["days"])} days ({str_days}), {len(data["students"])} students')
+    report = world.report
+    for club_id in sorted((i for (i, instances) in enumerate(report.clubs) if instances is not None), key=lambda i: report.club_codes[i].lower()):
+        print(report.club_codes[club_id])
+        for data in report.clubs[club_id]:
+            str_days = week.letters_of(data['days'])
+            print(' ' * 8 + f'{data["key"]:<2} : {week.N_DAYS_IN[data["days"]]} days ({str_days}), {len(data["students"])} students')
+
+def save_best_world_report(world: World, key: str) -> None:
+    """
+    Validate the given world and save its report under the given key.
+    """
+
+    # Mostly debugging tbh
+    # print(world.report.format_report())
+    print()
+    # save.save_summary_votes_csv(school, 'distributed', world.report)
+    # print_world_contents(world)
+    
+    # Validate world
+    with INSTRUMENTATION.phase('validate'):
+        valid, msg = world.validate()
+    if valid:
+        with INSTRUMENTATION.phase('save report', {'report': key}):
+            save.save_world_report(world.report, key)
+    else:
+        print(f'World was invalid! Report:\n{msg}')
 
 def save_best_world_reports(best: list[tuple[int, World]]) -> None:
     """
     Save reports for the given list of (score, world) tuples.
     """
     for (i, (_, world)) in enumerate(best[::-1]):
+        save_best_world_report(world, chr(65 + i))
+
+def create_schedule(instrument: bool=INSTRUMENT, profile: bool=PROFILE, trace: bool=TRACE) -> None:
+    """
+    Prepare the school, find the best worlds, and save their reports.
+
+    If instrumented, time each phase and count events along the way;
+    print a summary at the end and save the data as JSON.
+
+    If profiled, sample the call stack throughout; print the top functions
+    at the end and save them along with collapsed stacks for flamegraphs.
+
+    If traced, record every pass through each phase as a span on a timeline
+    and save it as a Chrome trace event file.
+    """
+    INSTRUMENTATION.enabled = instrument
+    INSTRUMENTATION.start_run()
+
+    if trace:
+        INSTRUMENTATION.tracer = Tracer()
+        INSTRUMENTATION.tracer.name_thread('Club Sandwich', 'main')
+
+    profiler = SamplingProfiler() if profile else None
+    if profiler is not None:
+        profiler.start()
+
+    try:
+        school = prepare_school()
+        best_worlds = get_best_worlds(school, validate_early=False)
+        if not PIPELINE:
+            save_best_world_reports(best_worlds)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        INSTRUMENTATION.end_run()
+
+    if instrument:
+        print()
+        print(INSTRUMENTATION.format_summary())
+        save.save_instrumentation_json(INSTRUMENTATION)
+        INSTRUMENTATION.enabled = False
 
-        # Mostly debugging tbh
-        # print(world.report.format_report())
+    if profiler is not None:
         print()
-        # save.save_summary_votes_csv(school, 'distributed', world.report)
-        # print_world_contents(world)
-        
-        # Validate world
-        valid, msg = world.validate()
-        if valid:
-            save.save_world_report(world.report, chr(65 + i))
-        else:
-            print(f'World was invalid! Report:\n{msg}')
+        print(profiler.format_summary(n=25))
+        save.save_profile(profiler)
 
-def create_schedule() -> None:
+    if trace:
+        save.save_trace(INSTRUMENTATION.tracer)
+        INSTRUMENTATION.tracer = None
+
+def create_schedule_instrumented() -> None:
     """
-    Prepare the school, find the best worlds, and save their reports.
+    Create a schedule with per-phase timings and counters.
+    """
+    create_schedule(instrument=True)
+
+def create_schedule_profiled() -> None:
+    """
+    Create a schedule while sampling the call stack.
+    """
+    create_schedule(profile=True)
+
+def create_schedule_traced() -> None:
+    """
+    Create a schedule while recording a timeline of its phases.
     """
-    school = prepare_school()
-    best_worlds = get_best_worlds(school, validate_early=False)
-    save_best_world_reports(best_worlds)
+    create_schedule(trace=True)
 
 def resave_all_reports() -> None:
     """
@@ -0,0 +1,77 @@
+"""
+Compiled builds of the hot modules, used in place of their sources if built
+(see tools/build_compiled.py), unless switched off.
+
+The modules are compiled, unchanged, from the same typed Python into
+extension modules under build/compiled/. Importing this module puts that
+directory ahead of the sources on the path, so that the hot modules imported
+afterwards are the compiled ones; it must be imported before any of them.
+Set the environment variable CLUB_SANDWICH_COMPILED to 0 to run the sources
+regardless (tools/compiled_parity.py compares the two).
+"""
+from __future__ import annotations
+from importlib import machinery
+from pathlib import Path
+import os
+import sys
+
+# The modules that are compiled
+MODULES = ('student', 'club_instance', 'club', 'world', 'report')
+
+PATH_COMPILED = Path(__file__).resolve().parent / 'build' / 'compiled'
+
+# The environment variable to switch compiled modules off with (0)
+SWITCH = 'CLUB_SANDWICH_COMPILED'
+
+def is_switched_on() -> bool:
+    """
+    Return True unless compiled modules have been switched off.
+    """
+    return os.environ.get(SWITCH, '1') != '0'
+
+def is_built(module: str) -> bool:
+    """
+    Return True iff the given module has been compiled for this interpreter.
+    """
+    return any((PATH_COMPILED / f'{module}{suffix}').exists() for suffix in machinery.EXTENSION_SUFFIXES)
+
+def is_stale(module: str) -> bool:
+    """
+    Return True iff the given module has been compiled, but its source has
+    been changed since.
+    """
+    source = (Path(__file__).resolve().parent / f'{module}.py').stat().st_mtime
+    return any(path.exists() and (path.stat().st_mtime < source) for path in (PATH_COMPILED / f'{module}{suffix}' for suffix in machinery.EXTENSION_SUFFIXES))
+
+def enable() -> bool:
+    """
+    Put the compiled modules ahead of the sources on the path, if switched
+    on and any are built. Return True iff they were. Modules already imported
+    are not replaced.
+
+    If any built module is older than its source, none are used (so edits
+    to the sources are never silently replaced by a stale build), with a
+    warning to rebuild.
+    """
+    if not is_switched_on() or not any(is_built(module) for module in MODULES):
+        return False
+
+    stale = [module for module in MODULES if is_stale(module)]
+    if stale:
+        print(f'Compiled modules are older than their sources, so running the sources instead '
+              f'(rebuild with tools/build_compiled.py): {", ".join(stale)}', file=sys.stderr)
+        return False
+
+    path = str(PATH_COMPILED)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return True
+
+def loaded_compiled() -> list[str]:
+    """
+    Return the names of the modules imported so far that are compiled.
+    """
+    suffixes = tuple(machinery.EXTENSION_SUFFIXES)
+    return [module for module in MODULES if getattr(sys.modules.get(module), '__file__', '').endswith(suffixes)]
+
+enable()
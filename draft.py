@@ -0,0 +1,98 @@
+"""
+The order students take turns in when their choices are distributed (see
+World.distribute_choices): a draft, in rounds.
+
+In each round, every student in turn tries their next choices until they
+get one. Every attempt is recorded as a success or failure, and the order
+for the next round is decided by an order policy from these records.
+
+The default policy gives the next turns to the students who have fared
+worst: those whose attempts so far, compared in order, failed soonest
+(with fewer attempts coming first when otherwise equal), and among equals,
+in the reverse of the last round's order. Since a student makes at most
+MAX_ATTEMPTS attempts, their record fits in an integer signature: a base-3
+number whose digits, from the most significant, are 0 for no attempt,
+1 for a failure, and 2 for a success. Signatures order students exactly
+as their records would, so each round's order comes from one pass over the
+students into a bucket per signature, rather than a sort.
+"""
+from __future__ import annotations
+import random
+
+from typing import Callable
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from student import Student
+
+# A student has at most 5 choices, so makes at most 5 attempts
+MAX_ATTEMPTS = 5
+N_SIGNATURES = 3 ** MAX_ATTEMPTS
+
+# Indexed by attempt number, then by success: what it adds to a signature
+ATTEMPT_VALUES = tuple((3 ** (MAX_ATTEMPTS - 1 - i), 2 * 3 ** (MAX_ATTEMPTS - 1 - i)) for i in range(MAX_ATTEMPTS))
+
+class Draft:
+    """
+    The records of students' attempts in a draft, indexed by student id:
+    their signatures (see module docs), and how many attempts they have made.
+    """
+    __slots__ = ('signatures', 'n_attempts')
+
+    signatures: list[int]
+    n_attempts: list[int]
+
+    def __init__(self: Draft, n_students: int) -> None:
+        """Initialize this draft with no attempts made by the given number of students."""
+        self.signatures = [0] * n_students
+        self.n_attempts = [0] * n_students
+
+    def record(self: Draft, student_id: int, success: bool) -> None:
+        """
+        Record an attempt by the given student, successful or not.
+        """
+        self.signatures[student_id] += ATTEMPT_VALUES[self.n_attempts[student_id]][success]
+        self.n_attempts[student_id] += 1
+
+def order_by_successes(students: list[Student], draft: Draft) -> list[Student]:
+    """
+    Return the students in the order for the next round: by signature, and
+    among equals, in the reverse of their current order (see module docs).
+    """
+    buckets = [[] for _ in range(N_SIGNATURES)]
+    signatures = draft.signatures
+    for student in reversed(students):
+        buckets[signatures[student.id]].append(student)
+    return [student for bucket in buckets for student in bucket]
+
+def order_snake(students: list[Student], draft: Draft) -> list[Student]:
+    """
+    Return the students in the reverse of their current order, regardless of
+    how they have fared (a snake draft).
+    """
+    return students[::-1]
+
+def order_shuffled(students: list[Student], draft: Draft) -> list[Student]:
+    """
+    Return the students in a new random order.
+    """
+    students = students[:]
+    random.shuffle(students)
+    return students
+
+def order_by_choices_gotten_score(students: list[Student], draft: Draft) -> list[Student]:
+    """
+    Return the students in the reverse of their current order, sorted by the
+    score of the choices they have gotten so far (lowest first).
+    """
+    return sorted(reversed(students), key=lambda s: s.choices_gotten_score)
+
+# The policies to order students by between rounds, by name
+ORDER_POLICIES: dict[str, Callable[[list[Student], Draft], list[Student]]] = {
+    'successes': order_by_successes,
+    'snake': order_snake,
+    'shuffled': order_shuffled,
+    'choices gotten score': order_by_choices_gotten_score
+}
+
+# The policy used unless another is given to a world
+DEFAULT_ORDER_POLICY = 'successes'
@@ -0,0 +1,210 @@
+"""
+Statistics on the fairness of the lottery, across every distribution
+evaluated rather than just the best: each student's chance of getting their
+first choice, how many days students spend in clubs they did not choose (by
+grade), and how full each club runs.
+
+They are accumulated as distributions are evaluated, from each one's report,
+without keeping the reports: counts, histograms, and running means and
+variances (by Welford's method). Accumulators from different processes or
+subtrees of the search merge into one.
+"""
+from __future__ import annotations
+import math
+
+import week
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from report import Report
+    from school import School
+
+# How many of the clubs to list as the least and most filled in summaries
+N_CLUBS_SUMMARIZED = 3
+
+class RunningStats:
+    """
+    The count, mean, and (sum of squared deviations for the) variance of
+    the values added so far, updated as each is added (by Welford's method).
+    Also keeps the least and greatest values.
+    """
+    __slots__ = ('n', 'mean', 'm2', 'min', 'max')
+
+    n: int
+    mean: float
+    m2: float
+    min: float
+    max: float
+
+    def __init__(self: RunningStats) -> None:
+        """Start with no values."""
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self: RunningStats, x: float) -> None:
+        """
+        Add the given value.
+        """
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def merge(self: RunningStats, other: RunningStats) -> None:
+        """
+        Add the values added to the other stats (by Chan et al.'s method).
+        """
+        if not other.n:
+            return
+
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def variance(self: RunningStats) -> float:
+        """Return the (sample) variance of the values, or 0 if fewer than 2."""
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def std(self: RunningStats) -> float:
+        """Return the (sample) standard deviation of the values."""
+        return math.sqrt(self.variance())
+
+class FairnessStats:
+    """
+    The fairness statistics of the distributions added so far (see module
+    docs). Indexed by student id: how many distributions each student needed
+    their first choice in (it is not needed if preselects fill their week),
+    and how many they got it in. By grade: a histogram of how many days
+    students were placed in clubs they did not choose. Indexed by club id:
+    the fill rate (students per place) of the club when it ran.
+    """
+    __slots__ = ('n_distributions', 'scores', 'first_needed', 'first_gotten', 'unchosen_by_grade', 'club_fill')
+
+    n_distributions: int
+    scores: RunningStats
+    first_needed: list[int]
+    first_gotten: list[int]
+    unchosen_by_grade: dict[int, list[int]]
+    club_fill: list[RunningStats]
+
+    def __init__(self: FairnessStats, n_students: int, n_clubs: int) -> None:
+        """Start with no distributions of the given numbers of students and clubs."""
+        self.n_distributions = 0
+        self.scores = RunningStats()
+        self.first_needed = [0] * n_students
+        self.first_gotten = [0] * n_students
+        self.unchosen_by_grade = {}
+        self.club_fill = [RunningStats() for _ in range(n_clubs)]
+
+    def add(self: FairnessStats, report: Report, score: int, upper_limits: list[int]) -> None:
+        """
+        Add the distribution in the given (populated) report, with the given
+        score, given the upper limit of each club's instances by club id.
+        """
+        self.n_distributions += 1
+        self.scores.add(score)
+
+        for (student_id, data) in enumerate(report.students):
+            if data is None:
+                continue
+            gotten = data['choices gotten']
+
+            # The first choice key is only left if the choice was needed
+            if 1 in gotten:
+                self.first_needed[student_id] += 1
+                self.first_gotten[student_id] += gotten[1] > 0
+
+            histogram = self.unchosen_by_grade.get(data['grade'])
+            if histogram is None:
+                histogram = self.unchosen_by_grade[data['grade']] = [0] * (week.N_DAYS + 1)
+            histogram[min(gotten.get('unchosen', 0), week.N_DAYS)] += 1
+
+        for (club_id, instances) in enumerate(report.clubs):
+            if instances:
+                n_students = sum(len(data['students']) for data in instances)
+                self.club_fill[club_id].add(n_students / (len(instances) * upper_limits[club_id]))
+
+    def merge(self: FairnessStats, other: FairnessStats) -> None:
+        """
+        Add the distributions added to the other stats.
+        """
+        self.n_distributions += other.n_distributions
+        self.scores.merge(other.scores)
+
+        for (i, n) in enumerate(other.first_needed):
+            self.first_needed[i] += n
+        for (i, n) in enumerate(other.first_gotten):
+            self.first_gotten[i] += n
+
+        for (grade, other_histogram) in other.unchosen_by_grade.items():
+            histogram = self.unchosen_by_grade.setdefault(grade, [0] * len(other_histogram))
+            for (n_days, n) in enumerate(other_histogram):
+                histogram[n_days] += n
+
+        for (stats, other_stats) in zip(self.club_fill, other.club_fill):
+            stats.merge(other_stats)
+
+    def first_choice_probability(self: FairnessStats, student_id: int) -> float|None:
+        """
+        Return the given student's estimated probability of getting their
+        first choice when they needed it, or None if they never needed it.
+        """
+        n = self.first_needed[student_id]
+        return self.first_gotten[student_id] / n if n else None
+
+    def format_summary(self: FairnessStats, school: School) -> str:
+        """
+        Return a summary of these statistics for the given school.
+        """
+        lines = [f'Fairness across {self.n_distributions:,} distributions']
+        if not self.n_distributions:
+            return lines[0]
+
+        lines.append(f'    Score: mean {self.scores.mean:,.1f}, sd {self.scores.std():,.1f}, range {self.scores.min:,.0f} to {self.scores.max:,.0f}')
+
+        # First choice, overall and by grade
+        probabilities = [(student, p) for student in school.student_list if (p := self.first_choice_probability(student.id)) is not None]
+        if probabilities:
+            ps = sorted(p for (_, p) in probabilities)
+            by_grade = {}
+            for (student, p) in probabilities:
+                by_grade.setdefault(student.grade, []).append(p)
+            grades = ', '.join(f'{grade}: {sum(p) / len(p):.0%}' for (grade, p) in sorted(by_grade.items()))
+            lines.append(f'    1st choice: mean chance {sum(ps) / len(ps):.0%} (by grade {grades}); '
+                         f'{sum(p < 0.5 for p in ps):,} of {len(ps):,} students under 50%, lowest {ps[0]:.0%}')
+
+        # Days in unchosen clubs, by grade
+        for (grade, histogram) in sorted(self.unchosen_by_grade.items()):
+            total = sum(histogram)
+            shares = ', '.join(f'{n_days}: {n / total:.0%}' for (n_days, n) in enumerate(histogram) if n)
+            lines.append(f'    Unchosen days, grade {grade}: {shares}')
+
+        # Clubs by fill rate
+        filled = sorted((stats.mean, school.club_list[club_id].code) for (club_id, stats) in enumerate(self.club_fill) if stats.n)
+        if filled:
+            least = ', '.join(f'{code} {fill:.0%}' for (fill, code) in filled[:N_CLUBS_SUMMARIZED])
+            most = ', '.join(f'{code} {fill:.0%}' for (fill, code) in filled[::-1][:N_CLUBS_SUMMARIZED])
+            lines.append(f'    Club fill: least {least}; most {most}')
+
+        return '\n'.join(lines)
+
+def new_fairness_stats(school: School) -> FairnessStats:
+    """
+    Return empty fairness statistics for the given school.
+    """
+    return FairnessStats(len(school.student_list), len(school.club_list))
+
+def upper_limits(school: School) -> list[int]:
+    """
+    Return the upper limit of each club's instances in the given school, by club id.
+    """
+    return [int(club.upper) for club in school.club_list]
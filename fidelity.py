@@ -0,0 +1,145 @@
+"""
+Coarse-to-fine evaluation of worlds: every candidate world is first given a
+few distributions of a sample of the students, into clubs scaled down to
+match, and only the best of them by that are given the full distributions.
+
+The sample is stratified by grade and gender, so it keeps the school's
+proportions of each (see School.proportions), which mixedness is scored
+against. Clubs' upper and lower limits are scaled by the share of students
+sampled, and only the sampled students' preselects are carried out, so a
+sampled distribution is a small copy of a full one. Its range of students
+in clubs shrinks with it, so is scaled back up for the score; even so,
+scores of samples are only compared with each other, to rank the worlds of
+a subtree of the search. Samples much smaller than half of the students
+rank worlds little better than chance.
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+import math
+import random
+
+from report import RANGE_WEIGHT
+from world import World
+import worlds
+from instrumentation import INSTRUMENTATION
+
+from typing import TYPE_CHECKING, Callable, Iterator
+if TYPE_CHECKING:
+    from club import Club
+    from school import School
+    from student import Student
+    from surrogate import SurrogateModel
+
+# The share of students to sample in each stratum
+SAMPLE_FRACTION = 0.5
+
+# Distributions of the sample per world
+N_COARSE_CONFIGURATIONS = 4
+
+# The share of worlds to give the full distributions
+KEEP_FRACTION = 0.25
+
+def stratified_sample(school: School, fraction: float=SAMPLE_FRACTION) -> list[Student]:
+    """
+    Return a random sample of the given share of the school's students, in
+    id order, taking that share (rounded, at least 1) of each grade and gender.
+    """
+    strata = {}
+    for student in school.student_list:
+        strata.setdefault((student.grade, student.gender), []).append(student)
+
+    sample = []
+    for (_, members) in sorted(strata.items(), key=lambda t: str(t[0])):
+        sample += random.sample(members, max(1, round(len(members) * fraction)))
+    sample.sort(key=lambda s: s.id)
+    return sample
+
+@contextmanager
+def scaled_to(school: School, sample: list[Student]) -> Iterator[None]:
+    """
+    Within this context, scale the school's clubs to the given sample of its
+    students: their limits by the share sampled, and preselects to those of
+    the sample. The clubs and preselects are restored afterwards.
+    """
+    share = len(sample) / len(school.student_list)
+    limits = [(club.lower, club.upper) for club in school.club_list]
+    preselects = school.preselects
+    names = set(student.name for student in sample)
+
+    try:
+        for club in school.club_list:
+            club.lower = round(club.lower * share)
+            club.upper = max(1, round(club.upper * share))
+        school.preselects = {name: p for (name, p) in preselects.items() if name in names}
+        yield
+    finally:
+        for (club, (lower, upper)) in zip(school.club_list, limits):
+            (club.lower, club.upper) = (lower, upper)
+        school.preselects = preselects
+
+def coarse_score(school: School, clubs: list[Club], sample: list[Student], n_configurations: int=N_COARSE_CONFIGURATIONS) -> float:
+    """
+    Return the mean score of the given number of distributions of the given
+    sample of students into the current world (see scaled_to), with the
+    range penalty as for all students. The students' distributions are reset
+    afterwards.
+    """
+    share = len(sample) / len(school.student_list)
+    total = 0
+    with scaled_to(school, sample):
+        for _ in range(n_configurations):
+            world = World(school, clubs[:], sample[:])
+            world.distribute()
+            total += world.score()
+
+            # The range of students in clubs shrinks with the sample
+            report = world.report
+            total -= RANGE_WEIGHT * ((report.stats['range'] / share) ** 2 - report.stats['range'] ** 2)
+            INSTRUMENTATION.count('coarse distributions')
+
+            for s in sample:
+                s.reset_distribution()
+            for c in clubs:
+                c.reset_student_distribution()
+    return total / n_configurations
+
+def current_layout(clubs: list[Club]) -> dict[str, list[int]]:
+    """
+    Return the layout of the given clubs' instances as they are.
+    """
+    return {club.code: [instance.days for instance in club.instances] for club in clubs}
+
+def refine_worlds(school: School, clubs: list[Club], generated: Iterator[int], n_keep: int, reset: Callable[[School], None],
+                  model: SurrogateModel|None=None, fraction: float=SAMPLE_FRACTION) -> Iterator[int]:
+    """
+    Give each world created by the given iterator (see worlds.generate_worlds)
+    a coarse score on a stratified sample of students (also observed by the
+    model, if any), resetting the school with the given function after each;
+    then recreate the n_keep best of them (ties going to the earlier) one at
+    a time, yielding the number each was created as. As with
+    worlds.generate_worlds, the school must be reset before advancing.
+    """
+    sample = stratified_sample(school, fraction)
+
+    scored = []
+    for n in generated:
+        with INSTRUMENTATION.phase('coarse score'):
+            layout = current_layout(clubs)
+            score = coarse_score(school, clubs, sample)
+        if model is not None:
+            model.observe(score)
+        scored.append((-score, n, layout))
+        reset(school)
+
+    scored.sort(key=lambda t: t[:2])
+    for (_, n, layout) in scored[:n_keep]:
+        worlds.create_layout(clubs, layout)
+        yield n
+
+def n_to_keep(n_worlds: int, keep: float=KEEP_FRACTION) -> int:
+    """
+    Return how many of the given number of worlds to give the full
+    distributions: the given share of them, but at least 1. Each world gets
+    many distributions, so one world can fill all of the best kept.
+    """
+    return max(1, math.ceil(n_worlds * keep))
@@ -0,0 +1,129 @@
+"""
+Maximum flow in a network of integer capacities, by Dinic's algorithm: the
+flow is augmented in phases, each along a blocking flow of the shortest
+paths left (found by a breadth-first search into levels, then depth-first
+searches that never retry an edge that led nowhere). The phases are at most
+as many as the nodes, and few in practice for the shallow networks the
+bounds on scores are built from (see bounds.py).
+
+Nodes are numbered from 0. Edges are kept in flat lists, each next to its
+reverse (an edge's index xor 1), which carries the flow back.
+"""
+from __future__ import annotations
+from collections import deque
+
+class FlowNetwork:
+    """
+    A network of nodes and edges with integer capacities, and the flow along
+    them: for each node, its outgoing edges (by index); for each edge, the
+    node it goes to and the capacity it has left.
+    """
+    __slots__ = ('edges', 'targets', 'capacities', 'original')
+
+    edges: list[list[int]]
+    targets: list[int]
+    capacities: list[int]
+    original: list[int]
+
+    def __init__(self: FlowNetwork, n_nodes: int=0) -> None:
+        """Initialize this network with the given number of nodes, and no edges."""
+        self.edges = [[] for _ in range(n_nodes)]
+        self.targets = []
+        self.capacities = []
+        self.original = []
+
+    def add_node(self: FlowNetwork) -> int:
+        """
+        Add a node, and return it.
+        """
+        self.edges.append([])
+        return len(self.edges) - 1
+
+    def add_edge(self: FlowNetwork, u: int, v: int, capacity: int) -> int:
+        """
+        Add an edge from node u to node v with the given capacity (and its
+        reverse, with none), and return its index.
+        """
+        i = len(self.targets)
+        self.edges[u].append(i)
+        self.edges[v].append(i + 1)
+        self.targets += (v, u)
+        self.capacities += (capacity, 0)
+        self.original += (capacity, 0)
+        return i
+
+    def flow(self: FlowNetwork, i: int) -> int:
+        """
+        Return the flow along the edge with the given index.
+        """
+        return self.original[i] - self.capacities[i]
+
+    def max_flow(self: FlowNetwork, source: int, sink: int) -> int:
+        """
+        Push as much flow from the source to the sink as the capacities
+        allow, and return how much was pushed.
+        """
+        total = 0
+        while True:
+            levels = self._levels(source)
+            if levels[sink] < 0:
+                return total
+
+            # The next edge of each node to try, so dead ends are not retried
+            next_edge = [0] * len(self.edges)
+            while True:
+                pushed = self._augment(source, sink, levels, next_edge)
+                if not pushed:
+                    break
+                total += pushed
+
+    def _levels(self: FlowNetwork, source: int) -> list[int]:
+        """
+        Return the level of each node: its distance from the source along
+        edges with capacity left, or -1 if it cannot be reached.
+        """
+        levels = [-1] * len(self.edges)
+        levels[source] = 0
+        queue = deque((source,))
+        while queue:
+            u = queue.popleft()
+            for i in self.edges[u]:
+                v = self.targets[i]
+                if (levels[v] < 0) and self.capacities[i]:
+                    levels[v] = levels[u] + 1
+                    queue.append(v)
+        return levels
+
+    def _augment(self: FlowNetwork, source: int, sink: int, levels: list[int], next_edge: list[int]) -> int:
+        """
+        Push flow along one path from the source to the sink, each edge going
+        up a level, and return how much (0 if there is no such path left).
+        """
+        path = []
+        u = source
+        while u != sink:
+            edges = self.edges[u]
+            while next_edge[u] < len(edges):
+                i = edges[next_edge[u]]
+                v = self.targets[i]
+                if self.capacities[i] and (levels[v] == levels[u] + 1):
+                    break
+                next_edge[u] += 1
+            else:
+
+                # A dead end: retreat, and never try the edge to it again
+                if not path:
+                    return 0
+                i = path.pop()
+                u = self.targets[i ^ 1]
+                next_edge[u] += 1
+                continue
+
+            path.append(i)
+            u = v
+
+        pushed = min(self.capacities[i] for i in path)
+        for i in path:
+            self.capacities[i] -= pushed
+            self.capacities[i ^ 1] += pushed
+        return pushed
@@ -0,0 +1,296 @@
+from __future__ import annotations
+import json
+import time
+from typing import Iterable, Iterator
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from tracing import Tracer
+
+class _Phase:
+    """
+    Context manager that times one pass through a phase and adds the elapsed
+    time to its instrumentation when exited.
+    """
+    __slots__ = ('instrumentation', 'name', 'args', 'start')
+
+    instrumentation: Instrumentation
+    name: str
+    args: dict[str, object]|None
+    start: float
+
+    def __init__(self: _Phase, instrumentation: Instrumentation, name: str, args: dict[str, object]|None=None) -> None:
+        """Remember the instrumentation and phase name. Timing starts on enter."""
+        self.instrumentation = instrumentation
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self: _Phase) -> _Phase:
+        """Start the timer."""
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self: _Phase, *exc_info: object) -> None:
+        """Stop the timer and record the elapsed time (even on exceptions)."""
+        self.instrumentation.end_phase(self.name, self.start, time.perf_counter(), self.args)
+
+class _NullPhase:
+    """
+    Context manager that does nothing. Handed out when instrumentation is
+    disabled so that instrumented code costs a method call and nothing else.
+    """
+    __slots__ = ()
+
+    def __enter__(self: _NullPhase) -> _NullPhase:
+        """Do nothing."""
+        return self
+
+    def __exit__(self: _NullPhase, *exc_info: object) -> None:
+        """Do nothing."""
+        return None
+
+NULL_PHASE = _NullPhase()
+
+class Instrumentation:
+    """
+    Collects timings and counters for a run of the scheduler.
+
+    A phase is a named section of code (e.g. distributing choices) that is
+    timed with a monotonic clock every time it runs; its total time and number
+    of calls are aggregated for the whole run. A counter is a named tally of
+    events (e.g. worlds generated). Throughput is derived from the counters
+    and the wall time of the run.
+
+    An event is a counter that is also broken down per world: events are
+    tallied for the world being distributed, and when the world ends, its
+    tallies are folded into per-run totals and per-world minimums, maximums,
+    and means. These are used for the hot paths of distribution (e.g. placing
+    a student in a club), so that optimizations can be verified.
+
+    If a tracer is set, every pass through a phase is also recorded as a span
+    on the tracer's timeline, whether or not timings are enabled.
+
+    When disabled (and not tracing), phase() hands out a shared no-op context
+    manager and count() returns immediately, so instrumentation can stay in
+    the code. Hot paths should still check the enabled flag before calling in.
+    """
+    __slots__ = ('enabled', 'tracer', 'times', 'calls', 'counters', 'events', 'world_events', 'n_worlds', 'run_start', 'run_end')
+
+    enabled: bool
+    tracer: Tracer|None
+    times: dict[str, float]
+    calls: dict[str, int]
+    counters: dict[str, int]
+    events: dict[str, dict[str, int]]
+    world_events: dict[str, int]
+    n_worlds: int
+    run_start: float|None
+    run_end: float|None
+
+    def __init__(self: Instrumentation, enabled: bool=False) -> None:
+        """Initialize this instrumentation, disabled by default, with no data."""
+        self.enabled = enabled
+        self.tracer = None
+        self.reset()
+
+    def reset(self: Instrumentation) -> None:
+        """Forget all timings and counters recorded so far."""
+        self.times = {}
+        self.calls = {}
+        self.counters = {}
+        self.events = {}
+        self.world_events = {}
+        self.n_worlds = 0
+        self.run_start = None
+        self.run_end = None
+
+    def start_run(self: Instrumentation) -> None:
+        """Reset all data and mark the start of the run (for wall time)."""
+        self.reset()
+        self.run_start = time.perf_counter()
+
+    def end_run(self: Instrumentation) -> None:
+        """Mark the end of the run (for wall time)."""
+        self.run_end = time.perf_counter()
+
+    def wall_time(self: Instrumentation) -> float:
+        """
+        Return the seconds elapsed in the run so far (or in total, if ended).
+        """
+        if self.run_start is None:
+            return 0.0
+        end = self.run_end if self.run_end is not None else time.perf_counter()
+        return end - self.run_start
+
+    def phase(self: Instrumentation, name: str, args: dict[str, object]|None=None) -> _Phase|_NullPhase:
+        """
+        Return a context manager that times the enclosed code as the given
+        phase, or a no-op one if disabled. The optional arguments are only
+        shown on the trace.
+        """
+        if not (self.enabled or self.tracer is not None):
+            return NULL_PHASE
+        return _Phase(self, name, args)
+
+    def timed(self: Instrumentation, name: str, iterable: Iterable[object]) -> Iterable[object]:
+        """
+        Return the given iterable, wrapped so that the time spent producing
+        each item counts towards the given phase (if enabled).
+        Useful for generators, whose work happens between yields.
+        """
+        if not (self.enabled or self.tracer is not None):
+            return iterable
+        return self._timed(name, iterable)
+
+    def _timed(self: Instrumentation, name: str, iterable: Iterable[object]) -> Iterator[object]:
+        """
+        Yield the items of the given iterable, timing each step as a phase.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.end_phase(name, start, time.perf_counter())
+                return
+            self.end_phase(name, start, time.perf_counter())
+            yield item
+
+    def end_phase(self: Instrumentation, name: str, start: float, end: float, args: dict[str, object]|None=None) -> None:
+        """
+        Record one pass through the given phase between the given start and end
+        (in perf_counter seconds): add it to the timings if enabled,
+        and to the trace if tracing.
+        """
+        if self.enabled:
+            self.add_time(name, end - start)
+        if self.tracer is not None:
+            self.tracer.complete(name, start, end, args)
+
+    def add_time(self: Instrumentation, name: str, seconds: float) -> None:
+        """
+        Add one call of the given number of seconds to the given phase.
+        """
+        self.times[name] = self.times.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self: Instrumentation, name: str, n: int=1) -> None:
+        """
+        Add n to the given counter (if enabled).
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def event(self: Instrumentation, name: str, n: int=1) -> None:
+        """
+        Add n to the given event for the current world.
+        Unlike count(), the caller is expected to have checked enabled.
+        """
+        self.world_events[name] = self.world_events.get(name, 0) + n
+
+    def begin_world(self: Instrumentation) -> None:
+        """
+        Start tallying events for a new world.
+        """
+        self.world_events = {}
+
+    def end_world(self: Instrumentation) -> None:
+        """
+        Fold the current world's event tallies into the per-run aggregates.
+        Events that did not occur in this world count as 0 for it.
+        """
+        if not self.enabled:
+            return
+
+        self.n_worlds += 1
+
+        for name in set(self.events).union(self.world_events):
+            n = self.world_events.get(name, 0)
+
+            # First time seeing this event: every previous world had 0
+            if name not in self.events:
+                minimum = 0 if self.n_worlds > 1 else n
+                self.events[name] = {'total': 0, 'min': minimum, 'max': 0}
+
+            aggregate = self.events[name]
+            aggregate['total'] += n
+            aggregate['min'] = min(aggregate['min'], n)
+            aggregate['max'] = max(aggregate['max'], n)
+
+        self.world_events = {}
+
+    def to_dict(self: Instrumentation) -> dict[str, object]:
+        """
+        Return the data for this run as a JSON-serializable dictionary.
+        """
+        wall = self.wall_time()
+        return {
+            'wall seconds': wall,
+            'phases': {
+                name: {
+                    'calls': self.calls[name],
+                    'seconds': seconds,
+                    'mean seconds': seconds / self.calls[name],
+                    'share of wall': (seconds / wall) if wall else 0.0
+                } for (name, seconds) in self.times.items()
+            },
+            'counters': {
+                name: {
+                    'count': n,
+                    'per second': (n / wall) if wall else 0.0
+                } for (name, n) in self.counters.items()
+            },
+            'worlds': self.n_worlds,
+            'events': {
+                name: {
+                    'total': aggregate['total'],
+                    'per world': aggregate['total'] / self.n_worlds,
+                    'min per world': aggregate['min'],
+                    'max per world': aggregate['max'],
+                    'per second': (aggregate['total'] / wall) if wall else 0.0
+                } for (name, aggregate) in self.events.items()
+            }
+        }
+
+    def to_json(self: Instrumentation) -> str:
+        """
+        Return the data for this run as a JSON string.
+        """
+        return json.dumps(self.to_dict(), indent=4)
+
+    def format_summary(self: Instrumentation) -> str:
+        """
+        Return a string of the timings and counters formatted as tables.
+        Phases are sorted by total time, descending. Phases can be nested,
+        so the shares of wall time may add up to more than 100%.
+        """
+        data = self.to_dict()
+        lines = [f'Wall time: {data["wall seconds"]:,.3f} seconds', '']
+
+        lines.append(f'{"Phase":<32} {"Calls":>10} {"Total s":>10} {"Mean ms":>10} {"% wall":>7}')
+        lines.append('=' * 73)
+        phases = sorted(data['phases'].items(), key=lambda item: -item[1]['seconds'])
+        for (name, phase) in phases:
+            lines.append(f'{name:<32} {phase["calls"]:>10,} {phase["seconds"]:>10.3f} {phase["mean seconds"] * 1000:>10.3f} {phase["share of wall"] * 100:>6.1f}%')
+
+        if data['counters']:
+            lines.append('')
+            lines.append(f'{"Counter":<32} {"Count":>15} {"Per second":>15}')
+            lines.append('=' * 64)
+            for (name, counter) in sorted(data['counters'].items()):
+                lines.append(f'{name:<32} {counter["count"]:>15,} {counter["per second"]:>15,.1f}')
+
+        if data['events']:
+            lines.append('')
+            lines.append(f'Events across {data["worlds"]:,} worlds')
+            lines.append(f'{"Event":<40} {"Total":>13} {"Per world":>11} {"Min":>9} {"Max":>9}')
+            lines.append('=' * 86)
+            for (name, event) in sorted(data['events'].items()):
+                lines.append(f'{name:<40} {event["total"]:>13,} {event["per world"]:>11,.1f} {event["min per world"]:>9,} {event["max per world"]:>9,}')
+
+        return '\n'.join(lines)
+
+# The instrumentation shared by the whole program (disabled unless enabled)
+INSTRUMENTATION = Instrumentation()
@@ -4,6 +4,7 @@ from pathlib import Path
 import csv
 
 from input_file import InputFile, InputFileColumn
+import week
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -24,11 +25,23 @@ PATH_NICE_NAMES = Path('src/input/renames.csv')
 PATH_EXCLUSIONS = Path('src/input/exclusions.csv')
 PATH_INPUT_SPECS = Path('src/input/_input_specifications.csv')
 
-DAY_TO_INT = {
-    'T': 0,
-    'W': 1,
-    'R': 2
-}
+# The club file's columns around its day columns (one per day of the week)
+CLUB_COLUMNS_BEFORE_DAYS = 2
+CLUB_COLUMN_AFTER_DAYS = 'Lower'
+
+def parse_days() -> None:
+    """
+    Read the days of the week from the headers of the clubs file and set them.
+
+    The columns between the teacher and the lower bound are the days, named
+    by their day letters (e.g. T, W, R), in order. Every other file refers
+    to days by these letters, so this needs to be done before anything else.
+    """
+    with open(PATH_CLUBS, 'r', encoding='utf-8-sig') as f:
+        headers = [c.strip() for c in next(csv.reader(f))]
+
+    end = headers.index(CLUB_COLUMN_AFTER_DAYS)
+    week.set_days(headers[CLUB_COLUMNS_BEFORE_DAYS:end])
 
 def parse_merges(school: School) -> None:
     """
@@ -91,7 +104,7 @@ def parse_splits(school: School) -> None:
             mutually_exclusive = not bool(mutually_inclusive) # Hm :)
             randomize_unmatching = bool(randomize_unmatching)
 
-            new_days = set(DAY_TO_INT[day] for day in new_days.split(';')) if new_days else None
+            new_days = week.mask_of_letters(new_days) if new_days else None
 
             new_min = int(new_min) if new_min else None
             new_max = int(new_max) if new_max else None
@@ -152,8 +165,11 @@ def parse_clubs(school: School):
         next(reader) # Skip headers
 
         for row in reader:
-            club_code, teacher, t, w, r, lower, upper, days_per_instance, decided_instances, min_instances, max_instances, max_instances_per_day, grades, genders, closed, _ = \
-                (c.strip() for c in row)
+            row = [c.strip() for c in row]
+            club_code, teacher = row[:CLUB_COLUMNS_BEFORE_DAYS]
+            day_flags = row[CLUB_COLUMNS_BEFORE_DAYS:CLUB_COLUMNS_BEFORE_DAYS + week.N_DAYS]
+            lower, upper, days_per_instance, decided_instances, min_instances, max_instances, max_instances_per_day, grades, genders, closed, _ = \
+                row[CLUB_COLUMNS_BEFORE_DAYS + week.N_DAYS:]
 
             if not teacher:
                 teacher = None
@@ -173,10 +189,12 @@ def parse_clubs(school: School):
 
             decided_instances = int(decided_instances) if decided_instances else None
 
-            t, w, r, closed = (bool(c) for c in (t, w, r, closed))
+            closed = bool(closed)
 
-            if not (t or w or r):
-                t, w, r = True, True, True
+            # No days flagged means any day
+            days = week.mask_of(i for (i, flag) in enumerate(day_flags) if flag)
+            if not days:
+                days = week.ALL_DAYS
 
             lower, upper, min_instances, max_instances, days_per_instance, max_instances_per_day = \
                 (int(c) for c in (lower, upper, min_instances, max_instances, days_per_instance, max_instances_per_day))
@@ -199,10 +217,7 @@ def parse_clubs(school: School):
 
                 # Replace all this row's data with the split data
                 if split_data.get('new days'):
-                    new_days = split_data.get('new days')
-                    t = 0 in new_days
-                    w = 1 in new_days
-                    r = 2 in new_days
+                    days = split_data.get('new days')
 
                 min_instances = split_data.get('new min instances', min_instances)
                 max_instances = split_data.get('new max instances', max_instances)
@@ -213,7 +228,7 @@ def parse_clubs(school: School):
                 # Register the club and simultaneously set the meta
                 club = school.register_club(split_code)
                 club.set_meta(
-                    teacher, t, w, r,
+                    teacher, days,
                     min_instances, max_instances, days_per_instance, max_instances_per_day,
                     decided_instances,
                     lower, upper,
@@ -281,7 +296,7 @@ def parse_students(school: School):
 
             grade = int(grade)
             exclude = bool(exclude)
-            days_unavailable = set(DAY_TO_INT[day] for day in days_unavailable.split(';')) if days_unavailable else set()
+            days_unavailable = week.mask_of_letters(days_unavailable)
 
             # Exclude the student (e.g. they have left the school but are still in the system)
             if exclude:
@@ -338,8 +353,8 @@ def parse_preselects(school: School) -> None:
 
             student_name, grade, gender, club_code, n_times, forced_days, forced_nondays, force = row
             grade = int(grade)
-            forced_days = set(DAY_TO_INT[d] for d in forced_days.split(';')) if forced_days else set()
-            forced_nondays = set(DAY_TO_INT[d] for d in forced_nondays.split(';')) if forced_nondays else set()
+            forced_days = week.mask_of_letters(forced_days)
+            forced_nondays = week.mask_of_letters(forced_nondays)
             force = bool(force)
             n_times = int(n_times) if n_times else 1
 
@@ -0,0 +1,332 @@
+"""
+The search for the best worlds as a pipeline of stages running at once,
+connected by bounded queues:
+
+    producer (thread)  ->  workers (processes)  ->  merger  ->  writer (thread)
+    layouts of worlds      distribute and score     best N      save reports
+
+The producer generates the layouts of worlds (skipping duplicates) and
+queues a job for each student distribution of each. Workers each take a
+job, create its world, distribute the students, and score them. The merger (the calling thread) keeps the
+best distributions so far; whenever they change, the writer validates and
+saves the reports of those that are new to their rank in the background.
+
+Queues are bounded, so a stage that gets ahead of the next waits for it:
+memory stays bounded however many worlds there are. Workers only send back
+the reports of distributions that can still make the best (scoring at least
+the worst of them so far), since reports are by far the largest messages.
+
+Spawned workers read the school's read-only arrays from shared memory (see problem.py).
+Workers also accumulate the fairness statistics of every distribution (see
+fairness.py), which are merged once they finish.
+
+Each distribution reseeds the random module from the run's seed, its world
+and its configuration number, and ties are broken in that order, so the
+same seed yields the same best worlds with any number of workers.
+"""
+from __future__ import annotations
+import multiprocessing
+import queue
+import random
+import threading
+import time
+import traceback
+
+from report import Report
+from world import World
+from fairness import FairnessStats
+import fairness
+import problem
+import search
+import worlds
+from instrumentation import INSTRUMENTATION
+
+from typing import Callable
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from club import Club
+    from school import School
+    from student import Student
+
+# How many jobs (and results) may be waiting per worker before a stage waits
+QUEUED_PER_WORKER = 4
+
+# How many sets of best worlds may be waiting to be saved before merging waits
+QUEUED_SAVES = 2
+
+# The lowest score, before there are n_best distributions to beat
+NO_SCORE = -(2 ** 63)
+
+def distribution_seed(seed: int, n_world: int, i_configuration: int) -> str:
+    """
+    Return the seed for the random module for the given distribution.
+    """
+    return f'{seed}:{n_world}:{i_configuration}'
+
+def _produce(school: School, n_worlds: int, n_configurations: int, n_workers: int,
+             jobs: multiprocessing.Queue, signatures: worlds.WorldSignatures, seed: int, errors: list[BaseException], root: tuple[int]=()) -> None:
+    """
+    Queue a job for each distribution of each of up to n_worlds worlds
+    (under the given root prefix of the search), as (world number, layout,
+    configuration number) tuples, then a None for each worker to stop at.
+    Any error is kept for the merger to raise.
+    """
+    try:
+        random.seed(search.subtree_seed(seed, 'layouts'))
+        clubs = list(school.clubs.values())
+
+        n_world = 0
+        for layout in worlds.generate_layouts(school, clubs, prefix=root):
+            if n_world >= n_worlds:
+                break
+            if not signatures.add(worlds.layout_signature(layout)):
+                continue
+
+            n_world += 1
+            for i_configuration in range(n_configurations):
+                jobs.put((n_world, layout, i_configuration))
+
+    except BaseException as e:
+        errors.append(e)
+
+    finally:
+        for _ in range(n_workers):
+            jobs.put(None)
+
+def _work(school: School, jobs: multiprocessing.Queue, results: multiprocessing.Queue,
+          threshold: multiprocessing.Value, seed: int, validate_early: bool) -> None:
+    """
+    Distribute and score the students of each job until a None, putting
+    (world number, configuration number, score, validity, report) tuples
+    on the results queue. The report is left out (None) unless the score
+    is at least the threshold. Finish with the fairness statistics of all
+    the distributions (or the traceback of any error), then a None.
+    """
+    INSTRUMENTATION.enabled = False
+    clubs = list(school.clubs.values())
+    students = list(school.students.values())
+    stats = fairness.new_fairness_stats(school)
+    upper_limits = fairness.upper_limits(school)
+
+    try:
+        while (job := jobs.get()) is not None:
+            n_world, layout, i_configuration = job
+
+            # Create the world afresh: balancing can remove its instances,
+            # so a distribution would otherwise depend on the one before
+            search.reset_school(school)
+            worlds.create_layout(clubs, layout)
+
+            random.seed(distribution_seed(seed, n_world, i_configuration))
+            world = World(school, clubs[:], students[:])
+            world.distribute()
+
+            valid = world.validate()[0] if validate_early else True
+            score = world.score()
+            stats.add(world.report, score, upper_limits)
+            report = world.report if (valid and score >= threshold.value) else None
+            results.put((n_world, i_configuration, score, valid, report))
+
+        search.reset_school(school)
+        results.put(stats)
+
+    except BaseException:
+        results.put(traceback.format_exc())
+
+    finally:
+        results.put(None)
+        if school.shared is not None:
+            school.shared.close()
+
+class ReportWriter:
+    """
+    Saves the reports of the best worlds in a background thread, as they
+    change. Each rank's report is saved (with the given function, under a
+    key for that rank) only when a different distribution takes the rank;
+    if the best change again before the last set has been saved, only the
+    latest set is saved.
+    """
+    __slots__ = ('save_report', 'pending', 'saved', 'thread', 'error')
+
+    save_report: Callable[[World, str], None]
+    pending: queue.Queue
+    saved: dict[str, tuple[int, int]]
+    thread: threading.Thread
+    error: BaseException|None
+
+    def __init__(self: ReportWriter, save_report: Callable[[World, str], None]) -> None:
+        """
+        Start saving with the given function, taking a world and its key.
+        """
+        self.save_report = save_report
+        self.pending = queue.Queue(QUEUED_SAVES)
+        self.saved = {}
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='Report writer', daemon=True)
+        self.thread.start()
+
+    def submit(self: ReportWriter, best: list[tuple[int, int, int, World]]) -> None:
+        """
+        Queue the given best worlds, as (score, world number, configuration
+        number, world) tuples from best to worst, to be saved. Waits if
+        too many are already queued.
+        """
+        self.pending.put(best)
+
+    def close(self: ReportWriter) -> None:
+        """
+        Wait for all queued worlds to be saved, and raise any error from doing so.
+        """
+        self.pending.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self: ReportWriter) -> None:
+        """
+        Save the latest queued best worlds until closed.
+        """
+        closed = False
+        while not closed:
+            best = self.pending.get()
+
+            # Skip ahead to the latest set of best worlds
+            while True:
+                try:
+                    latest = self.pending.get_nowait()
+                except queue.Empty:
+                    break
+                if latest is None:
+                    closed = True
+                else:
+                    best = latest
+
+            if best is None:
+                break
+            if self.error is not None:
+                continue
+
+            try:
+                for (i, (_, n_world, i_configuration, world)) in enumerate(best):
+                    key = chr(65 + i)
+                    if self.saved.get(key) != (n_world, i_configuration):
+                        self.save_report(world, key)
+                        self.saved[key] = (n_world, i_configuration)
+            except BaseException as e:
+                self.error = e
+
+def _world_of(school: School, clubs: list[Club], students: list[Student], report: Report) -> World:
+    """
+    Return a world of the given school holding the given report (of a
+    distribution since reset), for validating and saving.
+    """
+    world = World(school, clubs[:], students[:])
+    world.report = report
+    return world
+
+def run_pipeline(school: School, n_worlds: int, n_configurations: int, n_best: int, seed: int,
+                 n_workers: int=1, validate_early: bool=False,
+                 save_report: Callable[[World, str], None]|None=None, root: tuple[int]=()) -> tuple[list[tuple[int, World]], int, FairnessStats]:
+    """
+    Search for the best worlds of the given school through the pipeline:
+    n_worlds worlds, each with n_configurations student distributions,
+    distributed by n_workers worker processes. Given a function to save
+    reports with (taking a world and its key), the best worlds are saved
+    in the background as they change. Given a root prefix, only its subtree
+    of the search is searched.
+
+    Return a list of (score, world) tuples of the n_best top scorers
+    (ascending), the number of duplicate worlds skipped, and the fairness
+    statistics of all distributions.
+    """
+    n_workers = max(1, n_workers)
+    context = search.pool_context()
+    problem.share_school(school, context)
+    try:
+        return _run_pipeline(school, n_worlds, n_configurations, n_best, seed, n_workers, validate_early, save_report, context, root)
+    finally:
+        problem.unshare_school(school)
+
+def _run_pipeline(school: School, n_worlds: int, n_configurations: int, n_best: int, seed: int, n_workers: int,
+                  validate_early: bool, save_report: Callable[[World, str], None]|None,
+                  context: multiprocessing.context.BaseContext, root: tuple[int]=()) -> tuple[list[tuple[int, World]], int, FairnessStats]:
+    """
+    Run the pipeline (see run_pipeline) with workers from the given context.
+    """
+    start = time.perf_counter()
+    clubs = list(school.clubs.values())
+    students = list(school.students.values())
+
+    jobs = context.Queue(QUEUED_PER_WORKER * n_workers)
+    results = context.Queue(QUEUED_PER_WORKER * n_workers)
+    threshold = context.Value('q', NO_SCORE, lock=False)
+
+    # Start the workers before any threads, so they are forked without them
+    workers = [context.Process(target=_work, args=(school, jobs, results, threshold, seed, validate_early), daemon=True) for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+
+    signatures = worlds.WorldSignatures()
+    errors = []
+    producer = threading.Thread(target=_produce, args=(school, n_worlds, n_configurations, n_workers, jobs, signatures, seed, errors, root), name='World producer', daemon=True)
+    producer.start()
+    writer = ReportWriter(save_report) if save_report is not None else None
+    print(f'Searching {n_worlds:,} worlds through a pipeline with {n_workers:,} worker(s)')
+
+    # Merge the results as they come: best first, ties going to the earlier world and configuration
+    best = []
+    stats = fairness.new_fairness_stats(school)
+    n_tested = 0
+    n_valid = 0
+    n_finished = 0
+    progress_every = max(10, min(1_000, (n_worlds * n_configurations) // 100))
+
+    with INSTRUMENTATION.phase('pipeline'):
+        while n_finished < n_workers:
+            result = results.get()
+            if result is None:
+                n_finished += 1
+                continue
+            if isinstance(result, str):
+                errors.append(RuntimeError(f'Pipeline worker failed:\n{result}'))
+                continue
+            if isinstance(result, FairnessStats):
+                stats.merge(result)
+                continue
+
+            n_world, i_configuration, score, valid, report = result
+            n_tested += 1
+            n_valid += valid
+            INSTRUMENTATION.count('distributions')
+
+            if report is not None:
+                entry = (score, n_world, i_configuration, report)
+                key = lambda t: (-t[0], t[1], t[2])
+                if len(best) < n_best or key(entry) < key(best[-1]):
+                    best.append(entry)
+                    best.sort(key=key)
+                    del best[n_best:]
+
+                    if len(best) == n_best:
+                        threshold.value = best[-1][0]
+                    if writer is not None:
+                        writer.submit([(s, w, i, _world_of(school, clubs, students, r)) for (s, w, i, r) in best])
+
+            if not (n_tested % progress_every):
+                stem = f'{time.perf_counter() - start:,.2f} seconds: Tested {n_tested:,} worlds'
+                if validate_early:
+                    stem += f', {n_valid} valid'
+                print(stem)
+
+    for worker in workers:
+        worker.join()
+    if writer is not None:
+        writer.close()
+
+    # If workers failed, the producer may be left waiting on a full queue
+    if errors:
+        jobs.cancel_join_thread()
+        raise errors[0]
+    producer.join()
+
+    return [(score, _world_of(school, clubs, students, report)) for (score, _, _, report) in reversed(best)], signatures.n_duplicates, stats
@@ -0,0 +1,444 @@
+"""
+A placer of club instances on days by graph partitioning, as an alternative
+to the search of worlds.py.
+
+Placing clubs so that clubs often chosen together run on different days is
+a weighted max-k-cut of the repulsion graph, k being the number of days:
+the repulsion between every two instances sharing a day (once per day they
+share) is lost, and the rest is cut. The search places one instance at a
+time on the least repulsive days and never revisits a placement. Here, a
+greedy placement in the same order is refined by passes of Kernighan-Lin
+moves, as Fiduccia and Mattheyses made them: each pass moves every instance
+once, taking the best move each time even if it loses repulsion, then goes
+back to the best point reached, so that a pass can climb out of a local
+optimum. Passes repeat while they gain. A move costs a pass over the days of
+its club's repulsions, so a pass is quadratic in the instances at worst,
+and near-linear when few moves are feasible.
+
+Moves respect what the search does: a club's available days, its maximum
+instances per day, its teacher's other instances, and the days of splits
+that must run on separate days. They also never take a day's places (the
+upper limits of the instances on it) below the students available that day,
+unless it already was. Foreknown instances are placed as the search places
+them (see worlds.foreknown_layout), and never moved.
+
+The layout placed can be created and evaluated as a world directly, or its
+path (see worlds.layout_path) used as a prefix to seed the search with.
+
+For small schools (up to about 30 clubs), place_exactly finds the placement
+that loses the least repulsion of all, by branch and bound, to measure the
+heuristics against (see tools/placement_gap.py).
+"""
+from __future__ import annotations
+import math
+
+import week
+import worlds
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from club import Club
+    from school import School
+
+# How many refinement passes to make at most
+MAX_PASSES = 10
+
+# How many nodes the exact solver visits at most before giving up on a proof
+MAX_NODES = 1_000_000
+
+class Placement:
+    """
+    A placement of the free club instances on days, with what is needed to
+    move them quickly: indexed by position in the list of clubs, each club's
+    repulsion to each day (summed over the instances on it), its instances
+    on each day, and the clubs it must not share days with; by teacher, the
+    instances on each day; and by day, the places and the demand for them.
+    Instances are indexed in the order they were placed.
+    """
+    __slots__ = ('clubs', 'repulsions', 'pulls', 'counts', 'teacher_counts', 'separate', 'places', 'demand', 'instances', 'days')
+
+    clubs: list[Club]
+    repulsions: list[list[int]]
+    pulls: list[list[int]]
+    counts: list[list[int]]
+    teacher_counts: dict[str, list[int]]
+    separate: list[list[int]]
+    places: list[int]
+    demand: list[int]
+    instances: list[int]
+    days: list[int]
+
+    def __init__(self: Placement, school: School, clubs: list[Club]) -> None:
+        """Prepare to place the given clubs of the given school, with no instances placed."""
+        index = {c.code: k for (k, c) in enumerate(clubs)}
+        self.clubs = clubs
+        self.repulsions = [[a.repulsion(b) for b in clubs] for a in clubs]
+        self.pulls = [[0] * week.N_DAYS for _ in clubs]
+        self.counts = [[0] * week.N_DAYS for _ in clubs]
+        self.teacher_counts = {c.teacher.name: [0] * week.N_DAYS for c in clubs if c.teacher is not None}
+        self.places = [0] * week.N_DAYS
+        self.demand = [sum(1 for s in school.students.values() if not (s.days_unavailable & (1 << day))) for day in range(week.N_DAYS)]
+        self.instances = []
+        self.days = []
+
+        # Splits to separate days keep their branches apart both ways
+        self.separate = [[] for _ in clubs]
+        for (k, c) in enumerate(clubs):
+            for other_code in school.splits_to_separate_days.get(c.code, {}):
+                for peer_code in school.get_all_split_codes(other_code):
+                    l = index.get(peer_code)
+                    if (l is not None) and (l != k):
+                        self.separate[k].append(l)
+                        self.separate[l].append(k)
+
+    def add(self: Placement, k: int, days: int, sign: int=1) -> None:
+        """
+        Add an instance of the kth club on the given days to the tallies
+        (or, with a sign of -1, take it away).
+        """
+        club = self.clubs[k]
+        for day in week.DAYS_IN[days]:
+            for (l, repulsion) in enumerate(self.repulsions[k]):
+                self.pulls[l][day] += sign * repulsion
+            self.counts[k][day] += sign
+            self.places[day] += sign * club.upper
+            if club.teacher is not None:
+                self.teacher_counts[club.teacher.name][day] += sign
+
+    def place(self: Placement, k: int, days: int) -> int:
+        """
+        Place a new free instance of the kth club on the given days,
+        and return its index.
+        """
+        self.add(k, days)
+        self.instances.append(k)
+        self.days.append(days)
+        return len(self.instances) - 1
+
+    def move(self: Placement, i: int, days: int) -> None:
+        """Move the ith instance to the given days."""
+        self.add(self.instances[i], self.days[i], -1)
+        self.add(self.instances[i], days)
+        self.days[i] = days
+
+    def cost(self: Placement, k: int, days: int, current: int=0) -> int:
+        """
+        Return the repulsion lost by an instance of the kth club on the given
+        days, to the instances on them other than itself (on the current days).
+        """
+        return sum(self.pulls[k][day] for day in week.DAYS_IN[days]) - self.repulsions[k][k] * week.N_DAYS_IN[days & current]
+
+    def is_feasible(self: Placement, k: int, days: int, current: int=0) -> bool:
+        """
+        Return True iff an instance of the kth club can be on the given days,
+        moving from the current ones (see module docs).
+        """
+        club = self.clubs[k]
+        for day in week.DAYS_IN[days]:
+            here = (current >> day) & 1
+            if self.counts[k][day] - here >= club.max_instances_per_day:
+                return False
+            if (club.teacher is not None) and (self.teacher_counts[club.teacher.name][day] - here):
+                return False
+            if any(self.counts[l][day] for l in self.separate[k]):
+                return False
+
+        for day in week.DAYS_IN[current & ~days]:
+            if self.demand[day] <= self.places[day] < self.demand[day] + club.upper:
+                return False
+
+        return True
+
+    def options(self: Placement, k: int) -> tuple[int]:
+        """
+        Return the sets of days the kth club's instances could be on.
+        """
+        club = self.clubs[k]
+        if club.days_per_instance >= week.N_DAYS:
+            return (week.mask_of(range(week.N_DAYS)),)
+        return week.subsets_of(club.pre_days, club.days_per_instance)
+
+    def place_greedily(self: Placement, k: int) -> int:
+        """
+        Place a new free instance of the kth club on its feasible days that
+        lose the least repulsion, then have the fewest of its instances and
+        the most places to spare (or on its available days, if none are
+        feasible). Return its index.
+        """
+        options = self.options(k)
+        feasible = [days for days in options if self.is_feasible(k, days)] or list(options)
+
+        def _key(days: int) -> tuple[int]:
+            return (
+                self.cost(k, days),
+                max(self.counts[k][day] for day in week.DAYS_IN[days]),
+                -min(self.places[day] - self.demand[day] for day in week.DAYS_IN[days])
+            )
+
+        return self.place(k, min(feasible, key=_key))
+
+    def refine(self: Placement, max_passes: int=MAX_PASSES) -> int:
+        """
+        Refine the placement by passes of moves (see module docs), and return
+        the total repulsion gained.
+        """
+        gained = 0
+        for _ in range(max_passes):
+            gain = self._pass()
+            if gain <= 0:
+                break
+            gained += gain
+        return gained
+
+    def _pass(self: Placement) -> int:
+        """
+        Move every instance once, each time making the best feasible move
+        of an instance not yet moved, then undo the moves after the point
+        of greatest gain. Return that gain.
+        """
+        unmoved = set(range(len(self.instances)))
+        moves = []
+        gain = best_gain = 0
+        n_kept = 0
+
+        while unmoved:
+            best = None
+            for i in unmoved:
+                k = self.instances[i]
+                current = self.days[i]
+                loss = self.cost(k, current, current)
+                for days in self.options(k):
+                    if (days == current) or not self.is_feasible(k, days, current):
+                        continue
+                    move_gain = loss - self.cost(k, days, current)
+                    if (best is None) or (move_gain > best[0]):
+                        best = (move_gain, i, days)
+
+            if best is None:
+                break
+
+            (move_gain, i, days) = best
+            moves.append((i, self.days[i]))
+            self.move(i, days)
+            unmoved.discard(i)
+
+            gain += move_gain
+            if gain > best_gain:
+                best_gain = gain
+                n_kept = len(moves)
+
+        for (i, days) in reversed(moves[n_kept:]):
+            self.move(i, days)
+
+        return best_gain
+
+    def layout(self: Placement, base: dict[str, list[int]]) -> dict[str, list[int]]:
+        """
+        Return the layout of the given base layout (of foreknown instances)
+        with the free instances placed added.
+        """
+        layout = {code: sets_of_days[:] for (code, sets_of_days) in base.items()}
+        for (k, days) in zip(self.instances, self.days):
+            layout[self.clubs[k].code].append(days)
+        return layout
+
+def _base_placement(school: School, clubs: list[Club]) -> tuple[dict[str, list[int]], Placement]:
+    """
+    Return the layout of the given clubs' foreknown instances, and a placement
+    with them tallied (they are fixed, so not among its instances).
+    """
+    base = worlds.foreknown_layout(school, clubs)
+    placement = Placement(school, clubs)
+    for (k, c) in enumerate(clubs):
+        for days in base[c.code]:
+            placement.add(k, days)
+    return (base, placement)
+
+def free_instances(clubs: list[Club]) -> list[int]:
+    """
+    Return the free instances of the given clubs to place, by position in
+    the list of clubs, in the order the search places them.
+    """
+    free = [k for (k, c) in enumerate(clubs) if not c.instances_are_foreknown() for _ in range(c.min_instances)]
+    return sorted(free, key=lambda k: -clubs[k].total_repulsion)
+
+def _cut(school: School, clubs: list[Club], max_passes: int) -> tuple[dict[str, list[int]], Placement]:
+    """
+    Return the layout of the given clubs' foreknown instances, and the
+    placement of their free instances by a cut (see place_by_cut).
+    """
+    (base, placement) = _base_placement(school, clubs)
+    for k in free_instances(clubs):
+        placement.place_greedily(k)
+    placement.refine(max_passes)
+    return (base, placement)
+
+def place_by_cut(school: School, clubs: list[Club], max_passes: int=MAX_PASSES) -> dict[str, list[int]]:
+    """
+    Return a layout for the given clubs (see worlds.generate_layouts) placed
+    by a greedy max-k-cut of their repulsions, refined by passes of moves
+    (see module docs). The clubs are not changed.
+    """
+    (base, placement) = _cut(school, clubs, max_passes)
+    return placement.layout(base)
+
+def _is_feasible(school: School, clubs: list[Club], placement: Placement) -> bool:
+    """
+    Return True iff the given placement of the given clubs' free instances
+    meets the constraints (greedy placements may not, if nothing did).
+    """
+    (_, replay) = _base_placement(school, clubs)
+    for (k, days) in zip(placement.instances, placement.days):
+        if not replay.is_feasible(k, days):
+            return False
+        replay.add(k, days)
+    return True
+
+class ExactPlacement:
+    """
+    The result of place_exactly: the layout found, the repulsion it loses,
+    whether it meets the constraints, whether it is proven to lose the least
+    of those that do (or that none do), and how many nodes were visited.
+    """
+    __slots__ = ('layout', 'lost', 'feasible', 'proven', 'n_nodes')
+
+    layout: dict[str, list[int]]
+    lost: int
+    feasible: bool
+    proven: bool
+    n_nodes: int
+
+    def __init__(self: ExactPlacement, layout: dict[str, list[int]], lost: int, feasible: bool, proven: bool, n_nodes: int) -> None:
+        """Initialize this result with the given data."""
+        self.layout = layout
+        self.lost = lost
+        self.feasible = feasible
+        self.proven = proven
+        self.n_nodes = n_nodes
+
+def place_exactly(school: School, clubs: list[Club], max_nodes: int=MAX_NODES, symmetry: bool=True) -> ExactPlacement:
+    """
+    Return the layout for the given clubs that loses the least repulsion
+    (see lost_repulsion) under the search's constraints: available days,
+    instances per day, teachers, splits to separate days, and foreknown
+    instances. It is found by branch and bound, placing the free instances
+    in the search's order, from the cut's placement (see place_by_cut) as
+    the first incumbent. The clubs are not changed.
+
+    A node is pruned once the repulsion lost so far, plus the least each
+    instance left would lose to those already placed on its best feasible
+    days, is no less than the incumbent's. Days are tried least repulsive
+    first. Symmetric placements are only tried once: among sets of days
+    symmetric by a swap of interchangeable days (see worlds.canonical_days),
+    with symmetry, and among a club's instances, whose sets of days are
+    taken in increasing order.
+
+    The search stops after max_nodes nodes; the result is then the best
+    found, and not proven. If no layout meets the constraints, the cut's
+    is returned, as not feasible.
+    """
+    (base, placement) = _base_placement(school, clubs)
+    free = free_instances(clubs)
+    fixed = lost_repulsion(clubs, base)
+
+    (_, cut) = _cut(school, clubs, MAX_PASSES)
+    cut_layout = cut.layout(base)
+    cut_lost = lost_repulsion(clubs, cut_layout) - fixed
+    feasible = _is_feasible(school, clubs, cut)
+    (best_layout, best_lost) = (cut_layout, cut_lost) if feasible else (None, math.inf)
+    taken = [0] * len(free)
+    n_nodes = 0
+    proven = True
+
+    if symmetry:
+        day_classes = worlds.interchangeable_days(school, clubs)
+        for sets_of_days in base.values():
+            for days in sets_of_days:
+                day_classes = worlds.refine_days(day_classes, days)
+    else:
+        day_classes = [1 << day for day in range(week.N_DAYS)]
+
+    def _options(i: int, classes: list[int]) -> list[tuple[int, int]]:
+        """
+        Return the feasible sets of days for the ith free instance given
+        those placed before it, as (repulsion lost, days) tuples, least first.
+        """
+        k = free[i]
+        options = set()
+        for days in placement.options(k):
+            days = worlds.canonical_days(days, classes)
+            if (i > 0) and (free[i - 1] == k) and (days < taken[i - 1]):
+                continue
+            if placement.is_feasible(k, days):
+                options.add((placement.cost(k, days), days))
+        return sorted(options)
+
+    def _least(i: int) -> int|None:
+        """
+        Return the least repulsion the ith free instance could lose to those
+        placed so far, or None if it cannot be placed.
+        """
+        k = free[i]
+        costs = [placement.cost(k, days) for days in placement.options(k) if placement.is_feasible(k, days)]
+        return min(costs) if costs else None
+
+    def _branch(i: int, lost: int, classes: list[int]) -> None:
+        """
+        Place the free instances from the ith on, having lost the given
+        repulsion so far, keeping any placement better than the incumbent.
+        """
+        nonlocal best_layout, best_lost, feasible, n_nodes, proven
+
+        n_nodes += 1
+        if n_nodes > max_nodes:
+            proven = False
+            return
+
+        # All placed: a new incumbent
+        if i == len(free):
+            if lost < best_lost:
+                feasible = True
+                best_lost = lost
+                best_layout = {code: sets_of_days[:] for (code, sets_of_days) in base.items()}
+                for (k, days) in zip(free, taken):
+                    best_layout[clubs[k].code].append(days)
+            return
+
+        # Bound what is left
+        rest = 0
+        for j in range(i + 1, len(free)):
+            least = _least(j)
+            if least is None:
+                return
+            rest += least
+
+        for (cost, days) in _options(i, classes):
+            if lost + cost + rest >= best_lost:
+                break
+
+            taken[i] = days
+            placement.add(free[i], days)
+            _branch(i + 1, lost + cost, worlds.refine_days(classes, days))
+            placement.add(free[i], days, -1)
+
+            if not proven:
+                return
+
+    _branch(0, 0, day_classes)
+    if not feasible:
+        return ExactPlacement(cut_layout, cut_lost + fixed, False, proven, n_nodes)
+    return ExactPlacement(best_layout, best_lost + fixed, True, proven, n_nodes)
+
+def lost_repulsion(clubs: list[Club], layout: dict[str, list[int]]) -> int:
+    """
+    Return the repulsion lost by the given layout of the given clubs: that
+    between every two instances on the same day, for each day they share.
+    The lower, the better the cut.
+    """
+    blocks = [[] for _ in range(week.N_DAYS)]
+    for c in clubs:
+        for days in layout[c.code]:
+            for day in week.DAYS_IN[days]:
+                blocks[day].append(c)
+
+    return sum(block[i].repulsion(block[j]) for block in blocks for i in range(len(block)) for j in range(i + 1, len(block)))
@@ -0,0 +1,219 @@
+"""
+The prepared problem, encoded as flat arrays in one block of shared memory,
+for spawned worker processes to read rather than have pickled to them.
+
+A school's read-only data after preparation is encoded as arrays, indexed
+by student and club ids (see School.assign_ids):
+
+    repulsions                [club, club]        see School.calculate_repulsions
+    grades                    [student]
+    days unavailable          [student]           sets of days (see week.py)
+    reactivities              [student]           see School.calculate_reactivities
+    choices                   [student, choice]   club ids by choice key - 1 (-1 if none)
+    preselects                [student, k]        club ids preselected (-1 if none)
+    preselect times           [student, k]        times preselected for each
+
+Sharing a school (see share_school) points its repulsions at the rows of
+the shared block, and pickles it with only a handle to the block in place
+of its repulsions and its students, but for their names and genders; a
+worker attaches to the block and rebuilds its students from it (see
+attach_school). The rest of the school (clubs' meta, teachers) is small next
+to them, and is pickled as it is. Everything else a worker changes
+(instances, students placed) stays private to it.
+
+Forked workers inherit the school as it is, without pickling or copies
+until they write to it, so the school is only shared with spawned ones.
+"""
+from __future__ import annotations
+from multiprocessing import shared_memory
+import array
+import math
+import multiprocessing
+import os
+
+from student import Student
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from school import School
+
+# Bytes per item of each array typecode used
+_ITEM_SIZES = {typecode: array.array(typecode).itemsize for typecode in 'bBhiq'}
+
+class SharedProblem:
+    """
+    A school's prepared problem (see module docs) in a block of shared memory.
+    The layout maps each array's name to its typecode, offset in the block,
+    and shape. Pickled, it is only the name of the block and its layout;
+    unpickled, it attaches to the block.
+    """
+    __slots__ = ('memory', 'layout', 'owner', 'views')
+
+    memory: shared_memory.SharedMemory
+    layout: dict[str, tuple[str, int, tuple[int]]]
+    owner: int
+    views: list[memoryview]
+
+    def __init__(self: SharedProblem, memory: shared_memory.SharedMemory, layout: dict[str, tuple[str, int, tuple[int]]], owner: int) -> None:
+        """
+        Initialize this problem with the given block and layout, owned by the
+        process with the given id, which unlinks the block when closing it
+        (forked workers also have this problem, but do not own it).
+        """
+        self.memory = memory
+        self.layout = layout
+        self.owner = owner
+        self.views = []
+
+    def __getstate__(self: SharedProblem) -> tuple[str, dict[str, tuple[str, int, tuple[int]]]]:
+        """Return the name of the block and its layout, to attach to."""
+        return (self.memory.name, self.layout)
+
+    def __setstate__(self: SharedProblem, state: tuple[str, dict[str, tuple[str, int, tuple[int]]]]) -> None:
+        """
+        Attach to the named block, which only its owner is to unlink.
+        """
+        name, layout = state
+        self.memory = shared_memory.SharedMemory(name)
+        self.layout = layout
+        self.owner = 0
+        self.views = []
+
+    def array(self: SharedProblem, name: str) -> memoryview:
+        """
+        Return the named array, flat, as a view of the block.
+        """
+        typecode, offset, shape = self.layout[name]
+        size = math.prod(shape) * _ITEM_SIZES[typecode]
+        view = self.memory.buf[offset:offset + size].cast(typecode)
+        self.views.append(view)
+        return view
+
+    def rows(self: SharedProblem, name: str) -> list[memoryview]:
+        """
+        Return the rows of the named two-dimensional array, as views of the block.
+        """
+        flat = self.array(name)
+        n_rows, n_columns = self.layout[name][2]
+        rows = [flat[i * n_columns:(i + 1) * n_columns] for i in range(n_rows)]
+        self.views.extend(rows)
+        return rows
+
+    def close(self: SharedProblem) -> None:
+        """
+        Release all views of the block and close it; unlink it if owned by
+        this process. Nothing may still use the views.
+        """
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        self.memory.close()
+        if self.owner == os.getpid():
+            self.memory.unlink()
+
+def encode_school(school: School) -> dict[str, tuple[str, tuple[int], list[int]]]:
+    """
+    Return the arrays of the given prepared school (see module docs),
+    mapping each name to its typecode, shape, and values (flat).
+    """
+    n_clubs = len(school.club_list)
+    students = school.student_list
+    k = max([len(s.pre_ids) for s in students] + [1])
+    pres = [list(s.pre_ids.items()) + [(-1, 0)] * (k - len(s.pre_ids)) for s in students]
+    return {
+        'repulsions': ('i', (n_clubs, n_clubs), [r for row in school.repulsions for r in row]),
+        'grades': ('h', (len(students),), [s.grade for s in students]),
+        'days unavailable': ('B', (len(students),), [s.days_unavailable for s in students]),
+        'reactivities': ('i', (len(students),), [s.reactivity for s in students]),
+        'choices': ('i', (len(students), 5), [s.choice_ids.get(key, -1) for s in students for key in range(1, 6)]),
+        'preselects': ('i', (len(students), k), [club_id for row in pres for (club_id, _) in row]),
+        'preselect times': ('B', (len(students), k), [n_times for row in pres for (_, n_times) in row])
+    }
+
+def create_problem(school: School) -> SharedProblem:
+    """
+    Encode the given prepared school into a new block of shared memory,
+    owned by this process, and return it.
+    """
+    arrays = encode_school(school)
+
+    # Lay the arrays out one after another, each aligned to 8 bytes
+    layout = {}
+    size = 0
+    for (name, (typecode, shape, _)) in arrays.items():
+        layout[name] = (typecode, size, shape)
+        size += -(-(math.prod(shape) * _ITEM_SIZES[typecode]) // 8) * 8
+
+    problem = SharedProblem(shared_memory.SharedMemory(create=True, size=max(8, size)), layout, os.getpid())
+    for (name, (typecode, _, values)) in arrays.items():
+        problem.array(name)[:] = array.array(typecode, values)
+
+    return problem
+
+def decode_students(school: School, names_and_genders: list[tuple[str, str]]) -> None:
+    """
+    Rebuild the given school's students, with the given names and genders
+    in id order, from its shared problem. Their preselects are those of
+    clubs that run, the only ones a worker uses.
+    """
+    problem = school.shared
+    grades = problem.array('grades')
+    days_unavailable = problem.array('days unavailable')
+    reactivities = problem.array('reactivities')
+    choices = problem.rows('choices')
+    preselects = problem.rows('preselects')
+    preselect_times = problem.rows('preselect times')
+
+    school.student_list = []
+    for (i, (name, gender)) in enumerate(names_and_genders):
+        student = Student(i, name, grades[i], gender, [], days_unavailable[i])
+        student.choice_ids = {key + 1: club_id for (key, club_id) in enumerate(choices[i]) if club_id >= 0}
+        student.choices = {key: school.club_list[club_id].code for (key, club_id) in student.choice_ids.items()}
+        student.first_choice_key = min(student.choices) if student.choices else 0
+        student.pre_ids = {club_id: n_times for (club_id, n_times) in zip(preselects[i], preselect_times[i]) if club_id >= 0}
+        student.pres = {school.club_list[club_id].code: n_times for (club_id, n_times) in student.pre_ids.items()}
+        student.reactivity = reactivities[i]
+        student.reset_distribution()
+        school.student_list.append(student)
+
+    school.students = {student.name: student for student in school.student_list}
+    school.reactivities = {student.name: student.reactivity for student in school.student_list}
+
+def attach_school(school: School, names_and_genders: list[tuple[str, str]]|None=None) -> None:
+    """
+    Point the given school's repulsions (and its clubs') at the rows of
+    its shared problem; given its students' names and genders (see
+    School.__getstate__), rebuild its students from it too.
+    """
+    school.repulsions = school.shared.rows('repulsions')
+    for club in school.club_list:
+        club.repulsions = school.repulsions[club.id]
+    if names_and_genders is not None:
+        decode_students(school, names_and_genders)
+
+def share_school(school: School, context: multiprocessing.context.BaseContext) -> SharedProblem|None:
+    """
+    Encode the given prepared school into shared memory (see create_problem)
+    and have it use the shared arrays, until unshared, if workers of the
+    given context are spawned; forked ones inherit it as it is. Return the
+    problem, if any.
+    """
+    if context.get_start_method() == 'fork':
+        return None
+    school.shared = create_problem(school)
+    attach_school(school)
+    return school.shared
+
+def unshare_school(school: School) -> None:
+    """
+    Have the given school use private copies of its arrays again,
+    and close (and unlink) its shared problem, if it has one.
+    """
+    problem = school.shared
+    if problem is None:
+        return
+    school.repulsions = [list(row) for row in school.repulsions]
+    for club in school.club_list:
+        club.repulsions = school.repulsions[club.id]
+    school.shared = None
+    problem.close()
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import os
+import signal
+import sys
+import threading
+import time
+from types import FrameType
+
+# Seconds between samples
+DEFAULT_INTERVAL = 0.005
+
+class SamplingProfiler:
+    """
+    A low-overhead statistical profiler using only the standard library.
+
+    Every interval, the main thread's call stack is sampled and tallied.
+    Since nothing happens on each function call (unlike cProfile), the many
+    small calls in clubs and club instances are not distorted.
+
+    Where available (Unix), sampling is driven by a CPU-time interval timer
+    and a signal handler, which runs on the main thread between bytecodes.
+    Otherwise (e.g. Windows), a daemon thread wakes up every interval and
+    peeks at the main thread's current frame.
+
+    The results can be saved as collapsed stacks (one line per unique stack:
+    frames separated by semicolons, then a space and the sample count), which
+    flamegraph tools such as flamegraph.pl and speedscope accept, and as a
+    text summary of the top functions by own and total samples.
+    """
+    __slots__ = ('interval', 'stacks', 'n_samples', 'mode', 'start_time', 'duration', '_thread', '_stop', '_main_thread_id', '_previous_handler')
+
+    interval: float
+    stacks: dict[tuple[str, ...], int]
+    n_samples: int
+    mode: str
+    start_time: float
+    duration: float
+
+    def __init__(self: SamplingProfiler, interval: float=DEFAULT_INTERVAL) -> None:
+        """
+        Initialize this profiler to sample every interval (in seconds).
+        Nothing is sampled until it is started.
+        """
+        self.interval = interval
+        self.stacks = {}
+        self.n_samples = 0
+        self.mode = ''
+        self.start_time = 0.0
+        self.duration = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+        self._main_thread_id = threading.main_thread().ident
+        self._previous_handler = None
+
+    def start(self: SamplingProfiler) -> None:
+        """
+        Start sampling. Use the signal timer if possible, else a thread.
+        """
+        self.start_time = time.perf_counter()
+
+        can_use_signal = hasattr(signal, 'setitimer') and (threading.current_thread() is threading.main_thread())
+        if can_use_signal:
+            self.mode = 'signal'
+            self._previous_handler = signal.signal(signal.SIGPROF, self._handle_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.mode = 'thread'
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self: SamplingProfiler) -> None:
+        """
+        Stop sampling and restore whatever was in place before.
+        """
+        if self.mode == 'signal':
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        elif self.mode == 'thread':
+            self._stop.set()
+            self._thread.join()
+
+        self.duration += time.perf_counter() - self.start_time
+
+    def __enter__(self: SamplingProfiler) -> SamplingProfiler:
+        """Start sampling for the duration of a with block."""
+        self.start()
+        return self
+
+    def __exit__(self: SamplingProfiler, *exc_info: object) -> None:
+        """Stop sampling at the end of a with block."""
+        self.stop()
+
+    def _handle_signal(self: SamplingProfiler, signum: int, frame: FrameType|None) -> None:
+        """
+        Record the interrupted frame's stack (signal mode).
+        """
+        self._record(frame)
+
+    def _sample_loop(self: SamplingProfiler) -> None:
+        """
+        Record the main thread's stack every interval until stopped (thread mode).
+        """
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._main_thread_id)
+            self._record(frame)
+
+    def _record(self: SamplingProfiler, frame: FrameType|None) -> None:
+        """
+        Tally the stack ending in the given frame, outermost frame first.
+        """
+        if frame is None:
+            return
+
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        stack.reverse()
+
+        key = tuple(stack)
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.n_samples += 1
+
+    def collapsed_stacks(self: SamplingProfiler) -> list[str]:
+        """
+        Return the samples as lines of collapsed stacks, most common first.
+        """
+        items = sorted(self.stacks.items(), key=lambda item: -item[1])
+        return [f'{";".join(stack)} {n}' for (stack, n) in items]
+
+    def top_functions(self: SamplingProfiler) -> list[tuple[str, int, int]]:
+        """
+        Return a list of (function, own samples, total samples) tuples sorted
+        by own samples, descending. Own samples are those in which the function
+        was running; total samples are those in which it was anywhere on the
+        stack (counted once per sample, even if recursive).
+        """
+        own = {}
+        total = {}
+
+        for (stack, n) in self.stacks.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + n
+            for label in set(stack):
+                total[label] = total.get(label, 0) + n
+
+        functions = [(label, own.get(label, 0), n) for (label, n) in total.items()]
+        functions.sort(key=lambda t: (-t[1], -t[2]))
+        return functions
+
+    def format_summary(self: SamplingProfiler, n: int=40) -> str:
+        """
+        Return a string of the top n functions by own samples, with their
+        shares of all samples, formatted as a table.
+        """
+        lines = [
+            f'{self.n_samples:,} samples over {self.duration:,.2f} seconds ({self.mode} mode, every {self.interval * 1000:g} ms)',
+            ''
+        ]
+
+        lines.append(f'{"Own":>8} {"Own %":>7} {"Total":>8} {"Total %":>8}  Function')
+        lines.append('=' * 80)
+
+        denominator = max(1, self.n_samples)
+        for (label, own, total) in self.top_functions()[:n]:
+            lines.append(f'{own:>8,} {own / denominator * 100:>6.1f}% {total:>8,} {total / denominator * 100:>7.1f}%  {label}')
+
+        return '\n'.join(lines)
+
+def _frame_label(frame: FrameType) -> str:
+    """
+    Return a label for the given frame's function: its name, file, and line.
+    Semicolons and spaces are avoided since they delimit collapsed stacks.
+    """
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f'{code.co_name}({filename}:{code.co_firstlineno})'.replace(';', ',').replace(' ', '_')
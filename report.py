@@ -3,40 +3,61 @@ from re import L
 from club import Club
 from school import School
 from student import Student
+import week
+
+# Score weights of the % of students who got their 1st to 5th choices
+CHOICE_WEIGHTS = (12, 8, 5, 3, 2)
+
+# Score weights (penalties) of the % of students with 1, 2, or 3+ unchosen clubs
+UNCHOSEN_WEIGHTS = (3, 5, 20)
+
+# Score weight (penalty) of the square of the range of students in clubs
+RANGE_WEIGHT = 0.05
+
+# Score weight (penalty) of the variance from expected grade and gender proportions
+MIXEDNESS_WEIGHT = 1000
 
 class Report:
     """
     Stores the key information from a world after distribution, derives
     statistics from said distribution, and calculates a numerical score.
 
-    Three dictionaries storing data:
+    Three lists storing data, indexed by student, club, and teacher id
+    (None for any that are not in the world, or teachers without clubs):
 
-    students: {
-        name: {
-            'choices': list[int],
-            'clubs': list[str],
-            'max_clubs': in
+    students: [
+        {
+            'name': str,
+            'days': list[int|None],  (club id on each day)
+            'choices': dict[int, int],  (club ids by priority)
+            'choices gotten': dict[int|str, int],
+            ...
         }
-    }
-    clubs: {
-        code: {
-            instance_key: {
-                'days': set[int],
-                'students': set[str],
+    ]
+    clubs: [
+        [  (instances, in key order)
+            {
+                'key': str,
+                'days': int,  (set of days, see week.py)
+                'students': set[int],
                 'mx grade': float,
                 'mx gender': float
             }
-        }
-    }
-    teachers: {
-        name: {
-            'days': {
-                int: str
-            },
+        ]
+    ]
+    teachers: [
+        {
+            'name': str,
+            'days': list[int|None],  (club id on each day)
             'nice names': list[str],
             'instance keys': list[str]
         }
-    }
+    ]
+
+    Names are only needed for output, so the club codes are kept in a list
+    indexed by club id; student and teacher names are kept in their records.
+    The letters of the week's days are kept too, so a saved report can be
+    reloaded into the same week (see save.unpickle_report).
 
     One dictionary {str: float} storing derived statistics.
 
@@ -51,7 +72,8 @@ class Report:
     If this is not 100% it signals conflicts in the preselections.
     TODO A club that was overridden by a later force would not be caught here.
 
-    -1% -2% -3%: Tracks the % of students who had to be in N unchosen clubs.
+    -1% -2% -3%: Tracks the % of students who had to be in N unchosen clubs
+    (-3% counts 3 or more, for weeks with more than 3 days).
     If a student ends up with a free day, they are currently placed in a random
     Study Hall and that gets tallied here.
 
@@ -76,7 +98,7 @@ class Report:
     to avoid recalculation by mistake (TODO redundant).
     """
 
-    __slots__ = ['stats', 'score', 'clubs', 'students', 'teachers', '_calculated_stats', '_calculated_score', 'full_names']
+    __slots__ = ['stats', 'score', 'clubs', 'students', 'teachers', 'club_codes', '_calculated_stats', '_calculated_score', 'full_names', 'day_letters']
 
     stats: dict[str, float|int]
     score: int
@@ -84,11 +106,13 @@ class Report:
     _calculate_stats: bool
     _calculate_score: bool
 
-    clubs: dict[str, dict[str, object]]
-    students: dict[str, dict[str, object]]
-    teachers: dict[str, dict[str, object]]
+    clubs: list[list[dict[str, object]]|None]
+    students: list[dict[str, object]|None]
+    teachers: list[dict[str, object]|None]
+    club_codes: list[str]
 
     full_names: dict[str, str]
+    day_letters: tuple[str]
     
     def __init__(self: Report, clubs: list[Club], students: list[Student]) -> None:
         """
@@ -102,15 +126,18 @@ class Report:
         self._calculated_stats = False
         self._calculated_score = False
     
-        self.clubs = {}
-        self.students = {}
-        self.teachers = {}
+        self.clubs = [None] * (1 + max((c.id for c in clubs), default=-1))
+        self.club_codes = [''] * len(self.clubs)
+        self.students = [None] * (1 + max((s.id for s in students), default=-1))
+        self.teachers = []
+        self.day_letters = week.DAY_LETTERS
 
         for c in clubs:
-            self.clubs[c.code] = {}
+            self.clubs[c.id] = []
+            self.club_codes[c.id] = c.code
 
         for s in students:
-            self.students[s.name] = {}
+            self.students[s.id] = {}
 
         # Python (3.10) does not allow it to be both slots and initialized
         self.full_names = {
@@ -130,8 +157,8 @@ class Report:
             '-1%'           : '% of student with 1 unasked-for Study Hall',
             '-2'            : '# of students with 2 unasked-for Study Halls',
             '-2%'           : '% of student with 2 unasked-for Study Halls',
-            '-3'            : '# of students with 3 unasked-for Study Halls',
-            '-3%'           : '% of student with 3 unasked-for Study Halls',
+            '-3'            : '# of students with 3+ unasked-for Study Halls',
+            '-3%'           : '% of student with 3+ unasked-for Study Halls',
             'total'         : '# of student club assignments accounted for',
             'total%'        : '% of student club assignments accounted for',
             'upper'         : 'Average members in top 10% of clubs',
@@ -147,66 +174,74 @@ class Report:
         extract the necessary information for this report to function.
         """
         
-        # Populate student dictionary
+        clubs_by_id = school.club_list
+        self.teachers = [None] * len(school.teacher_list)
+
+        # Populate student records
         for s in students:
-            self.students[s.name]['days'] = s.days.copy()
-            self.students[s.name]['grade'] = s.grade
-            self.students[s.name]['gender'] = s.gender
-            self.students[s.name]['instance keys'] = ['', '', '']
-            self.students[s.name]['nice names'] = ['', '', '']
-            self.students[s.name]['choices'] = s.choices.copy()
-            self.students[s.name]['choices gotten'] = s.choices_gotten.copy()
+            data = self.students[s.id]
+            data['name'] = s.name
+            data['days'] = s.days[:]
+            data['grade'] = s.grade
+            data['gender'] = s.gender
+            data['instance keys'] = [''] * week.N_DAYS
+            data['nice names'] = [''] * week.N_DAYS
+            data['choices'] = s.choice_ids.copy()
+            data['choices gotten'] = s.choices_gotten.copy()
 
             # Add denominators for the choices that were possible to get
             denominators = {}
             for (key, _) in s.choices_gotten.items():
                 if isinstance(key, int):
-                    code = s.choices[key]
-                    denominators[key] = school.clubs[code].days_per_instance
+                    denominators[key] = clubs_by_id[s.choice_ids[key]].days_per_instance
                 elif key == 'pre':
-                    denominators[key] = sum(((school.clubs[code].days_per_instance * s.pres[code]) for code in s.pres))
+                    denominators[key] = sum(((clubs_by_id[club_id].days_per_instance * n_times) for (club_id, n_times) in s.pre_ids.items()))
                 
-                denominators['total'] = 3 - len(s.days_unavailable)
+                denominators['total'] = week.N_DAYS - week.N_DAYS_IN[s.days_unavailable]
 
-            self.students[s.name]['choices gotten denominators'] = denominators
+            data['choices gotten denominators'] = denominators
 
-        # Populate the clubs dictionary
+        # Populate the club records
         for c in clubs:
-            for i in c.instances.values():
-                self.clubs[c.code][i.key] = {}
-                nice_name = school.get_nice_name(c)
-                
-                self.clubs[c.code][i.key]['days'] = i.days.copy()
-                self.clubs[c.code][i.key]['teacher'] = c.teacher if c.teacher is not None else ''
-                self.clubs[c.code][i.key]['nice name'] = nice_name
-                self.clubs[c.code][i.key]['students'] = set(s.name for s in i.students)
+            nice_name = school.get_nice_name(c)
+
+            for i in c.instances:
+                instance_data = {
+                    'key': i.key,
+                    'days': i.days,
+                    'teacher': c.teacher.name if c.teacher is not None else '',
+                    'nice name': nice_name,
+                    'students': i.students.copy()
+                }
+                self.clubs[c.id].append(instance_data)
 
                 # Extract additional data for students and teachers in the club
-                for day in i.days:
+                for day in week.DAYS_IN[i.days]:
 
                     # Student nice names, instance keys
-                    for s in i.students:
-                        self.students[s.name]['nice names'][day] = nice_name
-                        self.students[s.name]['instance keys'][day] = i.key
+                    for student_id in i.students:
+                        self.students[student_id]['nice names'][day] = nice_name
+                        self.students[student_id]['instance keys'][day] = i.key
 
                     # Teacher days, nice names, and instance keys
                     if c.teacher is not None:
-                        teacher = c.teacher.name
-                        if teacher not in self.teachers:
-                            self.teachers[teacher] = {
-                                'days': {},
-                                'nice names': ['', '', ''],
-                                'instance keys': ['', '', '']
+                        teacher_data = self.teachers[c.teacher.id]
+                        if teacher_data is None:
+                            teacher_data = self.teachers[c.teacher.id] = {
+                                'name': c.teacher.name,
+                                'days': [None] * week.N_DAYS,
+                                'nice names': [''] * week.N_DAYS,
+                                'instance keys': [''] * week.N_DAYS
                             }
                         
-                        self.teachers[teacher]['days'][day] = c.code
-                        self.teachers[teacher]['nice names'][day] = nice_name
-                        self.teachers[teacher]['instance keys'][day] = i.key
+                        teacher_data['days'][day] = c.id
+                        teacher_data['nice names'][day] = nice_name
+                        teacher_data['instance keys'][day] = i.key
 
                 # Add grade & gender proportion reports
                 mx_grade, mx_gender = i.mixedness(school.proportions)
-                self.clubs[c.code][i.key]['mx grade'] = mx_grade
-                self.clubs[c.code][i.key]['mx gender'] = mx_gender
+                instance_data['mx grade'] = mx_grade
+                instance_data['mx gender'] = mx_gender
 
     def calculate_stats(self: Report) -> dict[str, float|int]:
         """
@@ -221,8 +256,11 @@ class Report:
         """
         Calculate the statistics and save them to self.stats.
         """
-        n_students = len(self.students)
-        n_clubs = len(self.clubs)
+        students = [data for data in self.students if data is not None]
+        clubs = [(club_id, instances) for (club_id, instances) in enumerate(self.clubs) if instances is not None]
+
+        n_students = len(students)
+        n_clubs = len(clubs)
         self.stats = {k: 0.0 for k in self.full_names}
 
         # Students
@@ -236,22 +274,22 @@ class Report:
             '5': 0,
 
             # TODO Should these denominators really be the unfiltered ones?
-            '-1': 3 * n_students,
-            '-2': 3 * n_students,
-            '-3': 3 * n_students,
+            '-1': week.N_DAYS * n_students,
+            '-2': week.N_DAYS * n_students,
+            '-3': week.N_DAYS * n_students,
 
             'pre': 0,
             'total': 0
         }
 
         # Tally each type of choice gotten
-        for (name, data) in self.students.items():
+        for data in students:
 
             # Unchosen club is a # representing how many days were unchosen
             if 'unchosen' in data['choices gotten']:
                 n = data['choices gotten']['unchosen']
                 if n > 0:
-                    self.stats[f'-{n}'] += 1
+                    self.stats[f'-{min(n, 3)}'] += 1
 
             # Others are # represents how many days are in that choice
             for (key, n) in data['choices gotten'].items():
@@ -278,36 +316,19 @@ class Report:
         # Clubs / instances
 
         # Count instances
-        n_clubs = len(self.clubs)
         n_instances = 0
-        for club_data in self.clubs.values():
-            for i_data in club_data.values():
-                n_instances += 1
-
-        def _n_students_in_club(club_code: str) -> int:
-            """
-            Return the number of students across all instances
-            of the given club code.
-            """
-            instance_keys = self.clubs[club_code].keys()
-            return sum((len(self.clubs[club_code][i_key]['students']) for i_key in instance_keys))
+        for (_, instances) in clubs:
+            n_instances += len(instances)
 
         # Upper, lower, and range of students in clubs
 
-        # Sort by number of students, ascending
-        sorted_clubs = sorted(self.clubs.keys(), key=lambda c: _n_students_in_club(c))
+        # Sort by number of students across all instances, ascending
+        club_sizes = sorted(sum(len(i_data['students']) for i_data in instances) for (_, instances) in clubs)
 
         n_sample = n_clubs // 10
 
-        lower = 0
-        for c in sorted_clubs[:n_sample]:
-            lower += _n_students_in_club(c)
-        lower //= n_sample
-        
-        upper = 0
-        for c in sorted_clubs[-n_sample:]:
-            upper += _n_students_in_club(c)
-        upper //= n_sample
+        lower = sum(club_sizes[:n_sample]) // n_sample
+        upper = sum(club_sizes[-n_sample:]) // n_sample
 
         self.stats['lower'] = lower
         self.stats['upper'] = upper
@@ -316,8 +337,8 @@ class Report:
         # Average the mixedness of grade and gender across all clubs
         total_mx_grade = 0
         total_mx_gender = 0
-        for club_data in self.clubs.values():
-            for i_data in club_data.values():
+        for (_, instances) in clubs:
+            for i_data in instances:
                 mx_grade = i_data['mx grade']
                 mx_gender = i_data['mx gender']
             total_mx_grade += mx_grade
@@ -338,30 +359,24 @@ class Report:
     def _calculate_score(self: Report) -> None:
         """
         Calculate the score and save it to self.score.
-
-        TODO Weights should probably be constants.
         """
         self.calculate_stats()
         self.score = 0
         
         # The more students in clubs they chose, the better
-        self.score += (12 * self.stats['1%'])
-        self.score += (8 * self.stats['2%'])
-        self.score += (5 * self.stats['3%'])
-        self.score += (3 * self.stats['4%'])
-        self.score += (2 * self.stats['5%'])
+        for (key, weight) in enumerate(CHOICE_WEIGHTS, 1):
+            self.score += (weight * self.stats[f'{key}%'])
 
         # The more students in clubs they didn't choose, the worse
-        self.score -= (3 * self.stats['-1%'])
-        self.score -= (5 * self.stats['-2%'])
-        self.score -= (20 * self.stats['-3%'])
+        for (key, weight) in enumerate(UNCHOSEN_WEIGHTS, 1):
+            self.score -= (weight * self.stats[f'-{key}%'])
 
         # The wider the range, the worse
-        self.score -= ((0.05 * (self.stats['range']) ** 2))
+        self.score -= ((RANGE_WEIGHT * (self.stats['range']) ** 2))
 
         # The more the variance from expected proportions, the worse
-        self.score -= (1000 * self.stats['mx grade'])
-        self.score -= (1000 * self.stats['mx gender'])
+        self.score -= (MIXEDNESS_WEIGHT * self.stats['mx grade'])
+        self.score -= (MIXEDNESS_WEIGHT * self.stats['mx gender'])
 
         # No point in excessive precision
         self.score = int(self.score)
@@ -370,10 +385,10 @@ class Report:
         """
         Return the number of students that got into the given club.
         """
-        if club.code not in self.clubs:
+        if club.id >= len(self.clubs) or self.clubs[club.id] is None:
             return 0
         else:
-            return sum(len(i['students']) for i in self.clubs[club.code].values())
+            return sum(len(i['students']) for i in self.clubs[club.id])
         
     def format_report(self: Report) -> str:
         """
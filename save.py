@@ -7,10 +7,15 @@ import os
 
 from club import Club
 from report import Report
+import week
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from school import School
+    from instrumentation import Instrumentation
+    from profiler import SamplingProfiler
+    from tracing import Tracer
+    from fairness import FairnessStats
 
 # A bunch of constants :)
 
@@ -21,14 +26,13 @@ PATH_WORLD_REPORT_STUDENTS_STEM = 'src/output/reports/{} final-report-students.c
 PATH_WORLD_REPORT_DAYS_STEM = 'src/output/reports/{} final-report-days.csv'
 PATH_WORLD_REPORT_TEACHERS_STEM = 'src/output/reports/{} final-report-teachers.csv'
 PATH_WORLD_REPORT_STATS_STEM = 'src/output/reports/{} final-report-stats.csv'
-
-DAY_TO_INT = {
-    'T': 0,
-    'W': 1,
-    'R': 2
-}
-
-INT_TO_DAY_LETTER = ['T', 'W', 'R']
+PATH_INSTRUMENTATION = Path('src/output/diagnostics/instrumentation.json')
+PATH_PROFILE_COLLAPSED = Path('src/output/diagnostics/profile-collapsed.txt')
+PATH_PROFILE_SUMMARY = Path('src/output/diagnostics/profile-summary.txt')
+PATH_TRACE = Path('src/output/diagnostics/trace.json')
+PATH_FAIRNESS_STUDENTS = Path('src/output/fairness/students.csv')
+PATH_FAIRNESS_GRADES = Path('src/output/fairness/unchosen-days-by-grade.csv')
+PATH_FAIRNESS_CLUBS = Path('src/output/fairness/clubs.csv')
 
 def save_summary_votes_csv(school: School, subset: str, report: Report|None=None) -> None:
     """
@@ -126,6 +130,13 @@ def _sort_student(name: str) -> str:
     """
     return name.lower().split()[-1]
 
+def _sorted_club_ids(report: Report) -> list[int]:
+    """
+    Return the ids of the clubs in the given report, sorted by code.
+    """
+    club_ids = [club_id for (club_id, instances) in enumerate(report.clubs) if instances is not None]
+    return sorted(club_ids, key=lambda club_id: report.club_codes[club_id].lower())
+
 def pickle_report(report: Report, key: str) -> None:
     """
     Save a pickle of the given report with the given key identifier.
@@ -138,22 +149,26 @@ def pickle_report(report: Report, key: str) -> None:
 
 def unpickle_report(key: str) -> Report|None:
     """
-    Load and return the pickle of the report with the given key.
+    Load and return the pickle of the report with the given key, setting
+    the week to the report's days (see week.set_days).
     """
     path = Path(PATH_WORLD_REPORT_PICKLE_STEM.format(key))
     if not path.exists():
         return None
 
     with open(path, 'rb') as f:
-        return pickle.load(f)
+        report = pickle.load(f)
+    week.set_days(report.day_letters)
+    return report
 
 def resave_report(key: str) -> None:
     """
-    Open and resave a pickled report. (This refreshes output formats.)
-    Will be broken if data structures have changed.
+    Open and resave a pickled report, in its own week. (This refreshes
+    output formats.) Will be broken if data structures have changed.
     """
     report = unpickle_report(key)
-    save_world_report(report, key)
+    if report is not None:
+        save_world_report(report, key)
 
 def save_world_report_students_csv(report: Report, report_key: str) -> None:
     """
@@ -166,23 +181,23 @@ def save_world_report_students_csv(report: Report, report_key: str) -> None:
 
     with open(path, 'w', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(['Student', 'Grade', 'Gender', 'T', 'W', 'R'])
+        writer.writerow(['Student', 'Grade', 'Gender', *week.DAY_LETTERS])
 
-        for name in sorted(report.students, key=_sort_student):
-            data = report.students[name]
+        students = [data for data in report.students if data is not None]
 
-            row = [name, data['grade'], data['gender']]
+        for data in sorted(students, key=lambda data: _sort_student(data['name'])):
+            row = [data['name'], data['grade'], data['gender']]
 
             # Using range to ensure days are sorted
-            for i in range(3):
-                if data['days'].get(i):
+            for i in range(week.N_DAYS):
+                if data['days'][i] is not None:
 
-                    club = data['days'][i]
+                    club_id = data['days'][i]
                     nice_club = data['nice names'][i]
                     instance = data['instance keys'][i]
 
                     # If there's only one instance, don't append the instance key
-                    col = f'{nice_club} {instance}' if len(report.clubs[club]) > 1 else nice_club
+                    col = f'{nice_club} {instance}' if len(report.clubs[club_id]) > 1 else nice_club
 
                 else:
                     col = ''
@@ -201,23 +216,23 @@ def save_world_report_teachers_csv(report: Report, report_key: str) -> None:
 
     with open(path, 'w', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(['Teacher', 'T', 'W', 'R'])
+        writer.writerow(['Teacher', *week.DAY_LETTERS])
 
-        for name in sorted(report.teachers):
-            data = report.teachers[name]
+        teachers = [data for data in report.teachers if data is not None]
 
-            row = [name]
+        for data in sorted(teachers, key=lambda data: data['name']):
+            row = [data['name']]
 
             # Using range to ensure days are sorted
-            for i in range(3):
-                if data['days'].get(i):
+            for i in range(week.N_DAYS):
+                if data['days'][i] is not None:
 
-                    club = data['days'][i]
+                    club_id = data['days'][i]
                     nice_club = data['nice names'][i]
                     instance = data['instance keys'][i]
 
                     # If there's only one instance, don't append the instance key
-                    col = f'{nice_club} {instance}' if len(report.clubs[club]) > 1 else nice_club
+                    col = f'{nice_club} {instance}' if len(report.clubs[club_id]) > 1 else nice_club
                 else:
                     col = ''
 
@@ -239,14 +254,14 @@ def save_world_report_clubs_csv(report: Report, report_key: str) -> None:
         writer = csv.writer(f)
         writer.writerow(['Club', 'Group', 'Teacher', 'Days', '# Students', 'Students'])
 
-        for club_code in sorted(report.clubs, key=lambda c: c.lower()):
-            instances = report.clubs[club_code]
-            for instance_key in sorted(instances):
-                data = instances[instance_key]
+        for club_id in _sorted_club_ids(report):
+            instances = report.clubs[club_id]
+            for data in sorted(instances, key=lambda data: data['key']):
                 days, teacher, students, nice_name = data['days'], data['teacher'], data['students'], data['nice name']
+                instance_key = data['key']
 
-                s_days = '/'.join((INT_TO_DAY_LETTER[i] for i in days))
-                students = sorted(students, key=_sort_student)
+                s_days = week.letters_of(days)
+                students = sorted((report.students[student_id]['name'] for student_id in students), key=_sort_student)
 
                 # Do not print an instance key if there's only one
                 if len(instances) == 1:
@@ -261,22 +276,23 @@ def save_world_report_days_csv(report: Report, report_key: str) -> None:
     the club instances) running on that set of days, in alphabetical order.
     """
 
-    keys = ['T', 'W', 'R', 'T/W', 'T/R', 'W/R', 'T/W/R']
+    # Every set of days, smallest first (e.g. T, W, R, T/W, T/R, W/R, T/W/R)
+    masks = sorted(range(1, week.ALL_DAYS + 1), key=lambda mask: (week.N_DAYS_IN[mask], week.DAYS_IN[mask]))
+    keys = [week.letters_of(mask) for mask in masks]
     days_to_clubs = {key: [] for key in keys}
 
     # Map day variation to club code + instance key
-    for club_code in sorted(report.clubs, key=lambda c: c.lower()):
-        instances = report.clubs[club_code]
-        for instance_key in sorted(instances):
-            data = instances[instance_key]
+    for club_id in _sorted_club_ids(report):
+        instances = report.clubs[club_id]
+        for data in sorted(instances, key=lambda data: data['key']):
             days = data['days']
-            days_key = '/'.join((INT_TO_DAY_LETTER[i] for i in sorted(days)))
-            days_to_clubs[days_key].append(f'{data["nice name"]} {instance_key}')
+            days_key = week.letters_of(days)
+            days_to_clubs[days_key].append(f'{data["nice name"]} {data["key"]}')
 
     # Transpose so it's columnwise for readability
     rows = [keys]
     for _ in range(len(max(days_to_clubs.values(), key=len))):
-        rows.append(['', '', '', '', '', '', ''])
+        rows.append([''] * len(keys))
 
     for (i_col, key) in enumerate(keys):
         for (i_row, club) in enumerate(days_to_clubs.get(key, [])):
@@ -327,3 +343,72 @@ def save_world_report(report: Report, report_key: str) -> None:
     save_world_report_teachers_csv(report, report_key)
     save_world_report_days_csv(report, report_key)
     save_world_report_stats_csv(report, report_key)
+
+def save_instrumentation_json(instrumentation: Instrumentation) -> None:
+    """
+    Save the timings and counters of the given instrumentation as JSON.
+    """
+    path = PATH_INSTRUMENTATION
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, 'w') as f:
+        f.write(instrumentation.to_json())
+
+def save_profile(profiler: SamplingProfiler) -> None:
+    """
+    Save the samples of the given profiler: the collapsed stacks (for use with
+    flamegraph tools) and a text summary of the top functions.
+    """
+    PATH_PROFILE_COLLAPSED.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(PATH_PROFILE_COLLAPSED, 'w') as f:
+        f.write('\n'.join(profiler.collapsed_stacks()) + '\n')
+
+    with open(PATH_PROFILE_SUMMARY, 'w') as f:
+        f.write(profiler.format_summary(n=100) + '\n')
+
+def save_trace(tracer: Tracer) -> None:
+    """
+    Save the events of the given tracer as a Chrome trace event JSON file.
+    """
+    PATH_TRACE.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(PATH_TRACE, 'w') as f:
+        f.write(tracer.to_json())
+
+def save_fairness_csvs(school: School, stats: FairnessStats) -> None:
+    """
+    Save CSVs of the given fairness statistics for the given school:
+    each student's chance of getting their first choice (when needed),
+    the share of students with each number of unchosen days by grade,
+    and each club's fill rate when it ran.
+    """
+    PATH_FAIRNESS_STUDENTS.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(PATH_FAIRNESS_STUDENTS, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Student', 'Grade', 'Times 1st choice needed', 'Times 1st choice gotten', '1st choice %'])
+
+        for student in sorted(school.student_list, key=lambda s: _sort_student(s.name)):
+            p = stats.first_choice_probability(student.id)
+            p = f'{p * 100:.1f}%' if p is not None else ''
+            writer.writerow([student.name, student.grade, stats.first_needed[student.id], stats.first_gotten[student.id], p])
+
+    with open(PATH_FAIRNESS_GRADES, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Grade'] + [f'{n_days} unchosen days %' for n_days in range(week.N_DAYS + 1)])
+
+        for (grade, histogram) in sorted(stats.unchosen_by_grade.items()):
+            total = sum(histogram)
+            writer.writerow([grade] + [f'{n / total * 100:.1f}%' for n in histogram])
+
+    with open(PATH_FAIRNESS_CLUBS, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Club', 'Times run', 'Mean fill %', 'Fill % std', 'Min fill %', 'Max fill %'])
+
+        for club in sorted(school.club_list, key=lambda c: c.code.lower()):
+            fill = stats.club_fill[club.id]
+            if fill.n:
+                writer.writerow([club.code, fill.n, f'{fill.mean * 100:.1f}%', f'{fill.std() * 100:.1f}%', f'{fill.min * 100:.1f}%', f'{fill.max * 100:.1f}%'])
+            else:
+                writer.writerow([club.code, 0, '', '', '', ''])
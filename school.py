@@ -3,6 +3,13 @@ import random
 from student import Student
 from club import Club
 from teacher import Teacher
+import problem
+import week
+
+from typing import Callable, Hashable
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from problem import SharedProblem
 
 class School:
     """
@@ -10,15 +17,24 @@ class School:
     measures of the proportions of grades and genders, club repulsions
     and student reactivities (unused); and the various operations
     that manipulate clubs. The hub used to access all kinds of data.
+
+    Students, clubs, and teachers are keyed by name or code while the input
+    is parsed and filtered. Once that is done, the school assigns each a dense
+    integer id (see assign_ids), and the engine works on ids from then on:
+    the lists of students, clubs, and teachers are indexed by them.
     """
-    __slots__ = ('students', 'clubs', 'teachers', 'proportions', 'repulsions', 'reactivities', 'preselects', 'merges', 'splits', 'nice_names', 'exclusions', 'splits_to_separate_days')
+    __slots__ = ('students', 'clubs', 'teachers', 'student_list', 'club_list', 'teacher_list', 'proportions', 'repulsions', 'reactivities', 'preselects', 'merges', 'splits', 'nice_names', 'exclusions', 'splits_to_separate_days', 'shared')
 
     students: dict[str, Student]
     clubs: dict[str, Club]
     teachers: dict[str, Teacher]
 
+    student_list: list[Student]
+    club_list: list[Club]
+    teacher_list: list[Teacher]
+
     proportions: dict[str|int, int]
-    repulsions: dict[str, dict[str, int]]
+    repulsions: list[list[int]]
     reactivities: dict[str, int]
 
     preselects: dict[str, tuple[str, int]]
@@ -28,12 +44,18 @@ class School:
     nice_names: dict[str, str]
     exclusions: dict[str, set[str]]
 
+    shared: SharedProblem|None
+
     def __init__(self: School) -> None:
         """Initialize the school with all empty values."""
         self.students = {}
         self.clubs = {}
         self.teachers = {}
 
+        self.student_list = []
+        self.club_list = []
+        self.teacher_list = []
+
         self.proportions = {
             'M': 0,
             'F': 0,
@@ -45,7 +67,7 @@ class School:
             13: 0
         }
 
-        self.repulsions = {}
+        self.repulsions = []
 
         self.preselects = {}
         self.merges = {}
@@ -54,13 +76,42 @@ class School:
         self.nice_names = {}
         self.exclusions = {}
 
+        self.shared = None
+
+    def __getstate__(self: School) -> tuple[tuple[str], dict[str, object]]:
+        """
+        Return the days of the week and this school's state for pickling.
+        If its arrays are shared (see problem.py), only the handle to them is
+        pickled, and of its students only their names and genders.
+        """
+        state = {slot: getattr(self, slot) for slot in self.__slots__ if hasattr(self, slot)}
+        if self.shared is not None:
+            state['repulsions'] = None
+            state['reactivities'] = None
+            state['students'] = None
+            state['student_list'] = [(student.name, student.gender) for student in self.student_list]
+        return (week.DAY_LETTERS, state)
+
+    def __setstate__(self: School, state: tuple[tuple[str], dict[str, object]]) -> None:
+        """
+        Restore this school's state from pickling, pointing it at its shared
+        arrays and rebuilding its students from them if it has them. Its
+        clubs have been restored by now. The days of the week are set first,
+        since a spawned worker starts with the default ones.
+        """
+        week.set_days(state[0])
+        for (slot, value) in state[1].items():
+            setattr(self, slot, value)
+        if self.shared is not None:
+            problem.attach_school(self, self.student_list)
+
     def register_club(self: School, code: str) -> Club:
         """
         Register a club with the given code if not yet registered.
         Then, return the corresponding club.
         """
         if code not in self.clubs:
-            self.clubs[code] = Club(self, code)
+            self.clubs[code] = Club(self, len(self.clubs), code)
         return self.clubs[code]
 
     def register_student(self: School, key: str, grade: int, gender: str, choices: list[str], days_unavailable: set[int]=set()) -> Student:
@@ -69,7 +120,7 @@ class School:
         Then, return the corresponding student.
         """
         if key not in self.students:
-            self.students[key] = Student(key, grade, gender, choices, days_unavailable)
+            self.students[key] = Student(len(self.students), key, grade, gender, choices, days_unavailable)
         return self.students[key]
 
     def register_teacher(self: School, name: str) -> Teacher:
@@ -78,16 +129,16 @@ class School:
         Then, return the corresponding teacher.
         """
         if name not in self.teachers:
-            self.teachers[name] = Teacher(name)
+            self.teachers[name] = Teacher(len(self.teachers), name)
         return self.teachers[name]
 
-    def add_preselect(self: School, student_name: str, club_code: str, n_times: int, forced_days: set[int], forced_nondays: set[int], force: bool=False) -> None:
+    def add_preselect(self: School, student_name: str, club_code: str, n_times: int, forced_days: int, forced_nondays: int, force: bool=False) -> None:
         """
         Add an preselect (a preselected club) to the school registry.
         The essentials are a student name and a club code.
         It is also possible to specify a number of times (instances) to add;
-        forced days that must be used; forced nondays that cannot be used;
-        and a force flag that causes schedule conflicts to be ignored.
+        forced days that must be used; forced nondays that cannot be used
+        (both as sets of days, see week.py); and a force flag that causes schedule conflicts to be ignored.
 
         N.B. Forcing is not recommended, because it prevents catching conflicts
         in planning. When forced, it ignores days and replaces previous clubs.
@@ -115,8 +166,8 @@ class School:
         key.append(club.instances_are_foreknown())
         key.append(-club.days_per_instance)
         key.append(-n_times)
-        key.append(-len(forced_nondays))
-        key.append(-len(forced_days))
+        key.append(-week.N_DAYS_IN[forced_nondays])
+        key.append(-week.N_DAYS_IN[forced_days])
 
         return key
 
@@ -225,9 +276,10 @@ class School:
     def get_all_clubs_for_code(self: School, code: str) -> set[Club]:
         """
         Return a set of all the clubs for the given code after accounting
-        for possible splits.
+        for possible splits. Clubs that were removed (e.g. for lack of votes)
+        are left out.
         """
-        return set(self.clubs[split] for split in self.get_all_split_codes(code))
+        return set(self.clubs[split] for split in self.get_all_split_codes(code) if split in self.clubs)
 
     def add_merge(self: School, main: str, absorb: str) -> None:
         """
@@ -238,7 +290,7 @@ class School:
         self.merges[absorb] = main
 
     def add_split(self: School, main: str, new: str,
-            force_separate_days: bool, new_days: set[int]|None,
+            force_separate_days: bool, new_days: int|None,
             mutually_exclusive: bool, randomize_unmatching: bool,
             new_min: int|None, new_max: int|None, new_days_per: int|None, new_max_per_day: int|None, new_decided: int|None,
             grades: set[int], genders: set[str], students: set[str]
@@ -320,7 +372,7 @@ class School:
         """
         return self.nice_names.get(code, code)
 
-    def filter_split_days(self: School, club: Club, days: set[int]) -> set[int]:
+    def filter_split_days(self: School, club: Club, days: int) -> int:
         """
         Return the given set of days, after filtering out split days.
 
@@ -335,8 +387,8 @@ class School:
         for (other_code, force_separate_days) in self.splits_to_separate_days[club.code].items():
             peer_codes = set(self.get_all_split_codes(other_code)).difference({club.code})
             for peer_code in peer_codes:
-                other_club = self.clubs[peer_code]
-                days = days.difference(other_club.taken_days())
+                if peer_code in self.clubs:
+                    days &= ~self.clubs[peer_code].taken_days()
 
         return days
 
@@ -348,28 +400,55 @@ class School:
         self.exclusions[code_a] = self.exclusions.get(code_a, set()).union({code_b})
         self.exclusions[code_b] = self.exclusions.get(code_b, set()).union({code_a})
 
+    def group_students(self: School, key: Callable[[Student], Hashable]) -> list[list[Student]]:
+        """
+        Group the students into equivalence classes: lists of the students
+        with the same value of the given key, in order of first appearance.
+        The first student of a class represents it, and its length is its
+        multiplicity; a computation that only depends on what the key does
+        can be done once per class and applied to every member.
+        """
+        classes = {}
+        for student in self.students.values():
+            classes.setdefault(key(student), []).append(student)
+        return list(classes.values())
+
     def tally_votes(self: School) -> None:
         """
         Calculate the votes each club received (both choices & preselections).
+        Votes only depend on what students chose and were preselected for,
+        so they are tallied once per class of such students, times its size.
         """
         for club in self.clubs.values():
             club.reset_votes()
 
-        for student in self.students.values():
+        for members in self.group_students(_votes_key):
+            student = members[0]
             for (key, code) in student.choices.items():
-                self.clubs[code].add_vote(key)
+                self.clubs[code].add_vote(key, len(members))
             for code in student.pres:
-                self.clubs[code].add_pre_vote()
+                self.clubs[code].add_pre_vote(len(members))
 
     def remove_students_who_arent_eligible(self: School) -> None:
         """
         Go through all the students and unregister any club choices for which
         they are not eligible.
+
+        Eligibility only depends on a student's choices, preselects, grade
+        and gender, and on their name only if it is on a whitelist or
+        blacklist, so it is checked once per class of such students, and
+        the choices unregistered from every member.
         """
-        for student in self.students.values():
+        listed = set()
+        for club in self.clubs.values():
+            listed |= club.whitelist | club.blacklist
+
+        for members in self.group_students(lambda student: _eligibility_key(student, listed)):
+            student = members[0]
             for club_code in student.choices.copy().values():
                 if not self.clubs[club_code].is_student_eligible(student):
-                    student.unregister_choice(club_code)
+                    for member in members:
+                        member.unregister_choice(club_code)
     
     def remove_clubs_that_cannot_run(self: School) -> None:
         """
@@ -396,12 +475,48 @@ class School:
         for (k, v) in self.proportions.items():
             self.proportions[k] = v / n
 
+    def assign_ids(self: School) -> None:
+        """
+        Assign dense integer ids (0, 1, 2, ...) to all students, clubs, and
+        teachers, in registration order, and fill the lists indexed by them.
+        Intern each student's choices and preselects as club ids, and resolve
+        each club's exclusions to the clubs it excludes.
+
+        Must be called after parsing and filtering, since removing clubs
+        afterwards would leave gaps. Since clubs hash by id, sets of clubs
+        made before now are rebuilt.
+        """
+        self.student_list = list(self.students.values())
+        for (i, student) in enumerate(self.student_list):
+            student.id = i
+
+        self.club_list = list(self.clubs.values())
+        for (i, club) in enumerate(self.club_list):
+            club.id = i
+
+        self.teacher_list = list(self.teachers.values())
+        for (i, teacher) in enumerate(self.teacher_list):
+            teacher.id = i
+            teacher.clubs = [club for club in teacher.clubs if self.clubs.get(club.code) is club]
+
+        club_ids = {code: club.id for (code, club) in self.clubs.items()}
+        for student in self.student_list:
+            student.intern_choices(club_ids)
+
+        # A club never excludes itself (e.g. a mutually exclusive split branch)
+        for club in self.club_list:
+            club.exclusive_clubs = []
+            for other_code in self.exclusions.get(club.code, ()):
+                for other in self.get_all_clubs_for_code(other_code):
+                    if other is not club and other not in club.exclusive_clubs:
+                        club.exclusive_clubs.append(other)
+
     def calculate_repulsions(self: School) -> None:
         """
         Calculate the repulsion factor for each club to each other club,
-        and save them to a dictionary whose keys are club codes and whose
-        values are subdictionaries mapping other club codes to repulsion
-        factors. Also save each club's subdictonary to itself.
+        and save them to a list (indexed by club id) of lists (indexed by
+        other club id) of repulsion factors. Also save each club's list to
+        itself, along with its total.
 
         TODO The last part is redundant, as noted in Club.
 
@@ -410,23 +525,29 @@ class School:
         has a total repulsion factor indicating its total co-occurrence.
         Pracically speaking, two clubs with a high repulsion factor should not
         share a day, since many students hope to get into both.
-        """
 
-        self.repulsions = {key: {} for key in self.clubs}
+        Requires ids to have been assigned.
+        """
+        n_clubs = len(self.club_list)
+        self.repulsions = [[0] * n_clubs for _ in range(n_clubs)]
 
-        for student in self.students.values():
+        # Repulsions only depend on choices and preselects, so are added once
+        # per class of students with the same ones, weighted by its size
+        for members in self.group_students(_repulsions_key):
+            student = members[0]
+            weight = len(members)
             all_choices = set()
 
             # For each choice...
             for i in range(1, 6):
-                a = student.choices.get(i, None)
-                if not a:
+                a = student.choice_ids.get(i, None)
+                if a is None:
                     continue
 
                 # For each other choice...
                 for j in range(i + 1, 6):
-                    b = student.choices.get(j, None)
-                    if not b:
+                    b = student.choice_ids.get(j, None)
+                    if b is None:
                         continue
 
                     # Add both to all choices to compare with preselects later
@@ -434,21 +555,21 @@ class School:
                     all_choices.add(b)
 
                     # Weight by how high the choices are in their list
-                    n = (6 - i) * (6 - j)
-                    self.repulsions[a][b] = self.repulsions[a].get(b, 0) + n
-                    self.repulsions[b][a] = self.repulsions[b].get(a, 0) + n
+                    n = (6 - i) * (6 - j) * weight
+                    self.repulsions[a][b] += n
+                    self.repulsions[b][a] += n
 
             # Preselects are considered conflicting with all other choices
             # (High value -- TODO review -- because the odds are 100%)
-            for a in student.pres:
+            for a in student.pre_ids:
                 for b in all_choices:
-                    self.repulsions[a][b] = self.repulsions[a].get(b, 0) + 10
-                    self.repulsions[b][a] = self.repulsions[b].get(a, 0) + 10
+                    self.repulsions[a][b] += 10 * weight
+                    self.repulsions[b][a] += 10 * weight
         
-        # Sum and add a total; also save to the individual club (redundant)
-        for a in self.repulsions:
-            self.repulsions[a]['_total'] = sum(self.repulsions[a].values())
-            self.clubs[a].repulsions = self.repulsions[a]
+        # Save to the individual club (redundant) with a total
+        for club in self.club_list:
+            club.repulsions = self.repulsions[club.id]
+            club.total_repulsion = sum(club.repulsions)
 
     def calculate_reactivities(self: School) -> None:
         """
@@ -489,3 +610,26 @@ class School:
             # Save both to own dictionary and to student
             student.reactivity = reactivity
             self.reactivities[student.name] = reactivity
+
+def _votes_key(student: Student) -> Hashable:
+    """
+    Return what the votes a student gives depend on: their choices (by key)
+    and preselects.
+    """
+    return (tuple(sorted(student.choices.items())), frozenset(student.pres))
+
+def _eligibility_key(student: Student, listed: set[str]) -> Hashable:
+    """
+    Return what a student's eligibility for their choices depends on (see
+    Club.is_student_eligible), given the names on any whitelist or blacklist.
+    Being preselected for a club is the same as being on its prelist.
+    """
+    name = student.name if student.name in listed else None
+    return (tuple(sorted(student.choices.items())), frozenset(student.pres), student.grade, student.gender, name)
+
+def _repulsions_key(student: Student) -> Hashable:
+    """
+    Return what the repulsions a student adds depend on: their choices and
+    preselects, by id.
+    """
+    return (tuple(sorted(student.choice_ids.items())), frozenset(student.pre_ids))
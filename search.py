@@ -0,0 +1,428 @@
+"""
+The search for the best worlds, partitioned into subtrees that can be
+evaluated in parallel by worker processes.
+
+The search tree of worlds (see worlds.generate_layouts) is cut at a depth
+into subtrees, each under a prefix of club placements. Each subtree is
+evaluated on its own: its worlds are created, and each is given a number of
+student distributions, keeping the best. The random module is reseeded from
+the run's seed and the subtree's index before each subtree, so a subtree's
+results only depend on the seed, not on which process evaluated it or what
+it evaluated before. Results are then merged in subtree order, so the same
+seed yields the same best worlds with any number of workers.
+
+Workers are forked, inheriting the prepared school (and Python's string
+hashing, which orders sets of names and codes); where forking is not
+available, the school is pickled to them instead, with its read-only
+arrays and students in shared memory for them to attach to (see problem.py).
+"""
+from __future__ import annotations
+import multiprocessing
+import random
+import time
+
+from report import Report
+from world import World
+from fairness import FairnessStats
+import fairness
+import fidelity
+import problem
+import surrogate
+import worlds
+from instrumentation import INSTRUMENTATION
+
+from typing import TYPE_CHECKING, Callable
+if TYPE_CHECKING:
+    from school import School
+
+# How many subtrees to aim for when choosing the depth to cut the search at
+N_SUBTREES = 32
+
+class SubtreeTask:
+    """
+    A subtree of the search to evaluate: its index (in search order),
+    the prefix it starts with, and how many worlds to take from it; and the
+    settings for evaluating them, including whether to choose worlds by a
+    surrogate model of their scores (see surrogate.py) and to rank them on a
+    sample of students first (see fidelity.py).
+    """
+    __slots__ = ('index', 'prefix', 'n_worlds', 'n_configurations', 'n_best', 'seed', 'validate_early', 'surrogate', 'coarse')
+
+    index: int
+    prefix: tuple[int]
+    n_worlds: int
+    n_configurations: int
+    n_best: int
+    seed: int
+    validate_early: bool
+    surrogate: bool
+    coarse: bool
+
+    def __init__(self: SubtreeTask, index: int, prefix: tuple[int], n_worlds: int,
+                 n_configurations: int, n_best: int, seed: int, validate_early: bool,
+                 surrogate: bool=False, coarse: bool=False) -> None:
+        """Initialize this task with the given subtree and settings."""
+        self.index = index
+        self.prefix = prefix
+        self.n_worlds = n_worlds
+        self.n_configurations = n_configurations
+        self.n_best = n_best
+        self.seed = seed
+        self.validate_early = validate_early
+        self.surrogate = surrogate
+        self.coarse = coarse
+
+class SubtreeResult:
+    """
+    The result of evaluating a subtree: how many worlds were created and
+    duplicates skipped, how many distributions were tested (and found valid,
+    if validating early), and the best distributions as
+    (score, world number, configuration number, report) tuples; and the
+    fairness statistics of all distributions tested.
+    """
+    __slots__ = ('index', 'n_worlds', 'n_duplicates', 'n_tested', 'n_valid', 'best', 'fairness')
+
+    index: int
+    n_worlds: int
+    n_duplicates: int
+    n_tested: int
+    n_valid: int
+    best: list[tuple[int, int, int, Report]]
+    fairness: FairnessStats
+
+    def __init__(self: SubtreeResult, index: int, fairness: FairnessStats) -> None:
+        """Initialize an empty result for the subtree with the given index."""
+        self.index = index
+        self.n_worlds = 0
+        self.n_duplicates = 0
+        self.n_tested = 0
+        self.n_valid = 0
+        self.best = []
+        self.fairness = fairness
+
+def subtree_seed(seed: int, index: int|str) -> str:
+    """
+    Return the seed for the random module for the subtree with the given index
+    (or for another named step of the search).
+    """
+    return f'{seed}:{index}'
+
+def choose_prefixes(school: School, seed: int, depth: int|None=None, n_subtrees: int=N_SUBTREES, root: tuple[int]=()) -> list[tuple[int]]:
+    """
+    Return the prefixes to cut the search for the school's worlds into,
+    in search order. Without a depth, choose the shallowest one with at
+    least n_subtrees prefixes (or the whole search, if it has fewer worlds).
+    Given a root prefix, only its subtree of the search is cut (if it is a
+    whole path, into just itself).
+
+    The depth does not depend on the number of workers, so that the same
+    subtrees (and hence the same results) come out of any number of them.
+    """
+    clubs = list(school.clubs.values())
+
+    def _prefixes(depth: int) -> list[tuple[int]]:
+        random.seed(subtree_seed(seed, 'prefixes'))
+        return list(worlds.generate_prefixes(school, clubs, depth, root=root))
+
+    if depth is not None:
+        return _prefixes(depth)
+
+    depth = len(root) + 1
+    prefixes = _prefixes(depth)
+    while (len(prefixes) < n_subtrees) and any(len(prefix) == depth for prefix in prefixes):
+        depth += 1
+        prefixes = _prefixes(depth)
+
+    return prefixes
+
+def count_worlds(args: tuple[tuple[int], int, int, int]) -> int:
+    """
+    Return how many distinct worlds the subtree of this process's school
+    with the given (prefix, limit, seed, index) has (see evaluate_subtree),
+    counting up to limit. The random state is restored afterwards.
+    """
+    (prefix, limit, seed, index) = args
+    clubs = list(_school.clubs.values())
+    signatures = worlds.WorldSignatures()
+    state = random.getstate()
+    random.seed(subtree_seed(seed, index))
+    try:
+        n = 0
+        for layout in worlds.generate_layouts(_school, clubs, prefix=prefix):
+            if n >= limit:
+                break
+            n += signatures.add(worlds.layout_signature(layout))
+        return n
+    finally:
+        random.setstate(state)
+
+def plan_subtrees(prefixes: list[tuple[int]], n_worlds: int, n_configurations: int, n_best: int, seed: int,
+                  validate_early: bool, surrogate: bool=False, coarse: bool=False, map_: Callable=map) -> list[SubtreeTask]:
+    """
+    Return the tasks for the subtrees under the given prefixes, sharing the
+    n_worlds to test between them as evenly as possible (earlier subtrees
+    taking any remainder). Subtrees with no worlds to test are left out.
+
+    A subtree with fewer worlds than its share passes the rest on to the
+    next ones that have more, in subtree order (and back to the first, until
+    all are shared or there are no more worlds), so no part of n_worlds is
+    lost to small subtrees. This only depends on the subtrees, not on the
+    number of workers.
+
+    Only subtrees that could come up short are counted (see count_worlds),
+    with the given map function (a worker pool's, to count them in
+    parallel): a prefix shorter than the others is a whole path, with just
+    one world, and a subtree cut at the depth is taken to have at least one.
+    """
+    base, remainder = divmod(n_worlds, max(1, len(prefixes)))
+    quotas = [base + (index < remainder) for index in range(len(prefixes))]
+    exhausted = [False] * len(prefixes)
+    depth = max((len(prefix) for prefix in prefixes), default=0)
+
+    # Whole paths have one world; count the rest that could have too few
+    carry = 0
+    counted = []
+    for (index, prefix) in enumerate(prefixes):
+        if len(prefix) < depth:
+            carry += max(0, quotas[index] - 1)
+            quotas[index] = min(quotas[index], 1)
+            exhausted[index] = True
+        elif quotas[index] > 1:
+            counted.append(index)
+    for (index, n) in zip(counted, map_(count_worlds, [(prefixes[index], quotas[index], seed, index) for index in counted])):
+        exhausted[index] = n < quotas[index]
+        carry += quotas[index] - n
+        quotas[index] = n
+
+    # Pass what is left on, counting the subtrees it is passed on to
+    while carry and not all(exhausted):
+        for (index, prefix) in enumerate(prefixes):
+            if exhausted[index] or not carry:
+                continue
+            quota = quotas[index] + carry
+            (quotas[index],) = map_(count_worlds, [(prefix, quota, seed, index)])
+            exhausted[index] = quotas[index] < quota
+            carry = quota - quotas[index]
+
+    tasks = []
+    for (index, (prefix, n)) in enumerate(zip(prefixes, quotas)):
+        if n:
+            tasks.append(SubtreeTask(index, prefix, n, n_configurations, n_best, seed, validate_early, surrogate, coarse))
+    return tasks
+
+# The school evaluated by this process (set in each worker by _init_worker)
+_school: School|None = None
+
+def _set_school(school: School) -> None:
+    """
+    Set the school for this process to evaluate subtrees of.
+    """
+    global _school
+    _school = school
+
+def _init_worker(school: School) -> None:
+    """
+    Set the school for this worker process to evaluate subtrees of.
+    Instrumentation is not collected from workers.
+    """
+    _set_school(school)
+    INSTRUMENTATION.enabled = False
+
+def reset_school(school: School) -> None:
+    """
+    Reset the distributions of all students and clubs in the given school,
+    instances included.
+    """
+    for s in school.students.values():
+        s.reset_distribution()
+    for c in school.clubs.values():
+        c.reset_entire_distribution()
+
+def evaluate_subtree(task: SubtreeTask) -> SubtreeResult:
+    """
+    Evaluate the given subtree of the search for this process's school:
+    create up to the task's number of worlds in it, skipping duplicates,
+    and give each the task's number of student distributions, keeping the
+    best. Ties go to the earlier distribution.
+
+    With a surrogate model, the worlds are chosen from more candidates than
+    are tested, the best predicted first, learning from the mean score of
+    each world tested (see surrogate.generate_worlds). A subtree with no
+    more worlds to test than the model warms up on creates them in search
+    order as usual, as the model would never be trusted.
+
+    Coarse to fine, every world is first scored on a sample of students, and
+    only the best share of them are tested (see fidelity.refine_worlds); the
+    model, if any, learns from those scores instead. A subtree whose share
+    kept is all of its worlds tests them all directly.
+    """
+    school = _school
+    clubs = list(school.clubs.values())
+    students = list(school.students.values())
+    result = SubtreeResult(task.index, fairness.new_fairness_stats(school))
+    signatures = worlds.WorldSignatures()
+    upper_limits = fairness.upper_limits(school)
+
+    random.seed(subtree_seed(task.seed, task.index))
+    reset_school(school)
+    start = time.perf_counter()
+    progress_every = max(10, min(1_000, (task.n_worlds * task.n_configurations) // 100))
+
+    model = None
+    if task.surrogate and (surrogate.n_warmup_for(task.n_worlds) < task.n_worlds):
+        model = surrogate.SurrogateModel()
+        generated = surrogate.generate_worlds(school, clubs, task.n_worlds, model, signatures=signatures, prefix=task.prefix)
+    else:
+        generated = worlds.generate_worlds(school, clubs, task.n_worlds, signatures=signatures, prefix=task.prefix)
+    if task.coarse and (fidelity.n_to_keep(task.n_worlds) < task.n_worlds):
+        generated = fidelity.refine_worlds(school, clubs, generated, fidelity.n_to_keep(task.n_worlds), reset_school, model)
+        model = None
+
+    for n_worlds in INSTRUMENTATION.timed('generate worlds', generated):
+        INSTRUMENTATION.count('worlds generated')
+        result.n_worlds = max(result.n_worlds, n_worlds)
+
+        total_score = 0
+        for i_configuration in range(task.n_configurations):
+
+            # Create and distribute! Student order is handled by the world
+            with INSTRUMENTATION.phase('distribute', {'subtree': task.index, 'world': n_worlds, 'configuration': i_configuration}):
+                world = World(school, clubs[:], students[:])
+                world.distribute()
+            INSTRUMENTATION.count('distributions')
+
+            # Validate early (intensive process)
+            if task.validate_early:
+                with INSTRUMENTATION.phase('validate'):
+                    valid, msg = world.validate()
+                result.n_valid += valid
+            else:
+                valid = True
+
+            # Calculate score (intensive process)
+            with INSTRUMENTATION.phase('score'):
+                score = world.score()
+            total_score += score
+            with INSTRUMENTATION.phase('fairness'):
+                result.fairness.add(world.report, score, upper_limits)
+
+            if valid:
+
+                # Replace the worst of the best, keeping them sorted by score
+                entry = (score, n_worlds, i_configuration, world.report)
+                if len(result.best) < task.n_best:
+                    result.best.append(entry)
+                elif score > result.best[0][0]:
+                    result.best[0] = entry
+
+                result.best.sort(key=lambda t: t[0])
+
+            # Reset student-only distributions
+            with INSTRUMENTATION.phase('reset students'):
+                for s in students:
+                    s.reset_distribution()
+                for c in clubs:
+                    c.reset_student_distribution()
+
+            # Progress counter
+            result.n_tested += 1
+            if not (result.n_tested % progress_every):
+                stem = f'{time.perf_counter() - start:,.2f} seconds: Subtree {task.index}: Tested {result.n_tested:,} worlds'
+                if task.validate_early:
+                    stem += f', {result.n_valid} valid'
+                print(stem)
+
+        # Teach the model how this world did
+        if (model is not None) and task.n_configurations:
+            model.observe(total_score / task.n_configurations)
+
+        # Reset instance/day distributions too
+        with INSTRUMENTATION.phase('reset worlds'):
+            reset_school(school)
+
+    result.n_duplicates = signatures.n_duplicates
+    reset_school(school)
+    return result
+
+def pool_context() -> multiprocessing.context.BaseContext:
+    """
+    Return the multiprocessing context for workers: forking where available.
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+def search_worlds(school: School, n_worlds: int, n_configurations: int, n_best: int, seed: int,
+                  n_workers: int=1, depth: int|None=None, validate_early: bool=False, root: tuple[int]=(),
+                  surrogate: bool=False, coarse: bool=False) -> tuple[list[tuple[int, World]], int, FairnessStats]:
+    """
+    Search for the best worlds of the given school: n_worlds worlds, shared
+    between the subtrees of the search cut at the given depth (see
+    choose_prefixes), each with n_configurations student distributions.
+    With more than one worker, subtrees are evaluated in worker processes.
+    Given a root prefix, only its subtree of the search is searched.
+    With a surrogate model, each subtree tests the worlds it predicts best
+    out of more candidates (see evaluate_subtree). Coarse to fine, only the
+    worlds that do best on a sample of students are tested in full.
+
+    Return a list of (score, world) tuples of the n_best top scorers
+    (ascending), the number of duplicate worlds skipped, and the fairness
+    statistics of all distributions tested.
+    """
+    start = time.perf_counter()
+
+    with INSTRUMENTATION.phase('plan subtrees'):
+        prefixes = choose_prefixes(school, seed, depth, root=root)
+
+    def _plan_subtrees(map_: Callable) -> list[SubtreeTask]:
+        with INSTRUMENTATION.phase('plan subtrees'):
+            tasks = plan_subtrees(prefixes, n_worlds, n_configurations, n_best, seed, validate_early, surrogate, coarse, map_)
+        print(f'Searching {len(tasks):,} of {len(prefixes):,} subtrees with {n_workers:,} worker(s)')
+        return tasks
+
+    def _report_progress(results: list[SubtreeResult]) -> None:
+        n_tested = sum(r.n_tested for r in results)
+        stem = f'{time.perf_counter() - start:,.2f} seconds: Searched {len(results):,}/{len(tasks):,} subtrees, tested {n_tested:,} worlds'
+        if validate_early:
+            stem += f', {sum(r.n_valid for r in results)} valid'
+        print(stem)
+
+    # Evaluate each subtree, in order
+    results = []
+    if n_workers <= 1:
+        _set_school(school)
+        tasks = _plan_subtrees(map)
+        for task in tasks:
+            results.append(evaluate_subtree(task))
+            _report_progress(results)
+    else:
+        context = pool_context()
+        problem.share_school(school, context)
+        try:
+            with context.Pool(n_workers, initializer=_init_worker, initargs=(school,)) as pool:
+                tasks = _plan_subtrees(pool.map)
+                for result in pool.imap(evaluate_subtree, tasks):
+                    results.append(result)
+                    _report_progress(results)
+        finally:
+            problem.unshare_school(school)
+
+    # Merge: the best scores, ties going to the earlier subtree, world, and configuration
+    entries = []
+    stats = fairness.new_fairness_stats(school)
+    for result in results:
+        stats.merge(result.fairness)
+        for (score, n_world, i_configuration, report) in result.best:
+            entries.append((-score, result.index, n_world, i_configuration, report))
+    entries.sort(key=lambda t: t[:4])
+
+    clubs = list(school.clubs.values())
+    students = list(school.students.values())
+    best = []
+    for (negative_score, _, _, _, report) in entries[:n_best]:
+        world = World(school, clubs[:], students[:])
+        world.report = report
+        best.append((-negative_score, world))
+    best.sort(key=lambda t: t[0])
+
+    return best, sum(r.n_duplicates for r in results), stats
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from club import Club
 from club_instance import ClubInstance
+import week
 
 class Student:
     """
@@ -8,7 +9,12 @@ class Student:
     Has a name, a grade, and a gender.
     Has preselected clubs, choices (keyed by priority), and unavailable days.
 
-    After distribution, has a dictionary of choies gotten and of days to clubs.
+    Once the school has assigned ids, has a dense integer id, and its choices
+    and preselected clubs are also interned as club ids for distribution.
+
+    After distribution, has a dictionary of choies gotten and a list of the
+    club id on each day (None if free). Unavailable and free days are sets of
+    days as bitmasks (see week.py); the days with a club are kept as one too.
 
     Tracks which choice is next for the purposes of distribution.
     Scores choices gotten for the purpose of ordering during distribution.
@@ -16,18 +22,22 @@ class Student:
     Also has a reactivity representing the degree to which the student's
     chosen clubs are overfull.
     """
-    __slots__ = ('name', 'grade', 'gender', 'choices', 'pres', 'days_unavailable', 'choices_gotten', 'days', 'next_choice_key', 'first_choice_key', 'choices_gotten_score', 'choices_gotten_weights', 'reactivity')
+    __slots__ = ('id', 'name', 'grade', 'gender', 'choices', 'pres', 'choice_ids', 'pre_ids', 'days_unavailable', 'choices_gotten', 'days', 'busy_days', 'next_choice_key', 'first_choice_key', 'choices_gotten_score', 'choices_gotten_weights', 'reactivity')
 
+    id: int
     name: str
     grade: int
     gender: str
 
     choices: dict[int, str]
     pres: dict[str, int]
-    days_unavailable: set[int]
+    choice_ids: dict[int, int]
+    pre_ids: dict[int, int]
+    days_unavailable: int
 
     choices_gotten: dict[int|str, int]
-    days: dict[int, str]
+    days: list[int|None]
+    busy_days: int
 
     next_choice_key: int
     first_choice_key: int
@@ -37,16 +47,19 @@ class Student:
 
     reactivity: int
     
-    def __init__(self: Student, name: str, grade: int, gender: str,
-                 choices: list[str], days_unavailable: set[int]=set()) -> None:
+    def __init__(self: Student, id: int, name: str, grade: int, gender: str,
+                 choices: list[str], days_unavailable: int=0) -> None:
         """
         Initialize this student with the given data. The indices in choices
         are reinterpreted as keys so as to preserve identity under deletion
         (and are 1-indexed rather than 0-indexed from now on).
 
+        The id is provisional until the school assigns ids (see School.assign_ids).
+
         Reset the distribution values for a blank slate.
         """
         
+        self.id = id
         self.name = name
         self.grade = grade
         self.gender = gender
@@ -58,6 +71,9 @@ class Student:
         self.choices = {}
         for (i, choice) in enumerate(choices):
             self.choices[i + 1] = choice
+
+        self.choice_ids = {}
+        self.pre_ids = {}
         
         self.first_choice_key = min(self.choices) if self.choices else 0
 
@@ -70,14 +86,23 @@ class Student:
         """
         return list(i for i in range(self.next_choice_key, 6) if i in self.choices)
 
-    def get_next_choice(self: Student) -> str|None:
+    def intern_choices(self: Student, club_ids: dict[str, int]) -> None:
+        """
+        Record this student's choices and preselected clubs as club ids,
+        given a dictionary mapping club codes to ids. Preselected clubs that
+        are not running are left out.
+        """
+        self.choice_ids = {key: club_ids[code] for (key, code) in self.choices.items()}
+        self.pre_ids = {club_ids[code]: n_times for (code, n_times) in self.pres.items() if code in club_ids}
+
+    def get_next_choice(self: Student) -> int|None:
         """
-        Return the student's next untried choice (as a club code),
+        Return the student's next untried choice (as a club id),
         or None if all possible choices have been tried.
         """
 
         # Already in one club per day
-        if len(self.days) == 3:
+        if self.busy_days == week.ALL_DAYS:
             return None
 
         # All choices have been tried
@@ -86,7 +111,7 @@ class Student:
             return None
 
         # Get the next choice and increment the next choice key
-        choice = self.choices[remaining_choice_indices[0]]
+        choice = self.choice_ids[remaining_choice_indices[0]]
         self.next_choice_key = remaining_choice_indices[0] + 1
         return choice
 
@@ -98,6 +123,7 @@ class Student:
         for (key, other) in self.choices.copy().items():
             if other == club_code:
                 del self.choices[key]
+                self.choice_ids.pop(key, None)
         
         self.first_choice_key = min(self.choices) if self.choices else 0
 
@@ -116,27 +142,28 @@ class Student:
         of choices gotten. The club could have been preselected, one
         we chose, or one we were placed into as a last resort (unchosen).
         """
-        code = instance.club.code
+        club_id = instance.club.id
         n_days = instance.club.days_per_instance
 
-        # Place the club code on each day in the instance
+        # Place the club id on each day in the instance
         # TODO Could place the instance key here too
-        for day in instance.days:
-            self.days[day] = code
+        for day in week.DAYS_IN[instance.days]:
+            self.days[day] = club_id
+        self.busy_days |= instance.days
 
         # Note which choice was gotten
 
         # Preselected
-        if code in self.pres:
+        if club_id in self.pre_ids:
             self.choices_gotten['pre'] += n_days
         
         else:
 
             # One of our choices
-            for (key, other) in self.choices.items():
+            for (key, other) in self.choice_ids.items():
 
                 # Checking 0 in the event that a choice was allowed to repeat
-                if other == code and self.choices_gotten[key] == 0:
+                if other == club_id and self.choices_gotten[key] == 0:
                     self.choices_gotten[key] += n_days
                     self.choices_gotten_score += self.choices_gotten_weights[key - 1]
                     break
@@ -147,15 +174,15 @@ class Student:
 
         # Eliminate remaining choice gotten records once we've got enough choices
         # e.g., if it took us 3 choices to get 3 days full, don't consider choices 4, 5
-        if len(self.days) == 3:
+        if self.busy_days == week.ALL_DAYS:
             for key in self.remaining_choice_indices():
                 del self.choices_gotten[key]
 
-    def free_days(self: Student) -> set[int]:
+    def free_days(self: Student) -> int:
         """
         Return the set of days this student still has free and available.
         """
-        return {0, 1, 2}.difference(self.days_unavailable).difference(set(self.days))
+        return week.ALL_DAYS & ~(self.busy_days | self.days_unavailable)
 
     def reset_distribution(self: Student) -> None:
         """
@@ -164,7 +191,8 @@ class Student:
         2. No choices gotten or choices gotten score
         3. Next choice key reset
         """
-        self.days = {}
+        self.days = [None] * week.N_DAYS
+        self.busy_days = 0
         self.next_choice_key = self.first_choice_key
 
         self.choices_gotten = {}
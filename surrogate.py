@@ -0,0 +1,213 @@
+"""
+A surrogate model of how well worlds score, from cheap structural features
+of their layouts, to spend student distributions on the most promising
+worlds first.
+
+Distributing students into a world many times is the expensive part of
+testing it; its layout alone says much about how it will do: how much
+repulsion its blocks lose (see placement.lost_repulsion), how its places on
+each day compare to the students available then, and how evenly teachers
+are loaded across the week. As worlds are tested, their features and mean
+scores are collected, and a ridge regression is fit to them (on features
+standardized to zero mean and unit variance, so the penalty treats each
+alike). The system is as small as the features are few, so it is solved
+directly in Python.
+
+Worlds are then drawn from a pool of candidate layouts larger than the
+number to test (see generate_worlds): the first few in search order, to
+learn from, then the best predicted each time, refitting as scores come in.
+Each subtree of the search learns on its own, so the first few are a share
+of its worlds (see n_warmup_for), or the model would never be used.
+"""
+from __future__ import annotations
+import itertools
+import math
+
+import placement
+import week
+import worlds
+
+from typing import TYPE_CHECKING, Iterator
+if TYPE_CHECKING:
+    from club import Club
+    from school import School
+
+# How many candidate layouts to draw each world to test from
+OVERSAMPLE = 4
+
+# How many worlds to test in search order before trusting the model, at most
+N_WARMUP = 8
+
+# The share of a subtree's worlds to test in search order, at least 2 of them
+WARMUP_FRACTION = 0.25
+
+# The ridge penalty on the (standardized) feature weights
+RIDGE = 1.0
+
+def layout_features(school: School, clubs: list[Club], layout: dict[str, list[int]]) -> list[float]:
+    """
+    Return the features of the given layout of the given clubs: the repulsion
+    it loses; the share of student days without a place, and the fewest
+    places per available student on any day; the share of top 3 votes its
+    instances can take; and the spread of teachers' instances across days.
+    """
+    places = [0] * week.N_DAYS
+    top_places = [0] * week.N_DAYS
+    teacher_days = [0] * week.N_DAYS
+    for club in clubs:
+        sets_of_days = layout[club.code]
+        if not sets_of_days:
+            continue
+
+        # Each instance takes at most its share of the club's top 3 votes
+        top = min(club.upper, club.votes['123'] / len(sets_of_days))
+        for days in sets_of_days:
+            for day in week.DAYS_IN[days]:
+                places[day] += club.upper
+                top_places[day] += top
+                teacher_days[day] += club.teacher is not None
+
+    available = [0] * week.N_DAYS
+    for student in school.student_list:
+        for day in week.DAYS_IN[~student.days_unavailable & ((1 << week.N_DAYS) - 1)]:
+            available[day] += 1
+
+    n_available = max(1, sum(available))
+    n_votes = max(1, sum(club.votes['123'] for club in clubs))
+    return [
+        placement.lost_repulsion(clubs, layout),
+        sum(max(0, a - p) for (a, p) in zip(available, places)) / n_available,
+        min((p / a for (a, p) in zip(available, places) if a), default=0.0),
+        sum(top_places) / n_votes,
+        max(teacher_days) - min(teacher_days),
+    ]
+
+def solve(matrix: list[list[float]], vector: list[float]) -> list[float]:
+    """
+    Return the solution x of matrix x = vector, by Gaussian elimination with
+    partial pivoting. The matrix must be square and nonsingular; both are
+    changed in place.
+    """
+    n = len(vector)
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda row: abs(matrix[row][col]))
+        (matrix[col], matrix[pivot]) = (matrix[pivot], matrix[col])
+        (vector[col], vector[pivot]) = (vector[pivot], vector[col])
+
+        for row in range(col + 1, n):
+            factor = matrix[row][col] / matrix[col][col]
+            if factor:
+                for k in range(col, n):
+                    matrix[row][k] -= factor * matrix[col][k]
+                vector[row] -= factor * vector[col]
+
+    x = [0.0] * n
+    for row in reversed(range(n)):
+        x[row] = (vector[row] - sum(matrix[row][k] * x[k] for k in range(row + 1, n))) / matrix[row][row]
+    return x
+
+class SurrogateModel:
+    """
+    A ridge regression of world scores on layout features (see module docs):
+    the (features, score) samples observed so far, the features of the world
+    last created whose score is awaited, and the fit: the means and scales
+    the features are standardized by, the weights, and the mean score.
+    """
+    __slots__ = ('samples', 'scores', 'pending', 'means', 'scales', 'weights', 'intercept')
+
+    samples: list[list[float]]
+    scores: list[float]
+    pending: list[float]|None
+    means: list[float]
+    scales: list[float]
+    weights: list[float]
+    intercept: float
+
+    def __init__(self: SurrogateModel) -> None:
+        """Start with no samples, predicting 0 for every world."""
+        self.samples = []
+        self.scores = []
+        self.pending = None
+        self.means = []
+        self.scales = []
+        self.weights = []
+        self.intercept = 0.0
+
+    def observe(self: SurrogateModel, score: float) -> None:
+        """
+        Record the given score for the world last created (see generate_worlds).
+        """
+        if self.pending is not None:
+            self.samples.append(self.pending)
+            self.scores.append(score)
+            self.pending = None
+
+    def fit(self: SurrogateModel, ridge: float=RIDGE) -> None:
+        """
+        Fit the weights to the samples so far.
+        """
+        n = len(self.samples)
+        if not n:
+            return
+        n_features = len(self.samples[0])
+
+        self.means = [sum(sample[j] for sample in self.samples) / n for j in range(n_features)]
+        self.scales = [math.sqrt(sum((sample[j] - self.means[j]) ** 2 for sample in self.samples) / n) or 1.0 for j in range(n_features)]
+        self.intercept = sum(self.scores) / n
+        rows = [self._standardize(sample) for sample in self.samples]
+
+        # The normal equations, with the ridge on the diagonal
+        matrix = [[sum(row[i] * row[j] for row in rows) + (ridge if i == j else 0.0) for j in range(n_features)] for i in range(n_features)]
+        vector = [sum(row[i] * (score - self.intercept) for (row, score) in zip(rows, self.scores)) for i in range(n_features)]
+        self.weights = solve(matrix, vector)
+
+    def _standardize(self: SurrogateModel, features: list[float]) -> list[float]:
+        """
+        Return the given features standardized by the fit's means and scales.
+        """
+        return [(x - mean) / scale for (x, mean, scale) in zip(features, self.means, self.scales)]
+
+    def predict(self: SurrogateModel, features: list[float]) -> float:
+        """
+        Return the predicted score of a world with the given features.
+        """
+        return self.intercept + sum(w * x for (w, x) in zip(self.weights, self._standardize(features)))
+
+def n_warmup_for(n_to_yield: int, n_warmup: int=N_WARMUP, fraction: float=WARMUP_FRACTION) -> int:
+    """
+    Return how many of the given number of worlds to create in search order
+    before trusting the model: the given share of them, at least 2 (fewer
+    samples cannot be told apart) and at most n_warmup.
+    """
+    return min(n_warmup, max(2, math.ceil(n_to_yield * fraction)))
+
+def generate_worlds(school: School, clubs: list[Club], n_to_yield: int, model: SurrogateModel, symmetry: bool=True,
+                    signatures: worlds.WorldSignatures|None=None, prefix: tuple[int]=(), oversample: int=OVERSAMPLE,
+                    n_warmup: int|None=None) -> Iterator[int]:
+    """
+    Create up to n_to_yield worlds as worlds.generate_worlds does, but drawn
+    from the first oversample times as many layouts: the first n_warmup
+    (by default, see n_warmup_for) in search order, then the best predicted
+    by the model each time. The score of each world created must be observed
+    by the model (see observe) before the iterator is advanced.
+    """
+    if n_warmup is None:
+        n_warmup = n_warmup_for(n_to_yield)
+
+    candidates = []
+    for layout in itertools.islice(worlds.generate_layouts(school, clubs, symmetry, prefix), n_to_yield * oversample):
+        if (signatures is None) or signatures.add(worlds.layout_signature(layout)):
+            candidates.append((layout, layout_features(school, clubs, layout)))
+
+    n = 0
+    while candidates and (n < n_to_yield):
+        if len(model.samples) < n_warmup:
+            i = 0
+        else:
+            model.fit()
+            i = max(range(len(candidates)), key=lambda i: (model.predict(candidates[i][1]), -i))
+        (layout, model.pending) = candidates.pop(i)
+        worlds.create_layout(clubs, layout)
+
+        n += 1
+        yield n
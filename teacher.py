@@ -1,4 +1,5 @@
 from __future__ import annotations
+import week
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -6,80 +7,85 @@ if TYPE_CHECKING:
 
 class Teacher:
     """
-    Represents a teacher. Has a name, day use trackers, and clubs.
+    Represents a teacher. Has an id, a name, day use trackers, and clubs.
 
     A teacher's prechosen days are the ones they're available to take clubs on.
     Their free days are (at any given moment) the ones without a club yet.
     Their taken days are (at any given moment) the ones with a club already.
     Their clubs are (at any given moment) the list of clubs they teach.
+    Sets of days are bitmasks (see week.py).
 
     TODO There is currently no data source to account for different pre days.
     """
-    __slots__ = ('name', 'pre_days', 'free_days', 'taken_days', 'clubs')
+    __slots__ = ('id', 'name', 'pre_days', 'free_days', 'taken_days', 'clubs')
 
+    id: int
     name: str
-    pre_days: set[int]
-    free_days: set[int]
-    taken_days: set[int]
-    clubs: set[Club]
+    pre_days: int
+    free_days: int
+    taken_days: int
+    clubs: list[Club]
 
-    def __init__(self: Teacher, name: str) -> None:
+    def __init__(self: Teacher, id: int, name: str) -> None:
         """
-        Initialize a teacher with the given name.
-        Prechosen days are currently hardcoded.
+        Initialize a teacher with the given id and name.
+        Prechosen days are currently all the days of the week.
         Free days are equal to the prechosen ones and taken days start empty.
-        Clubs start empty.
+        Clubs start empty. They are kept in a list (in the order they were
+        added) rather than a set, so that a teacher can be pickled before its
+        clubs, which are hashed by id, have their state restored.
         """
+        self.id = id
         self.name = name
-        self.pre_days = {0, 1, 2}
-        self.free_days = self.pre_days.copy()
-        self.taken_days = set()
-        self.clubs = set()
+        self.pre_days = week.ALL_DAYS
+        self.free_days = self.pre_days
+        self.taken_days = 0
+        self.clubs = []
 
     def take_day(self: Teacher, day: int) -> None:
         """
         Take the given day, if it's among the teacher's prechosen days.
         """
-        if day in self.pre_days:
-            self.taken_days.add(day)
-            self.free_days.remove(day)
+        self.take_days(1 << day)
 
-    def take_days(self: Teacher, days: set[int]) -> None:
+    def take_days(self: Teacher, days: int) -> None:
         """
         Take each of the given days,
         if they're among the teacher's prechosen days.
         """
-        for day in days:
-            self.take_day(day)
+        days &= self.pre_days
+        self.taken_days |= days
+        self.free_days &= ~days
 
     def is_day_free(self: Teacher, day: int) -> bool:
         """
         Return True iff the given day is free for this teacher.
         """
-        return day in self.free_days
+        return bool(self.free_days & (1 << day))
 
     def reset_day(self: Teacher, day: int) -> None:
         """
         Reset the given day's status, i.e. make it free and not taken,
         if it's among the teacher's prechosen days.
         """
-        if day in self.pre_days:
-            self.free_days.add(day)
-            self.taken_days.remove(day)
+        bit = (1 << day) & self.pre_days
+        self.free_days |= bit
+        self.taken_days &= ~bit
 
     def reset_days(self: Teacher) -> None:
         """
         Reset the given days' status, i.e. make them free and not taken,
         if they're among the teacher's prechosen days.
         """
-        for day in range(3):
-            self.reset_day(day)
+        self.free_days = self.pre_days
+        self.taken_days = 0
 
     def add_club(self: Teacher, club: Club) -> None:
         """
         Add the given club to the teacher's roster.
         """
-        self.clubs.add(club)
+        if club not in self.clubs:
+            self.clubs.append(club)
 
     def remove_club(self: Teacher, club: Club) -> None:
         """
@@ -92,7 +98,7 @@ class Teacher:
         """
         Reset the teacher's roster of clubs to empty.
         """
-        self.clubs = set()
+        self.clubs = []
 
     def __repr__(self: Teacher) -> str:
         """
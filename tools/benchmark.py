@@ -0,0 +1,572 @@
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+# Allow running from the tools directory as well as from the main program
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import compiled
+from school import School
+from world import World
+import club_sandwich
+import worlds
+
+try:
+    from tools.synthetic_school import SyntheticSpec, generate_school, write_input_csvs
+except ImportError:
+    from synthetic_school import SyntheticSpec, generate_school, write_input_csvs
+
+# Scales to benchmark at (students x clubs)
+SCALES = (
+    SyntheticSpec(n_students=200, n_clubs=20),
+    SyntheticSpec(n_students=420, n_clubs=40),
+    SyntheticSpec(n_students=1000, n_clubs=60),
+)
+
+# Timed repetitions per benchmark; the median is reported
+N_REPEATS = 5
+
+# Worlds to enumerate per repetition when benchmarking generate_worlds
+N_WORLDS_PER_REPEAT = 20
+
+# Calls per repetition for the fast benchmarks (scoring, validation)
+N_CALLS_PER_REPEAT = 20
+
+# Distributions per world when benchmarking create_schedule end to end
+N_CONFIGURATIONS_END_TO_END = 10
+
+# Seed for the random module, so that runs are comparable
+SEED = 0
+
+# Where results are recorded, one entry per run, oldest first
+PATH_HISTORY = Path('src/output/benchmarks/history.json')
+
+# Relative slowdown (in median time or peak memory) flagged as a regression
+DEFAULT_THRESHOLD = 0.10
+
+# Benchmarks below these are too noisy to flag (in seconds, and bytes)
+MIN_COMPARABLE_SECONDS = 0.001
+MIN_COMPARABLE_MEMORY = 100_000
+
+class BenchmarkResult:
+    """
+    The result of running a benchmark at a given scale: the seconds taken by
+    each repetition, the number of operations (in the given unit) done by
+    each repetition, and the peak memory (in bytes) allocated by one more
+    repetition run under tracemalloc.
+    """
+    __slots__ = ('name', 'scale', 'times', 'n_ops', 'unit', 'peak_memory')
+
+    name: str
+    scale: str
+    times: list[float]
+    n_ops: int
+    unit: str
+    peak_memory: int
+
+    def __init__(self: BenchmarkResult, name: str, scale: str, times: list[float], n_ops: int, unit: str, peak_memory: int) -> None:
+        """Initialize this result with the given data."""
+        self.name = name
+        self.scale = scale
+        self.times = times
+        self.n_ops = n_ops
+        self.unit = unit
+        self.peak_memory = peak_memory
+
+    def median(self: BenchmarkResult) -> float:
+        """Return the median seconds per repetition."""
+        return statistics.median(self.times)
+
+    def throughput(self: BenchmarkResult) -> float:
+        """Return the operations per second, based on the median."""
+        median = self.median()
+        return (self.n_ops / median) if median else 0.0
+
+    def to_dict(self: BenchmarkResult) -> dict[str, object]:
+        """
+        Return this result as a dictionary for the history file, including
+        the derived median and throughput so that it can be read at a glance.
+        """
+        return {
+            'name': self.name,
+            'scale': self.scale,
+            'median': self.median(),
+            'throughput': self.throughput(),
+            'unit': self.unit,
+            'n ops': self.n_ops,
+            'peak memory': self.peak_memory,
+            'times': self.times
+        }
+
+    @staticmethod
+    def from_dict(data: dict[str, object]) -> BenchmarkResult:
+        """
+        Return a result from a dictionary made by to_dict.
+        """
+        return BenchmarkResult(data['name'], data['scale'], data['times'], data['n ops'], data['unit'], data['peak memory'])
+
+    def __repr__(self: BenchmarkResult) -> str:
+        """Return a string representation of this result (name, scale)."""
+        return f'{self.name} [{self.scale}]'
+
+class Benchmark:
+    """
+    A named operation to benchmark. Given a spec, its prepare function does
+    any untimed preparation and returns a (setup, run, n_ops, cleanup) tuple:
+    setup is called untimed before each repetition, run is the timed
+    operation, which does n_ops operations in the given unit, and cleanup is
+    called once after the last repetition (e.g. to remove scratch files).
+    """
+    __slots__ = ('name', 'unit', 'prepare')
+
+    name: str
+    unit: str
+    prepare: Callable[[SyntheticSpec], tuple[Callable[[], None], Callable[[], None], int, Callable[[], None]]]
+
+    def __init__(self: Benchmark, name: str, unit: str, prepare: Callable[[SyntheticSpec], tuple[Callable[[], None], Callable[[], None], int, Callable[[], None]]]) -> None:
+        """Initialize this benchmark with the given name, unit, and preparer."""
+        self.name = name
+        self.unit = unit
+        self.prepare = prepare
+
+    def run(self: Benchmark, spec: SyntheticSpec, n_repeats: int=N_REPEATS) -> BenchmarkResult:
+        """
+        Run this benchmark at the given scale and return the result.
+        """
+        random.seed(SEED)
+        setup, run, n_ops, cleanup = self.prepare(spec)
+
+        try:
+            times = []
+            for _ in range(n_repeats):
+                setup()
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+
+            # Measure memory separately, since tracing slows everything down
+            setup()
+            tracemalloc.start()
+            run()
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            cleanup()
+
+        return BenchmarkResult(self.name, repr(spec), times, n_ops, self.unit, peak_memory)
+
+# Helpers
+
+def _reset_students(school: School) -> None:
+    """
+    Reset the distribution of students (but not of club instances).
+    """
+    for s in school.students.values():
+        s.reset_distribution()
+    for c in school.clubs.values():
+        c.reset_student_distribution()
+
+def _reset_worlds(school: School) -> None:
+    """
+    Reset the distribution of students and club instances alike.
+    """
+    for c in school.clubs.values():
+        c.reset_entire_distribution()
+    for s in school.students.values():
+        s.reset_distribution()
+
+def _generate_one_world(school: School) -> None:
+    """
+    Distribute the school's clubs to days in the first generated world.
+    """
+    _reset_worlds(school)
+    for _ in worlds.generate_worlds(school, list(school.clubs.values()), 1):
+        break
+
+def _distributed_world(school: School) -> World:
+    """
+    Return a world that has been distributed (in the first generated world).
+    """
+    _generate_one_world(school)
+    _reset_students(school)
+    world = World(school, list(school.clubs.values()), list(school.students.values()))
+    world.distribute()
+    return world
+
+# Preparers for each benchmark
+
+def _prepare_prepare_school(spec: SyntheticSpec) -> tuple[Callable[[], None], Callable[[], None], int, Callable[[], None]]:
+    """
+    Time prepare_school on input CSVs in a scratch directory (including
+    saving the vote CSVs, as in a real run). Operations are students.
+    """
+    root = Path(tempfile.mkdtemp(prefix='club-sandwich-benchmark-'))
+    write_input_csvs(spec, root)
+
+    def run() -> None:
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            club_sandwich.prepare_school()
+        finally:
+            os.chdir(cwd)
+
+    return (lambda: None), run, spec.n_students, (lambda: shutil.rmtree(root, ignore_errors=True))
+
+def _prepare_calculate_repulsions(spec: SyntheticSpec) -> tuple[Callable[[], None], Callable[[], None], int, Callable[[], None]]:
+    """
+    Time School.calculate_repulsions. Operations are students.
+    """
+    school = generate_school(spec)
+    return (lambda: None), school.calculate_repulsions, len(school.students), (lambda: None)
+
+def _prepare_generate_worlds(spec: SyntheticSpec) -> tuple[Callable[[], None], Callable[[], None], int, Callable[[], None]]:
+    """
+    Time enumerating worlds with worlds.generate_worlds, resetting instances
+    between worlds as the main loop does. Operations are worlds.
+    """
+    school = generate_school(spec)
+    clubs = list(school.clubs.values())
+    n_generated = [0]
+
+    def run() -> None:
+        n_generated[0] = 0
+        for _ in worlds.generate_worlds(school, clubs, N_WORLDS_PER_REPEAT):
+            n_generated[0] += 1
+            for c in clubs:
+                c.reset_entire_distribution()
+
+    # Ties may allow fewer worlds than asked for; count them once up front
+    run()
+    return (lambda: None), run, max(1, n_generated[0]), (lambda: None)
+
+def _prepare_distribute(spec: SyntheticSpec) -> tuple[Callable[[], None], Callable[[], None], int, Callable[[], None]]:
+    """
+    Time World.distribute in one generated world. Operations are distributions.
+    """
+    school = generate_school(spec)
+    _generate_one_world(school)
+
+    def run() -> None:
+        world = World(school, list(school.clubs.values()), list(school.students.values()))
+        world.distribute()
+
+    return (lambda: _reset_students(school)), run, 1, (lambda: None)
+
+def _prepare_calculate_score(spec: SyntheticSpec) -> tuple[Callable[[], None], Callable[[], None], int, Callable[[], None]]:
+    """
+    Time Report.calculate_score (including the statistics it relies on)
+    on a distributed world. Operations are scores.
+    """
+    report = _distributed_world(generate_school(spec)).report
+
+    def run() -> None:
+        for _ in range(N_CALLS_PER_REPEAT):
+            report._calculated_stats = False
+            report._calculated_score = False
+            report.calculate_score()
+
+    return (lambda: None), run, N_CALLS_PER_REPEAT, (lambda: None)
+
+def _prepare_validate(spec: SyntheticSpec) -> tuple[Callable[[], None], Callable[[], None], int, Callable[[], None]]:
+    """
+    Time World.validate on a distributed world. Operations are validations.
+    """
+    world = _distributed_world(generate_school(spec))
+
+    def run() -> None:
+        for _ in range(N_CALLS_PER_REPEAT):
+            world.validate()
+
+    return (lambda: None), run, N_CALLS_PER_REPEAT, (lambda: None)
+
+def _prepare_create_schedule(spec: SyntheticSpec) -> tuple[Callable[[], None], Callable[[], None], int, Callable[[], None]]:
+    """
+    Time create_schedule end to end (preparing the school, distributing a
+    reduced number of configurations, and saving reports) on input CSVs in a
+    scratch directory, with its printing silenced. Operations are distributions.
+    """
+    root = Path(tempfile.mkdtemp(prefix='club-sandwich-benchmark-'))
+    write_input_csvs(spec, root)
+
+    def run() -> None:
+        cwd = os.getcwd()
+        n_configurations = club_sandwich.N_STUDENT_CONFIGURATIONS_PER_WORLD
+        os.chdir(root)
+        club_sandwich.N_STUDENT_CONFIGURATIONS_PER_WORLD = N_CONFIGURATIONS_END_TO_END
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                club_sandwich.create_schedule(instrument=False, profile=False, trace=False)
+        finally:
+            club_sandwich.N_STUDENT_CONFIGURATIONS_PER_WORLD = n_configurations
+            os.chdir(cwd)
+
+    return (lambda: None), run, club_sandwich.N_WORLDS_TO_TEST * N_CONFIGURATIONS_END_TO_END, (lambda: shutil.rmtree(root, ignore_errors=True))
+
+BENCHMARKS = (
+    Benchmark('prepare_school', 'students', _prepare_prepare_school),
+    Benchmark('School.calculate_repulsions', 'students', _prepare_calculate_repulsions),
+    Benchmark('worlds.generate_worlds', 'worlds', _prepare_generate_worlds),
+    Benchmark('World.distribute', 'distributions', _prepare_distribute),
+    Benchmark('Report.calculate_score', 'scores', _prepare_calculate_score),
+    Benchmark('World.validate', 'validations', _prepare_validate),
+    Benchmark('create_schedule', 'distributions', _prepare_create_schedule),
+)
+
+def format_results(results: list[BenchmarkResult]) -> str:
+    """
+    Return a string of the given results formatted as a table.
+    """
+    lines = [f'{"Benchmark":<30} {"Scale":<26} {"Median ms":>11} {"Throughput":>24} {"Peak MB":>9}']
+    lines.append('=' * 104)
+
+    for result in results:
+        throughput = f'{result.throughput():,.1f} {result.unit}/s'
+        lines.append(f'{result.name:<30} {result.scale:<26} {result.median() * 1000:>11.2f} {throughput:>24} {result.peak_memory / 1_000_000:>9.2f}')
+
+    return '\n'.join(lines)
+
+def run_benchmarks(scales: tuple[SyntheticSpec]=SCALES, benchmarks: tuple[Benchmark]=BENCHMARKS) -> list[BenchmarkResult]:
+    """
+    Run each benchmark at each scale, printing progress and a table of
+    results at the end, and return the results.
+    """
+    results = []
+    for spec in scales:
+        for benchmark in benchmarks:
+            print(f'Running {benchmark.name} at {spec}...')
+            results.append(benchmark.run(spec))
+
+    print()
+    print(format_results(results))
+    return results
+
+# History
+
+def machine_info() -> dict[str, object]:
+    """
+    Return a description of this machine and interpreter (and of which modules
+    are compiled), since timings are only comparable between runs on the same setup.
+    """
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'compiled modules': compiled.loaded_compiled()
+    }
+
+def git_revision() -> str|None:
+    """
+    Return the current git revision of the repository (suffixed with
+    '-dirty' if there are uncommitted changes), or None if unavailable.
+    """
+    root = Path(__file__).resolve().parent.parent
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{revision}-dirty' if status else revision
+
+def load_history(path: Path=PATH_HISTORY) -> list[dict[str, object]]:
+    """
+    Return the runs recorded in the history file, oldest first.
+    """
+    if not path.exists():
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def record_run(results: list[BenchmarkResult], label: str='', path: Path=PATH_HISTORY) -> dict[str, object]:
+    """
+    Append a run with the given results to the history file and return it.
+    Runs are numbered from 1 in the order they are recorded.
+    """
+    history = load_history(path)
+    run = {
+        'id': (history[-1]['id'] + 1) if history else 1,
+        'label': label,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'machine': machine_info(),
+        'results': [result.to_dict() for result in results]
+    }
+    history.append(run)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=2)
+
+    return run
+
+def find_run(history: list[dict[str, object]], ref: str) -> dict[str, object]:
+    """
+    Return the run matching the given reference: a run id, a negative index
+    (-1 for the latest), a label, or a prefix of a git revision. The latest
+    matching run wins. Raise a ValueError if none match.
+    """
+    if ref.lstrip('-').isdigit():
+        n = int(ref)
+        matches = [history[n]] if (n < 0 and -n <= len(history)) else [run for run in history if run['id'] == n]
+    else:
+        matches = [run for run in history if run['label'] == ref or (run['revision'] or '').startswith(ref)]
+
+    if not matches:
+        raise ValueError(f'No benchmark run matches {ref!r}')
+    return matches[-1]
+
+def _describe_run(run: dict[str, object]) -> str:
+    """
+    Return a one-line description of the given run.
+    """
+    label = f' "{run["label"]}"' if run['label'] else ''
+    return f'#{run["id"]}{label} ({run["revision"] or "unknown revision"}, {run["timestamp"]})'
+
+class Comparison:
+    """
+    A comparison of one benchmark at one scale between a baseline run and a
+    current run: the ratios of current to baseline median time and peak
+    memory, and whether either grew beyond the threshold.
+    """
+    __slots__ = ('name', 'scale', 'baseline', 'current', 'time_ratio', 'memory_ratio', 'regressed')
+
+    name: str
+    scale: str
+    baseline: BenchmarkResult
+    current: BenchmarkResult
+    time_ratio: float
+    memory_ratio: float
+    regressed: bool
+
+    def __init__(self: Comparison, baseline: BenchmarkResult, current: BenchmarkResult, threshold: float) -> None:
+        """Initialize this comparison between the given results."""
+        self.name = current.name
+        self.scale = current.scale
+        self.baseline = baseline
+        self.current = current
+
+        self.time_ratio = (current.median() / baseline.median()) if baseline.median() else 1.0
+        self.memory_ratio = (current.peak_memory / baseline.peak_memory) if baseline.peak_memory else 1.0
+
+        slower = self.time_ratio > 1 + threshold and current.median() >= MIN_COMPARABLE_SECONDS
+        bigger = self.memory_ratio > 1 + threshold and current.peak_memory >= MIN_COMPARABLE_MEMORY
+        self.regressed = slower or bigger
+
+def compare_runs(baseline: dict[str, object], current: dict[str, object], threshold: float=DEFAULT_THRESHOLD) -> list[Comparison]:
+    """
+    Return comparisons of every benchmark present in both runs.
+    """
+    baseline_results = {(r['name'], r['scale']): BenchmarkResult.from_dict(r) for r in baseline['results']}
+
+    comparisons = []
+    for data in current['results']:
+        key = (data['name'], data['scale'])
+        if key in baseline_results:
+            comparisons.append(Comparison(baseline_results[key], BenchmarkResult.from_dict(data), threshold))
+
+    return comparisons
+
+def format_comparisons(baseline: dict[str, object], current: dict[str, object], comparisons: list[Comparison], threshold: float) -> str:
+    """
+    Return a string of the given comparisons formatted as a table, with
+    regressions flagged and a warning if the runs were on different machines.
+    """
+    lines = [f'Baseline: {_describe_run(baseline)}', f'Current:  {_describe_run(current)}']
+    if baseline['machine'] != current['machine']:
+        lines.append('Warning: the runs were on different machines or interpreters, so timings may not be comparable')
+    lines.append('')
+
+    lines.append(f'{"Benchmark":<30} {"Scale":<26} {"Base ms":>10} {"Now ms":>10} {"Time":>8} {"Memory":>8}')
+    lines.append('=' * 106)
+
+    for c in comparisons:
+        flag = '  REGRESSION' if c.regressed else ''
+        lines.append(f'{c.name:<30} {c.scale:<26} {c.baseline.median() * 1000:>10.2f} {c.current.median() * 1000:>10.2f} {c.time_ratio - 1:>+8.1%} {c.memory_ratio - 1:>+8.1%}{flag}')
+
+    n_regressed = sum(c.regressed for c in comparisons)
+    lines.append('')
+    lines.append(f'{n_regressed} regression(s) beyond {threshold:.0%}')
+    return '\n'.join(lines)
+
+def track_benchmarks(label: str='', baseline_ref: str|None=None, threshold: float=DEFAULT_THRESHOLD) -> bool:
+    """
+    Run all benchmarks, record the run in the history, and compare it with
+    the given baseline (by default, the previous run). Return True if no
+    benchmark regressed.
+    """
+    history = load_history()
+    baseline = find_run(history, baseline_ref) if baseline_ref else (history[-1] if history else None)
+
+    current = record_run(run_benchmarks(), label)
+    print(f'\nRecorded run {_describe_run(current)} in {PATH_HISTORY}')
+
+    if baseline is None:
+        print('No earlier run to compare with')
+        return True
+
+    comparisons = compare_runs(baseline, current, threshold)
+    print()
+    print(format_comparisons(baseline, current, comparisons, threshold))
+    return not any(c.regressed for c in comparisons)
+
+def main() -> None:
+    """
+    Run, compare, or list benchmark runs from the command line. The exit
+    status is 1 if a comparison finds a regression, so that it can gate
+    changes in scripts.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the scheduling engine and track regressions.')
+    commands = parser.add_subparsers(dest='command')
+
+    run_parser = commands.add_parser('run', help='run the benchmarks, record them, and compare with a baseline')
+    run_parser.add_argument('--label', default='', help='a label to find this run by later (e.g. "baseline")')
+    run_parser.add_argument('--baseline', help='run to compare with (id, negative index, label, or revision); defaults to the previous run')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='relative slowdown to flag (default %(default)s)')
+
+    compare_parser = commands.add_parser('compare', help='compare two recorded runs')
+    compare_parser.add_argument('baseline', help='run to compare with (id, negative index, label, or revision)')
+    compare_parser.add_argument('current', nargs='?', default='-1', help='run to compare (defaults to the latest)')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='relative slowdown to flag (default %(default)s)')
+
+    commands.add_parser('history', help='list recorded runs')
+
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        history = load_history()
+        baseline, current = find_run(history, args.baseline), find_run(history, args.current)
+        comparisons = compare_runs(baseline, current, args.threshold)
+        print(format_comparisons(baseline, current, comparisons, args.threshold))
+        ok = not any(c.regressed for c in comparisons)
+    elif args.command == 'history':
+        for run in load_history():
+            print(_describe_run(run))
+        ok = True
+    elif args.command == 'run':
+        ok = track_benchmarks(args.label, args.baseline, args.threshold)
+    else:
+        run_benchmarks()
+        ok = True
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
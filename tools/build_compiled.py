@@ -0,0 +1,103 @@
+"""
+Build compiled versions of the hot modules (see compiled.py) from their
+unchanged sources, with Cython (in pure-Python mode) or mypyc, into
+build/compiled/. The program uses them from then on, unless switched off;
+tools/compiled_parity.py checks that they give the same results.
+
+Usage: build_compiled.py [--backend cython|mypyc] [--clean]
+
+Cython is the default: it compiles the typed Python as it is. mypyc
+type-checks the modules strictly first, and refuses to build if they
+do not pass. Either must be installed (pip install cython, or mypy).
+"""
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import os
+import shutil
+import sys
+
+# Allow running from the tools directory as well as from the main program
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import compiled
+
+BACKENDS = ('cython', 'mypyc')
+
+PATH_ROOT = Path(__file__).resolve().parent.parent
+PATH_BUILD_TEMP = PATH_ROOT / 'build' / 'temp'
+
+def _extensions(backend: str, modules: tuple[str]) -> list[object]:
+    """
+    Return the setuptools extensions to build the given modules (by name,
+    at the root of the repository) with the given backend.
+    Exit with a message if the backend is not installed.
+    """
+    sources = [f'{module}.py' for module in modules]
+
+    if backend == 'cython':
+        try:
+            from Cython.Build import cythonize
+        except ImportError:
+            sys.exit('Cython is not installed (pip install cython)')
+        from setuptools import Extension
+
+        # Named explicitly, so that they are not named as part of a package
+        extensions = [Extension(module, [source]) for (module, source) in zip(modules, sources)]
+        return cythonize(extensions, build_dir=str(PATH_BUILD_TEMP / 'cython'), compiler_directives={'language_level': 3, 'binding': True}, quiet=True)
+
+    try:
+        from mypyc.build import mypycify
+    except ImportError:
+        sys.exit('mypyc is not installed (pip install mypy)')
+
+    # Named relative to the root, as for Cython
+    return mypycify(['--explicit-package-bases', *sources], opt_level='3')
+
+def build(backend: str='cython', modules: tuple[str]=compiled.MODULES) -> None:
+    """
+    Compile the given modules with the given backend into build/compiled/.
+    """
+    from setuptools import setup
+
+    # Sources are given relative to the root
+    cwd = os.getcwd()
+    os.chdir(PATH_ROOT)
+    try:
+        setup(
+            name='club_sandwich_compiled',
+            ext_modules=_extensions(backend, modules),
+            script_args=['build_ext', '--build-lib', str(compiled.PATH_COMPILED), '--build-temp', str(PATH_BUILD_TEMP)],
+            zip_safe=False
+        )
+    finally:
+        os.chdir(cwd)
+
+    built = [module for module in modules if compiled.is_built(module)]
+    print(f'Compiled {len(built)}/{len(modules)} modules with {backend} into {compiled.PATH_COMPILED}: {", ".join(built)}')
+
+def clean() -> None:
+    """
+    Remove all compiled modules and build files, so that the sources are used.
+    """
+    for path in (compiled.PATH_COMPILED, PATH_BUILD_TEMP):
+        if path.exists():
+            shutil.rmtree(path)
+    print('Removed compiled modules')
+
+def main() -> None:
+    """
+    Build (or clean) the compiled modules from the command line.
+    """
+    parser = argparse.ArgumentParser(description='Compile the hot modules, keeping the sources as a fallback.')
+    parser.add_argument('--backend', choices=BACKENDS, default='cython', help='compiler to use (default %(default)s)')
+    parser.add_argument('--clean', action='store_true', help='remove the compiled modules instead')
+    args = parser.parse_args()
+
+    if args.clean:
+        clean()
+    else:
+        build(args.backend)
+
+if __name__ == '__main__':
+    main()
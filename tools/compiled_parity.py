@@ -0,0 +1,122 @@
+"""
+Check that the compiled modules (see compiled.py) give the same results as
+the interpreted sources. The same distributions (of a synthetic school, with
+fixed seeds) are run in a process of each kind, and their scores and reports
+compared; the time each took is shown for the speedup.
+
+Usage: compiled_parity.py [--seeds N] [--students N] [--clubs N]
+
+The exit status is 1 if any result differs, and 2 if nothing is compiled.
+"""
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+# Allow running from the tools directory as well as from the main program
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Must come first: the hot modules imported below are then the compiled ones, if built
+import compiled
+from report import Report
+from world import World
+import search
+import worlds
+
+try:
+    from tools.synthetic_school import SyntheticSpec, generate_school
+except ImportError:
+    from synthetic_school import SyntheticSpec, generate_school
+
+DEFAULT_N_SEEDS = 10
+
+def report_digest(report: Report) -> str:
+    """
+    Return a digest of the given report's distribution and score: where each
+    student is on each day, and each club instance's days and students.
+    """
+    students = [data['days'] for data in report.students if data is not None]
+    clubs = [[(data['key'], data['days'], sorted(data['students'])) for data in instances] for instances in report.clubs if instances is not None]
+    return hashlib.sha256(repr((report.calculate_score(), students, clubs)).encode()).hexdigest()[:16]
+
+def run_distributions(spec: SyntheticSpec, n_seeds: int) -> list[tuple[int, str]]:
+    """
+    Return a (score, report digest) tuple for a distribution of the first
+    world of the given synthetic school with each seed from 0 to n_seeds.
+    """
+    school = generate_school(spec)
+    clubs = list(school.clubs.values())
+    students = list(school.students.values())
+    results = []
+
+    for seed in range(n_seeds):
+        search.reset_school(school)
+        random.seed(seed)
+        for _ in worlds.generate_worlds(school, clubs, 1):
+            world = World(school, clubs[:], students[:])
+            world.distribute()
+            results.append((world.score(), report_digest(world.report)))
+
+    search.reset_school(school)
+    return results
+
+def _run_child(compiled_on: bool, args: argparse.Namespace) -> dict[str, object]:
+    """
+    Run the distributions in a new process, with compiled modules switched
+    on or off, and return what it found. String hashing is fixed, so that
+    sets of names are ordered the same way in both.
+    """
+    environment = dict(os.environ, PYTHONHASHSEED='0')
+    environment[compiled.SWITCH] = '1' if compiled_on else '0'
+    command = [sys.executable, __file__, '--child', '--seeds', str(args.seeds), '--students', str(args.students), '--clubs', str(args.clubs)]
+    output = subprocess.run(command, env=environment, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def main() -> None:
+    """
+    Compare the compiled and interpreted results from the command line.
+    """
+    parser = argparse.ArgumentParser(description='Check that the compiled modules give the same results as the sources.')
+    parser.add_argument('--seeds', type=int, default=DEFAULT_N_SEEDS, help='distributions to compare (default %(default)s)')
+    parser.add_argument('--students', type=int, default=420, help='students in the synthetic school (default %(default)s)')
+    parser.add_argument('--clubs', type=int, default=40, help='clubs in the synthetic school (default %(default)s)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # In a child, run and report back as the last line of output
+    if args.child:
+        start = time.perf_counter()
+        results = run_distributions(SyntheticSpec(n_students=args.students, n_clubs=args.clubs), args.seeds)
+        print(json.dumps({'results': results, 'seconds': time.perf_counter() - start, 'compiled': compiled.loaded_compiled()}))
+        return
+
+    interpreted = _run_child(False, args)
+    compiled_run = _run_child(True, args)
+
+    if not compiled_run['compiled']:
+        print('No compiled modules are built (see tools/build_compiled.py)')
+        sys.exit(2)
+
+    print(f'Compiled modules: {", ".join(compiled_run["compiled"])}')
+    print(f'{"Seed":>4}  {"Interpreted":>28}  {"Compiled":>28}')
+
+    n_different = 0
+    for (seed, (a, b)) in enumerate(zip(interpreted['results'], compiled_run['results'])):
+        flag = '' if a == b else '  DIFFERENT'
+        n_different += (a != b)
+        print(f'{seed:>4}  {a[0]:>10} {a[1]:>17}  {b[0]:>10} {b[1]:>17}{flag}')
+
+    speedup = interpreted['seconds'] / compiled_run['seconds'] if compiled_run['seconds'] else 0.0
+    print(f'Interpreted {interpreted["seconds"]:,.2f} s, compiled {compiled_run["seconds"]:,.2f} s ({speedup:,.2f}x)')
+    print(f'{n_different} of {len(interpreted["results"])} results differ')
+
+    sys.exit(1 if n_different else 0)
+
+if __name__ == '__main__':
+    main()
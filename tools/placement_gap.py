@@ -0,0 +1,89 @@
+"""
+Measure how far the heuristic club placements are from the best possible:
+the repulsion lost by (see placement.lost_repulsion) the search's worlds
+(see worlds.generate_layouts) and the cut's placement (see placement.py),
+against the least any placement can lose, found exactly by branch and bound
+(see placement.place_exactly), for a synthetic school.
+
+Usage: placement_gap.py [--students N] [--clubs N] [--seed N] [--worlds N] [--nodes N]
+
+The exact solver is practical up to about 30 clubs. If it runs out of nodes,
+its best placement is not proven optimal, and gaps are measured against it.
+"""
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import itertools
+import random
+import sys
+import time
+
+# Allow running from the tools directory as well as from the main program
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import placement
+import worlds
+
+try:
+    from tools.synthetic_school import SyntheticSpec, generate_school
+except ImportError:
+    from synthetic_school import SyntheticSpec, generate_school
+
+DEFAULT_N_WORLDS = 100
+
+def _gap(lost: int|None, optimum: int) -> str:
+    """
+    Return the gap between the given repulsion lost (None if nothing was
+    placed) and the optimum, as a percentage of the optimum.
+    """
+    if lost is None:
+        return ''
+    return f'{(lost - optimum) / optimum:+.1%}' if optimum else ('+0.0%' if lost == optimum else 'inf')
+
+def main() -> None:
+    """
+    Compare the heuristic placements to the exact one from the command line.
+    """
+    parser = argparse.ArgumentParser(description='Measure the optimality gap of the heuristic club placements.')
+    parser.add_argument('--students', type=int, default=300, help='students in the synthetic school (default %(default)s)')
+    parser.add_argument('--clubs', type=int, default=30, help='clubs in the synthetic school (default %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic school and the search (default %(default)s)')
+    parser.add_argument('--worlds', type=int, default=DEFAULT_N_WORLDS, help='worlds of the search to take the best of (default %(default)s)')
+    parser.add_argument('--nodes', type=int, default=placement.MAX_NODES, help='nodes the exact solver visits at most (default %(default)s)')
+    args = parser.parse_args()
+
+    school = generate_school(SyntheticSpec(n_students=args.students, n_clubs=args.clubs, seed=args.seed))
+    clubs = list(school.clubs.values())
+    rows = []
+
+    def _time(name: str, place: object) -> object:
+        start = time.perf_counter()
+        result = place()
+        rows.append((name, time.perf_counter() - start))
+        return result
+
+    # Heuristics
+    random.seed(args.seed)
+    searched = _time(f'Search, best of {args.worlds:,} worlds', lambda: [placement.lost_repulsion(clubs, layout) for layout in itertools.islice(worlds.generate_layouts(school, clubs), args.worlds)])
+    greedy = _time('Cut, greedy only', lambda: placement.lost_repulsion(clubs, placement.place_by_cut(school, clubs, 0)))
+    cut = _time('Cut, refined', lambda: placement.lost_repulsion(clubs, placement.place_by_cut(school, clubs)))
+    exact = _time('Exact', lambda: placement.place_exactly(school, clubs, args.nodes))
+
+    # The search can yield no worlds at all (e.g. if its clubs cannot all be placed)
+    losses = [searched[0], min(searched)] if searched else [None, None]
+    losses += [greedy, cut, exact.lost]
+    rows.insert(0, ('Search, first world', None))
+
+    if not searched:
+        print('The search yielded no worlds')
+    print(f'{len(clubs)} clubs, {len(placement.free_instances(clubs))} free instances; '
+          f'exact search visited {exact.n_nodes:,} nodes, '
+          f'{"proven optimal" if exact.proven else "NOT proven optimal"}{"" if exact.feasible else " (no feasible placement)"}')
+    print(f'{"Placement":<32} {"Lost":>8} {"Gap":>8} {"Seconds":>8}')
+    for ((name, seconds), lost) in zip(rows, losses):
+        seconds = f'{seconds:.2f}' if seconds is not None else ''
+        lost_str = f'{lost:,}' if lost is not None else 'none'
+        print(f'{name:<32} {lost_str:>8} {_gap(lost, exact.lost):>8} {seconds:>8}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import csv
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Allow running from the tools directory as well as from the main program
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from school import School
+from world import World
+import club_sandwich
+import worlds
+
+try:
+    from tools.synthetic_school import SyntheticSpec, write_input_csvs
+except ImportError:
+    from synthetic_school import SyntheticSpec, write_input_csvs
+
+# The size the sweeps are centered on (roughly the current school)
+REFERENCE_STUDENTS = 420
+REFERENCE_CLUBS = 40
+
+# Sizes to sweep along each axis; the other axis stays at the reference
+STUDENT_COUNTS = (105, 210, 420, 840, 1680)
+CLUB_COUNTS = (10, 20, 40, 80)
+
+# The size to predict runtime at (a merged campus)
+TARGET_STUDENTS = 2100
+TARGET_CLUBS = 80
+
+# Worlds to generate and distributions to run at each point
+N_WORLDS = 5
+N_DISTRIBUTIONS = 5
+
+# Seed for the random module, so that runs are comparable
+SEED = 0
+
+PATH_SCALING = Path('src/output/benchmarks/scaling.csv')
+
+# The stages timed at each point, and what one operation of each is
+STAGES = (
+    ('prepare_school', 'run'),
+    ('generate_worlds', 'world'),
+    ('distribute', 'distribution'),
+)
+
+class ScalingPoint:
+    """
+    The seconds per operation of each stage at one size.
+    """
+    __slots__ = ('n_students', 'n_clubs', 'seconds')
+
+    n_students: int
+    n_clubs: int
+    seconds: dict[str, float]
+
+    def __init__(self: ScalingPoint, n_students: int, n_clubs: int, seconds: dict[str, float]) -> None:
+        """Initialize this point with the given size and stage timings."""
+        self.n_students = n_students
+        self.n_clubs = n_clubs
+        self.seconds = seconds
+
+    def __repr__(self: ScalingPoint) -> str:
+        """Return a string representation of this point (students x clubs)."""
+        return f'{self.n_students} students x {self.n_clubs} clubs'
+
+def measure_point(n_students: int, n_clubs: int, n_worlds: int=N_WORLDS, n_distributions: int=N_DISTRIBUTIONS) -> ScalingPoint:
+    """
+    Time each stage on a synthetic school of the given size: prepare_school
+    once on input CSVs in a scratch directory, then generating n_worlds
+    worlds, then n_distributions distributions in the first world.
+    """
+    random.seed(SEED)
+    root = Path(tempfile.mkdtemp(prefix='club-sandwich-scaling-'))
+    write_input_csvs(SyntheticSpec(n_students=n_students, n_clubs=n_clubs), root)
+    seconds = {}
+
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        start = time.perf_counter()
+        school = club_sandwich.prepare_school()
+        seconds['prepare_school'] = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    clubs = list(school.clubs.values())
+    students = list(school.students.values())
+
+    # Worlds, resetting instances between them as the main loop does
+    n_generated = 0
+    start = time.perf_counter()
+    for _ in worlds.generate_worlds(school, clubs, n_worlds):
+        n_generated += 1
+        for c in clubs:
+            c.reset_entire_distribution()
+    seconds['generate_worlds'] = (time.perf_counter() - start) / max(1, n_generated)
+
+    # The generator creates one more world before finishing; reset it too
+    for c in clubs:
+        c.reset_entire_distribution()
+
+    # Distributions in the first world (stopping before the next is created)
+    for _ in worlds.generate_worlds(school, clubs, 1):
+        break
+
+    elapsed = 0.0
+    for _ in range(n_distributions):
+        _reset_students(school)
+        start = time.perf_counter()
+        World(school, clubs[:], students[:]).distribute()
+        elapsed += time.perf_counter() - start
+    seconds['distribute'] = elapsed / n_distributions
+
+    return ScalingPoint(n_students, n_clubs, seconds)
+
+def _reset_students(school: School) -> None:
+    """
+    Reset the distribution of students (but not of club instances).
+    """
+    for s in school.students.values():
+        s.reset_distribution()
+    for c in school.clubs.values():
+        c.reset_student_distribution()
+
+def fit_exponent(sizes: list[int], seconds: list[float]) -> float:
+    """
+    Return the empirical complexity exponent k such that seconds grow
+    roughly as size ** k, by least squares on the log-log points.
+    """
+    points = [(math.log(n), math.log(t)) for (n, t) in zip(sizes, seconds) if t > 0]
+    if len(points) < 2:
+        return 0.0
+
+    mean_x = sum(x for (x, _) in points) / len(points)
+    mean_y = sum(y for (_, y) in points) / len(points)
+    numerator = sum((x - mean_x) * (y - mean_y) for (x, y) in points)
+    denominator = sum((x - mean_x) ** 2 for (x, _) in points)
+    return numerator / denominator if denominator else 0.0
+
+class ScalingStudy:
+    """
+    The results of sweeping student and club counts around a reference size:
+    the points measured along each axis, and for each stage the fitted
+    exponents, so that runtime can be predicted as
+
+        t(s, c) = t(s0, c0) * (s / s0) ** k_students * (c / c0) ** k_clubs
+
+    Each exponent is fitted with the other axis held at the reference, so
+    interactions between the two axes are not captured.
+
+    The number of days stays at the default week (see week.py) throughout.
+    """
+    __slots__ = ('reference', 'student_points', 'club_points', 'exponents')
+
+    reference: ScalingPoint
+    student_points: list[ScalingPoint]
+    club_points: list[ScalingPoint]
+    exponents: dict[str, tuple[float, float]]
+
+    def __init__(self: ScalingStudy, student_points: list[ScalingPoint], club_points: list[ScalingPoint]) -> None:
+        """
+        Initialize this study with the given sweeps, which must both include
+        the reference size, and fit the exponents for each stage.
+        """
+        self.student_points = student_points
+        self.club_points = club_points
+        self.reference = next(p for p in student_points if p.n_students == REFERENCE_STUDENTS)
+
+        self.exponents = {}
+        for (stage, _) in STAGES:
+            k_students = fit_exponent([p.n_students for p in student_points], [p.seconds[stage] for p in student_points])
+            k_clubs = fit_exponent([p.n_clubs for p in club_points], [p.seconds[stage] for p in club_points])
+            self.exponents[stage] = (k_students, k_clubs)
+
+    def predict(self: ScalingStudy, stage: str, n_students: int, n_clubs: int) -> float:
+        """
+        Return the predicted seconds per operation of the given stage at the given size.
+        """
+        k_students, k_clubs = self.exponents[stage]
+        scale = ((n_students / self.reference.n_students) ** k_students) * ((n_clubs / self.reference.n_clubs) ** k_clubs)
+        return self.reference.seconds[stage] * scale
+
+    def predict_run(self: ScalingStudy, n_students: int, n_clubs: int) -> float:
+        """
+        Return the predicted seconds for a whole run at the given size, with
+        the numbers of worlds and configurations set in club_sandwich.
+        """
+        n_worlds = club_sandwich.N_WORLDS_TO_TEST
+        n_configurations = club_sandwich.N_STUDENT_CONFIGURATIONS_PER_WORLD
+        return sum((
+            self.predict('prepare_school', n_students, n_clubs),
+            self.predict('generate_worlds', n_students, n_clubs) * n_worlds,
+            self.predict('distribute', n_students, n_clubs) * n_worlds * n_configurations
+        ))
+
+    def rows(self: ScalingStudy, n_students: int, n_clubs: int) -> list[list[object]]:
+        """
+        Return rows of (stage, unit, exponents, seconds per operation at the
+        reference and predicted at the given size) for every stage.
+        """
+        rows = []
+        for (stage, unit) in STAGES:
+            k_students, k_clubs = self.exponents[stage]
+            rows.append([stage, unit, k_students, k_clubs, self.reference.seconds[stage], self.predict(stage, n_students, n_clubs)])
+        return rows
+
+    def format_table(self: ScalingStudy, n_students: int, n_clubs: int) -> str:
+        """
+        Return a string of the measured points and the predictions at the
+        given size, formatted as tables.
+        """
+        lines = [f'{"Students":>9} {"Clubs":>6}' + ''.join(f' {stage + " ms":>20}' for (stage, _) in STAGES)]
+        lines.append('=' * (16 + 21 * len(STAGES)))
+        for point in self.student_points + [p for p in self.club_points if p is not self.reference and p.n_clubs != REFERENCE_CLUBS]:
+            lines.append(f'{point.n_students:>9} {point.n_clubs:>6}' + ''.join(f' {point.seconds[stage] * 1000:>20.2f}' for (stage, _) in STAGES))
+
+        lines.append('')
+        lines.append(f'Predictions at {n_students} students x {n_clubs} clubs (from {self.reference}):')
+        lines.append(f'{"Stage":<16} {"Per":<13} {"k students":>10} {"k clubs":>8} {"Now ms":>12} {"Predicted ms":>14}')
+        lines.append('=' * 78)
+        for (stage, unit, k_students, k_clubs, now, predicted) in self.rows(n_students, n_clubs):
+            lines.append(f'{stage:<16} {unit:<13} {k_students:>10.2f} {k_clubs:>8.2f} {now * 1000:>12.2f} {predicted * 1000:>14.2f}')
+
+        n_worlds = club_sandwich.N_WORLDS_TO_TEST
+        n_configurations = club_sandwich.N_STUDENT_CONFIGURATIONS_PER_WORLD
+        lines.append('')
+        lines.append(f'A run of {n_worlds:,} world(s) x {n_configurations:,} configurations: '
+                     f'{self.predict_run(self.reference.n_students, self.reference.n_clubs):,.1f} seconds now, '
+                     f'{self.predict_run(n_students, n_clubs):,.1f} seconds predicted')
+
+        return '\n'.join(lines)
+
+def save_study(study: ScalingStudy, n_students: int, n_clubs: int, path: Path=PATH_SCALING) -> None:
+    """
+    Save the measured points and the predictions at the given size as a CSV.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Students', 'Clubs'] + [f'{stage} seconds' for (stage, _) in STAGES])
+        for point in study.student_points + study.club_points:
+            writer.writerow([point.n_students, point.n_clubs] + [point.seconds[stage] for (stage, _) in STAGES])
+
+        writer.writerow([])
+        writer.writerow(['Stage', 'Per', 'Exponent (students)', 'Exponent (clubs)', 'Seconds now', f'Seconds at {n_students} x {n_clubs}'])
+        writer.writerows(study.rows(n_students, n_clubs))
+
+def run_study(student_counts: tuple[int]=STUDENT_COUNTS, club_counts: tuple[int]=CLUB_COUNTS,
+              target_students: int=TARGET_STUDENTS, target_clubs: int=TARGET_CLUBS) -> ScalingStudy:
+    """
+    Sweep student counts (at the reference club count) and club counts (at
+    the reference student count), print the measurements and predictions
+    at the target size, save them, and return the study.
+    """
+    points = {}
+
+    def measure(n_students: int, n_clubs: int) -> ScalingPoint:
+        if (n_students, n_clubs) not in points:
+            print(f'Measuring {n_students} students x {n_clubs} clubs...')
+            points[(n_students, n_clubs)] = measure_point(n_students, n_clubs)
+        return points[(n_students, n_clubs)]
+
+    student_points = [measure(n, REFERENCE_CLUBS) for n in sorted(set(student_counts).union({REFERENCE_STUDENTS}))]
+    club_points = [measure(REFERENCE_STUDENTS, n) for n in sorted(set(club_counts).union({REFERENCE_CLUBS}))]
+    study = ScalingStudy(student_points, club_points)
+
+    print()
+    print(study.format_table(target_students, target_clubs))
+    save_study(study, target_students, target_clubs)
+    return study
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure how runtime grows with students and clubs.')
+    parser.add_argument('--students', type=int, nargs='+', default=STUDENT_COUNTS, help='student counts to sweep')
+    parser.add_argument('--clubs', type=int, nargs='+', default=CLUB_COUNTS, help='club counts to sweep')
+    parser.add_argument('--target-students', type=int, default=TARGET_STUDENTS, help='student count to predict at')
+    parser.add_argument('--target-clubs', type=int, default=TARGET_CLUBS, help='club count to predict at')
+    args = parser.parse_args()
+
+    run_study(tuple(args.students), tuple(args.clubs), args.target_students, args.target_clubs)
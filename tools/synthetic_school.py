@@ -0,0 +1,298 @@
+from __future__ import annotations
+from collections import Counter
+from pathlib import Path
+import csv
+import math
+import random
+import sys
+
+# Allow running from the tools directory as well as from the main program
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from school import School
+import parse
+import week
+
+GRADES = (9, 10, 11, 12)
+GENDERS = ('M', 'F', 'O')
+GENDER_WEIGHTS = (48, 48, 4)
+
+# Ratio of students who leave the survey blank, and who list Study Hall
+P_NO_SURVEY = 0.08
+P_CHOOSES_STUDY_HALL = 0.05
+
+# Ratio of students with unavailable days (e.g. co-op), and of those, with 2
+P_UNAVAILABLE = 0.06
+P_UNAVAILABLE_TWICE = 0.3
+
+class SyntheticSpec:
+    """
+    Specifies the shape of a synthetic school for benchmarking.
+
+    Club popularity follows a Zipf-like law: the club ranked k is chosen
+    with weight 1 / k ** zipf_exponent. A few students leave the survey
+    blank, and a few are unavailable on one or two days; unavailable days are
+    skewed towards the end of the week (as with co-op placements).
+
+    Teachers are shared between clubs when there are fewer than clubs.
+    Splits divide a club by grade (juniors and seniors); preselects place
+    students into a closed three-day club (like Choir; every day, in shorter
+    weeks); exclusions are drawn between random pairs of clubs.
+
+    Every school generated has a layout: a teacher needs a day for each club
+    (and each branch of a split club) they run, so a split club's teacher and
+    Choir's teacher are never shared, and clubs whose teacher needs more than
+    one day run on any day, one day a group. A spec with too few teachers or
+    days for that is rejected (see generate_rows).
+
+    The week has the given day letters (by default, the usual three days).
+    """
+    __slots__ = ('n_students', 'n_clubs', 'n_teachers', 'n_splits', 'n_preselects', 'n_exclusions', 'zipf_exponent', 'day_letters', 'seed')
+
+    n_students: int
+    n_clubs: int
+    n_teachers: int
+    n_splits: int
+    n_preselects: int
+    n_exclusions: int
+    zipf_exponent: float
+    day_letters: tuple[str]
+    seed: int
+
+    def __init__(self: SyntheticSpec, n_students: int=420, n_clubs: int=40, n_teachers: int|None=None,
+                 n_splits: int=2, n_preselects: int|None=None, n_exclusions: int=2,
+                 zipf_exponent: float=0.8, day_letters: tuple[str]=week.DEFAULT_DAY_LETTERS, seed: int=0) -> None:
+        """
+        Initialize this spec with the given sizes. By default, there are
+        90% as many teachers as clubs and 5% of students are preselected.
+        """
+        self.n_students = n_students
+        self.n_clubs = n_clubs
+        self.n_teachers = n_teachers if n_teachers is not None else max(1, (n_clubs * 9) // 10)
+        self.n_splits = n_splits
+        self.n_preselects = n_preselects if n_preselects is not None else n_students // 20
+        self.n_exclusions = n_exclusions
+        self.zipf_exponent = zipf_exponent
+        self.day_letters = tuple(day_letters)
+        self.seed = seed
+
+    def __repr__(self: SyntheticSpec) -> str:
+        """
+        Return a string representation of this spec (students x clubs).
+        """
+        n_days = len(self.day_letters)
+        suffix = f' x {n_days} days' if n_days != len(week.DEFAULT_DAY_LETTERS) else ''
+        return f'{self.n_students} students x {self.n_clubs} clubs{suffix}'
+
+def generate_rows(spec: SyntheticSpec) -> dict[str, list[list[object]]]:
+    """
+    Return a dictionary mapping input file names to their rows (headers
+    included), in the formats specified in _input_specifications.csv.
+    The same spec always produces the same rows. Raise ValueError if some
+    teacher would need more days than the week has (see SyntheticSpec).
+    """
+    rng = random.Random(spec.seed)
+    day_letters = list(spec.day_letters)
+    n_days = len(day_letters)
+
+    codes = [f'Club {i + 1:03}' for i in range(spec.n_clubs)]
+    weights = [1 / ((rank + 1) ** spec.zipf_exponent) for rank in range(spec.n_clubs)]
+
+    # Teachers: one per club, then shared by the clubs left over, but not
+    # with split clubs, whose branches already take a day each
+    n_own = min(spec.n_teachers, spec.n_clubs)
+    shareable = list(range(min(spec.n_splits, n_own), n_own)) or list(range(n_own))
+    teachers = [rank if rank < n_own else shareable[(rank - n_own) % len(shareable)] for rank in range(spec.n_clubs)]
+    teacher_days = Counter()
+    for (rank, teacher) in enumerate(teachers):
+        teacher_days[teacher] += 2 if rank < spec.n_splits else 1
+    if max(teacher_days.values(), default=0) > n_days:
+        raise ValueError(f'{spec} needs more teachers or days for every club to run')
+
+    # Clubs
+
+    clubs = [['Club', 'Teacher', *day_letters, 'Lower', 'Upper', 'Days per group', 'Number of groups', 'Minimum groups', 'Maximum groups', 'Maximum groups per day', 'Grades', 'Genders', 'Closed', 'Notes']]
+    expected_votes = spec.n_students * 5 / sum(weights)
+
+    for (rank, code) in enumerate(codes):
+        teacher = f'Teacher {teachers[rank] + 1:03}'
+        upper = rng.choice((16, 20, 24, 30))
+
+        # Some clubs only run on certain days, and a few need two days a
+        # week, unless their teacher needs other days as well
+        days = [''] * n_days
+        days_per = 1
+        if teacher_days[teachers[rank]] == 1:
+            if rng.random() < 0.15:
+                days[rng.randrange(n_days)] = '1'
+            if rng.random() < 0.1:
+                days = ['1'] * n_days
+                days[rng.randrange(n_days)] = ''
+            if (days.count('1') or n_days) >= 2 and rng.random() < 0.08:
+                days_per = 2
+
+        # Popular clubs may run several groups
+        n_days_allowed = days.count('1') or n_days
+        popularity = expected_votes * weights[rank]
+        max_groups = max(1, min(n_days_allowed // days_per, math.ceil(popularity / 2 / upper)))
+
+        clubs.append([code, teacher, *days, 4, upper, days_per, '', 1, max_groups, 1, '', '', '', ''])
+
+    # A closed three-day club for preselected students, and enough Study
+    # Halls for everyone (leftovers are placed there until they fit)
+    n_study_halls_per_day = math.ceil(spec.n_students / 25)
+    clubs.append(['Choir', 'Choir Teacher', *(['1'] * n_days), 1, max(40, spec.n_preselects), min(3, n_days), 1, '', '', '', '', '', '1', ''])
+    clubs.append(['Study Hall', '', *(['1'] * n_days), 0, 25, 1, '', 1, n_days * n_study_halls_per_day, n_study_halls_per_day, '', '', '', ''])
+
+    # Students
+
+    surveys = [['Date', 'Student', 'Grade', '1', '2', '3', '4', '5', 'Notes']]
+    linkups = [['ID', 'Last name', 'First name', 'Middle name', 'Grade', 'Gender', 'Survey name', 'Exclude', 'Days unavailable', 'Notes']]
+    students = []
+
+    for i in range(spec.n_students):
+        first, last = f'First{i}', f'Last{i}'
+        grade = rng.choice(GRADES)
+        gender = rng.choices(GENDERS, GENDER_WEIGHTS)[0]
+
+        unavailable = []
+        if rng.random() < P_UNAVAILABLE:
+            unavailable = [day_letters[-1]] if rng.random() < 0.6 else [rng.choice(day_letters)]
+            if rng.random() < P_UNAVAILABLE_TWICE:
+                unavailable = sorted(set(unavailable).union({rng.choice(day_letters)}), key=day_letters.index)
+
+        survey_name = ''
+        if rng.random() >= P_NO_SURVEY:
+            survey_name = f'{first} {last}'
+            choices = []
+            while len(choices) < 5:
+                code = rng.choices(codes, weights)[0]
+                if code not in choices:
+                    choices.append(code)
+            if rng.random() < P_CHOOSES_STUDY_HALL:
+                choices[rng.randrange(2, 5)] = 'Study Hall'
+            surveys.append(['', survey_name, grade, *choices, ''])
+
+        linkups.append([i, last, first, '', grade, gender, survey_name, '', ';'.join(unavailable), ''])
+        students.append((f'{first} {last}' if not survey_name else survey_name, grade, gender))
+
+    # Preselects
+
+    preselects = [['Student', 'Grade', 'Gender', 'Club', 'Number of groups', 'Specific days', 'Specific not days', 'Force']]
+    available = [student for (student, days) in zip(students, linkups[1:]) if not days[8]]
+    for (name, grade, gender) in rng.sample(available, min(spec.n_preselects, len(available))):
+        preselects.append([name, grade, gender, 'Choir', '', '', '', ''])
+
+    # Splits (by grade, on clubs popular enough to be worth splitting)
+
+    splits = [['Club', 'Branch name', 'Force separate days?', 'Students can be in both', 'New days', 'New days per group', 'New number of groups', 'New minimum groups', 'New maximum groups', 'New maximum groups per day', 'Randomize if no match', 'Grade rule', 'Gender rule', 'Students']]
+    for code in codes[:spec.n_splits]:
+        separate = '1' if rng.random() < 0.5 else ''
+        splits.append([code, f'{code} Junior', separate, '', '', '', '', '', '', '', '', '9;10', '', ''])
+        splits.append([code, f'{code} Senior', separate, '', '', '', '', '', '', '', '', '11;12', '', ''])
+
+    # Exclusions (between popular clubs, which are sure to run)
+
+    exclusions = [['Club A', 'Club B']]
+    popular = codes[spec.n_splits:spec.n_splits + 6]
+    for _ in range(min(spec.n_exclusions, len(popular) // 2)):
+        a, b = rng.sample(popular, 2)
+        exclusions.append([a, b])
+
+    return {
+        'clubs.csv': clubs,
+        'students_surveys.csv': surveys,
+        'students_linkups.csv': linkups,
+        'preselects.csv': preselects,
+        'splits.csv': splits,
+        'exclusions.csv': exclusions
+    }
+
+def write_input_csvs(spec: SyntheticSpec, root: Path) -> None:
+    """
+    Write the input CSVs for the given spec under root, in the same layout
+    as the real program (root/src/input/), so that prepare_school can run
+    on them after changing the working directory to root.
+    """
+    rows = generate_rows(spec)
+
+    for (filename, file_rows) in rows.items():
+        path = root / parse.PATH_INPUT_SPECS.parent / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerows(file_rows)
+
+def generate_school(spec: SyntheticSpec) -> School:
+    """
+    Return a school built directly from the rows for the given spec,
+    without touching the file system, and prepared as in prepare_school
+    (minus saving vote CSVs): filtered, tallied, with proportions and
+    repulsions calculated.
+    """
+    rows = generate_rows(spec)
+    week.set_days(spec.day_letters)
+    school = School()
+
+    # Splits first, since clubs and choices depend on them
+    for row in rows['splits.csv'][1:]:
+        main, new, separate, _, _, _, _, _, _, _, _, grades, _, _ = row
+        school.add_split(main, new, bool(separate), None, True, False, None, None, None, None, None, set(int(g) for g in grades.split(';')), set(), set())
+
+    # Students: survey choices by name, resolving splits by grade and gender
+    choices_by_name = {row[1]: row[3:8] for row in rows['students_surveys.csv'][1:]}
+    for row in rows['students_linkups.csv'][1:]:
+        _, last, first, _, grade, gender, key, _, unavailable, _ = row
+        name = key if key else f'{first} {last}'
+
+        choices = []
+        for code in choices_by_name.get(key, []):
+            for split_code in school.get_matching_split_codes(code, name, grade, gender):
+                if len(choices) < 5:
+                    choices.append(split_code)
+
+        days_unavailable = week.mask_of_letters(unavailable)
+        school.register_student(name, grade, gender, choices, days_unavailable)
+
+    # Clubs, with their meta (copied to each split branch)
+    for row in rows['clubs.csv'][1:]:
+        code, teacher = row[:2]
+        lower, upper, days_per, decided, min_groups, max_groups, max_per_day, _, _, closed, _ = row[2 + week.N_DAYS:]
+        days = week.mask_of(i for (i, flag) in enumerate(row[2:2 + week.N_DAYS]) if flag) or week.ALL_DAYS
+
+        # Blank values default as in parse_clubs
+        decided = int(decided) if decided != '' else None
+        min_groups, max_groups, days_per, max_per_day = (int(c) if c != '' else 1 for c in (min_groups, max_groups, days_per, max_per_day))
+        teacher = school.register_teacher(teacher) if teacher else None
+
+        for (split_code, split_data) in school.get_all_split_codes(code).items():
+            club = school.register_club(split_code)
+            club.set_meta(teacher, days, min_groups, max_groups, days_per, max_per_day, decided, lower, upper, [], [], bool(closed))
+            if split_data and split_data['mutually exclusive']:
+                school.add_exclusion(code, split_code)
+
+    for row in rows['preselects.csv'][1:]:
+        name, grade, gender, code, *_ = row
+        school.add_preselect(name, code, 1, 0, 0)
+
+    for (a, b) in rows['exclusions.csv'][1:]:
+        school.add_exclusion(a, b)
+
+    # As in prepare_school
+    school.calculate_proportions()
+    school.tally_votes()
+    school.remove_students_who_arent_eligible()
+    school.remove_clubs_that_cannot_run()
+    school.tally_votes()
+    school.assign_ids()
+    school.calculate_repulsions()
+
+    return school
+
+if __name__ == '__main__':
+    # Write a default synthetic school under the given (scratch) directory
+    if len(sys.argv) != 2:
+        print('Usage: synthetic_school.py <output root>')
+    else:
+        write_input_csvs(SyntheticSpec(), Path(sys.argv[1]))
@@ -0,0 +1,65 @@
+from __future__ import annotations
+import json
+import os
+import threading
+
+class Tracer:
+    """
+    Records a timeline of a run as Chrome trace events, which can be opened
+    locally in a trace viewer (chrome://tracing, Perfetto, or speedscope).
+
+    Each span is a "complete" event with a start and a duration. Timestamps
+    are taken from perf_counter, which is monotonic and shared by processes on
+    the same machine, so events recorded by worker processes can be merged
+    into one timeline. Every event carries the process and thread that
+    recorded it, so the viewer shows one row per worker.
+
+    Spans are normally recorded through the instrumentation's phases; see
+    Instrumentation.tracer.
+    """
+    __slots__ = ('events',)
+
+    events: list[dict[str, object]]
+
+    def __init__(self: Tracer) -> None:
+        """Initialize this tracer with no events."""
+        self.events = []
+
+    def complete(self: Tracer, name: str, start: float, end: float, args: dict[str, object]|None=None) -> None:
+        """
+        Record a span with the given name between the given start and end
+        (in perf_counter seconds), along with optional arguments to display.
+        """
+        event = {
+            'name': name,
+            'cat': name.split(':')[0],
+            'ph': 'X',
+            'ts': start * 1_000_000,
+            'dur': (end - start) * 1_000_000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident()
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def name_thread(self: Tracer, process_name: str, thread_name: str) -> None:
+        """
+        Label the current process and thread in the viewer.
+        """
+        pid = os.getpid()
+        tid = threading.get_ident()
+        self.events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': process_name}})
+        self.events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread_name}})
+
+    def extend(self: Tracer, events: list[dict[str, object]]) -> None:
+        """
+        Add events recorded elsewhere (e.g. by a worker process).
+        """
+        self.events.extend(events)
+
+    def to_json(self: Tracer) -> str:
+        """
+        Return the events as a JSON string in the trace event format.
+        """
+        return json.dumps({'traceEvents': self.events, 'displayTimeUnit': 'ms'})
@@ -0,0 +1,86 @@
+"""
+The days of the club week, and sets of them as integer bitmasks.
+
+Day i (zero-indexed, in the order of the club file's day columns) is bit
+1 << i, so a set of days is an int: unions, intersections and differences
+are |, & and & ~, and the number of days in a set is a table lookup.
+
+Tables are precomputed for every set of the week's days (there are only
+2 ** N_DAYS of them): the days in each set, its size, and its subsets of
+each size. They are rebuilt by set_days, which parsing calls with the day
+letters from the club file before any clubs or students are created.
+"""
+from __future__ import annotations
+from typing import Iterable
+
+# The default week (Tuesday, Wednesday, Thursday)
+DEFAULT_DAY_LETTERS = ('T', 'W', 'R')
+
+DAY_LETTERS: tuple[str]
+DAY_TO_INT: dict[str, int]
+N_DAYS: int
+
+# The set of all days
+ALL_DAYS: int
+
+# Indexed by set: the days in it (ascending), and how many there are
+DAYS_IN: tuple[tuple[int]]
+N_DAYS_IN: tuple[int]
+
+# Indexed by set, then by size: the subsets of that size (ascending)
+SUBSETS: tuple[tuple[tuple[int]]]
+
+def set_days(letters: Iterable[str]) -> None:
+    """
+    Set the days of the week to the given day letters, in order,
+    and rebuild the tables.
+    """
+    global DAY_LETTERS, DAY_TO_INT, N_DAYS, ALL_DAYS, DAYS_IN, N_DAYS_IN, SUBSETS
+
+    DAY_LETTERS = tuple(letters)
+    DAY_TO_INT = {letter: i for (i, letter) in enumerate(DAY_LETTERS)}
+    N_DAYS = len(DAY_LETTERS)
+    ALL_DAYS = (1 << N_DAYS) - 1
+
+    DAYS_IN = tuple(tuple(day for day in range(N_DAYS) if mask & (1 << day)) for mask in range(ALL_DAYS + 1))
+    N_DAYS_IN = tuple(len(days) for days in DAYS_IN)
+
+    # Every subset of a set is a submask; enumerate them by size
+    subsets = []
+    for mask in range(ALL_DAYS + 1):
+        by_size = [[] for _ in range(N_DAYS + 1)]
+        for sub in range(mask + 1):
+            if sub & mask == sub:
+                by_size[N_DAYS_IN[sub]].append(sub)
+        subsets.append(tuple(tuple(s) for s in by_size))
+    SUBSETS = tuple(subsets)
+
+def mask_of(days: Iterable[int]) -> int:
+    """
+    Return the set (as a bitmask) of the given day indices.
+    """
+    mask = 0
+    for day in days:
+        mask |= 1 << day
+    return mask
+
+def mask_of_letters(letters: str) -> int:
+    """
+    Return the set (as a bitmask) of the given semicolon-separated day letters,
+    e.g. 'T;R'. An empty string is the empty set.
+    """
+    return mask_of(DAY_TO_INT[letter.strip()] for letter in letters.split(';')) if letters else 0
+
+def subsets_of(mask: int, k: int) -> tuple[int]:
+    """
+    Return the subsets of size k of the given set, or none if k is too large.
+    """
+    return SUBSETS[mask][k] if k <= N_DAYS else ()
+
+def letters_of(mask: int, separator: str='/') -> str:
+    """
+    Return the day letters of the given set, joined by the separator, e.g. 'T/R'.
+    """
+    return separator.join(DAY_LETTERS[day] for day in DAYS_IN[mask])
+
+set_days(DEFAULT_DAY_LETTERS)
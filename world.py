@@ -2,8 +2,11 @@ from __future__ import annotations
 import random
 
 from report import Report
+from draft import Draft, ORDER_POLICIES, DEFAULT_ORDER_POLICY
 from club import Club
 from student import Student
+from instrumentation import INSTRUMENTATION
+import week
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -15,36 +18,48 @@ class World:
     Also keeps a report of the state of the distribution. This is because
     the clubs and students in it are not stable and can be reset later.
     """
-    __slots__ = ['school', 'clubs', 'students', 'report']
+    __slots__ = ['school', 'clubs', 'students', 'report', 'order_policy']
 
     school: School
     clubs: list[Club]
     students: list[Student]
     report: Report
+    order_policy: str
     
-    def __init__(self: World, school: School, clubs: list[Club], students: list[Student]) -> None:
+    def __init__(self: World, school: School, clubs: list[Club], students: list[Student], order_policy: str=DEFAULT_ORDER_POLICY) -> None:
         """
         Initialize this world with the given school, clubs, and students,
-        and a blank report.
+        and a blank report. Students take turns at their choices in the order
+        given by the named policy (see draft.py).
         """
         self.school = school
         self.clubs = clubs
         self.students = students
         self.report = Report(self.clubs, self.students)
+        self.order_policy = order_policy
     
     def distribute(self: World) -> None:
         """
         Distribute the students into their preselected and chosen clubs.
         Fill leftover spots, balance club instances, and save the report.
         """
-        self.distribute_preselects()
-        self.distribute_choices()
-        self.distribute_leftovers()
+        INSTRUMENTATION.begin_world()
 
-        for club in self.clubs:
-            club.balance_instances_on_same_day()
+        with INSTRUMENTATION.phase('distribute preselects'):
+            self.distribute_preselects()
+        with INSTRUMENTATION.phase('distribute choices'):
+            self.distribute_choices()
+        with INSTRUMENTATION.phase('distribute leftovers'):
+            self.distribute_leftovers()
+
+        with INSTRUMENTATION.phase('balance instances'):
+            for club in self.clubs:
+                club.balance_instances_on_same_day()
+
+        with INSTRUMENTATION.phase('populate report'):
+            self.report.populate_world_distribution(self.school, self.clubs, self.students)
 
-        self.report.populate_world_distribution(self.school, self.clubs, self.students)
+        INSTRUMENTATION.end_world()
 
     def distribute_preselects(self: Report) -> None:
         """
@@ -71,8 +86,8 @@ class World:
         Distribute students into clubs by giving them their choices.
         Start in a random order (TODO improvable?) and give them a choice --
         if not their 1st, their 2nd, and so on, until they get one that round.
-        For each remaining round, sort them according to who has gotten
-        the fewest choices so far.
+        For each remaining round, order them by this world's order policy:
+        by default, according to who has gotten the fewest choices so far.
         """
         random.shuffle(self.students)
 
@@ -80,7 +95,9 @@ class World:
         # self.students.sort(key=lambda s: s.reactivity)
         # self.students.sort(key=lambda s: len(s.free_days()))
 
-        successes = {s.name: [] for s in self.students}
+        draft = Draft(len(self.school.student_list))
+        order = ORDER_POLICIES[self.order_policy]
+        clubs = self.school.club_list
 
         # Maximum of 5 choices = 5 rounds
         for _ in range(5):
@@ -88,25 +105,21 @@ class World:
 
                 # Continually try to give them their next highest choice
                 # until they either get one or run out of choices
-                club_code = s.get_next_choice()
+                club_id = s.get_next_choice()
                 success = False
-                while not success and club_code is not None:
-                    club = self.school.clubs.get(club_code)
+                while not success and club_id is not None:
+                    club = clubs[club_id]
 
-                    # Try to add them; add success or failure to the sort order
+                    # Try to add them; record success or failure for the order
                     success = club.add_student(s)
-                    successes[s.name].append(success)
+                    draft.record(s.id, success)
 
                     # If failed, try the next highest choice until we run out
                     if not success:
-                        club_code = s.get_next_choice()
+                        club_id = s.get_next_choice()
 
-            # For fairness, alternate direction
-            self.students.reverse()
-            self.students.sort(key=lambda s: successes[s.name])
-
-            # This sort order is not as good
-            # self.students.sort(key=lambda s: s.choices_gotten_score)
+            # For fairness, those who fared worst go next (see draft.py)
+            self.students = order(self.students, draft)
 
     def distribute_leftovers(self: Report) -> None:
         """
@@ -114,9 +127,9 @@ class World:
         in Study Halls.
         """
 
+        club = self.school.clubs['Study Hall']
         for student in self.students:
             while student.free_days():
-                club = self.school.clubs['Study Hall']
                 club.add_student(student)
 
     def score(self: World) -> int:
@@ -131,8 +144,10 @@ class World:
         Validate this world's clubs. Return a tuple of (validity, message).
         The message indicates the first validity test that failed.
         """
+        students = self.school.student_list
+
         for club in self.clubs:
-            instances = self.report.clubs[club.code]
+            instances = self.report.clubs[club.id]
 
             if len(instances) > club.max_instances:
                 return False, 'Club with more than max instances'
@@ -143,12 +158,12 @@ class World:
             if (club.decided_instances is not None) and (len(instances) != club.decided_instances):
                 return False, 'Club with fewer or more than decided instances'
 
-            for (instance_key, data) in instances.items():
+            for data in instances:
                 
-                if len(data['days']) != club.days_per_instance:
+                if week.N_DAYS_IN[data['days']] != club.days_per_instance:
                     return False, 'Club with wrong days per instance'
 
-                if data['days'].difference(club.pre_days):
+                if data['days'] & ~club.pre_days:
                     return False, 'Club with instances on impossible days'
 
                 if (club.decided_instances is None) and (len(data['students']) < club.lower):
@@ -158,32 +173,32 @@ class World:
                     return False, 'Club with too many students'
                 
                 if club.genders:
-                    for student_name in data['students']:
-                        if self.school.students[student_name].gender not in club.genders:
+                    for student_id in data['students']:
+                        if students[student_id].gender not in club.genders:
                             return False, 'Club with students of the wrong gender'     
 
                 if club.grades:                    
-                    for student_name in data['students']:
-                        if self.school.students[student_name].grade not in club.grades:
+                    for student_id in data['students']:
+                        if students[student_id].grade not in club.grades:
                             return False, 'Club with students of the wrong grade'
 
                 if club.whitelist:                    
-                    for student_name in data['students']:
-                        if student_name not in club.whitelist:
+                    for student_id in data['students']:
+                        if students[student_id].name not in club.whitelist:
                             return False, 'Club with students not on the whitelist'
 
                 if club.blacklist:                    
-                    for student_name in data['students']:
-                        if student_name not in club.blacklist:
+                    for student_id in data['students']:
+                        if students[student_id].name in club.blacklist:
                             return False, 'Club with students on the blacklist'
 
                 if club.excluded_students:                    
-                    for student_name in data['students']:
-                        if student_name in club.exclusions:
+                    for student_id in data['students']:
+                        if student_id in club.excluded_students:
                             return False, 'Club with students excluded for having been in other clubs'
 
                 if club.closed:
-                    preselected = self.school.get_preselected_students(club)
+                    preselected = set(self.school.students[name].id for name in self.school.get_preselected_students(club))
                     if data['students'].difference(preselected):
                         return False, 'Closed club with non-preselected students'
         
@@ -194,9 +209,12 @@ class World:
         Validate this world's students. Return a tuple of (validity, message).
         The message indicates the first validity test that failed.
         """
+        study_hall = self.school.clubs['Study Hall'].id
+
         for student in self.students:
-            for (day, club_code) in self.report.students[student.name]['days'].items():
-                if club_code not in set(student.choices.values()).union(student.pres.keys()).union({'Study Hall'}):
+            allowed = set(student.choice_ids.values()).union(student.pre_ids).union({study_hall})
+            for club_id in self.report.students[student.id]['days']:
+                if club_id is not None and club_id not in allowed:
                     return False, 'Student in a club they did not pick nor were preselected nor was Study Hall'
 
         return True, 'Valid'   
@@ -207,20 +225,20 @@ class World:
         The message indicates the first validity test that failed.
         """
         for (student_name, preselects) in self.school.preselects.items():
-            days = self.report.students[student_name]['days']
+            days = self.report.students[self.school.students[student_name].id]['days']
 
             for (club_code, n_times, forced_days, forced_nondays, force) in preselects:
                 club = self.school.clubs[club_code]
                 
-                if list(days.values()).count(club_code) < (n_times * club.days_per_instance):
+                if days.count(club.id) < (n_times * club.days_per_instance):
                     return False, 'Student not in preselected club enough times'
 
-                for day in forced_days:
-                    if days[day] != club_code:
+                for day in week.DAYS_IN[forced_days]:
+                    if days[day] != club.id:
                         return False, 'Student in preselcted club on a day that was not a forced day'
                 
-                for day in forced_nondays:
-                    if days[day] == club_code:
+                for day in week.DAYS_IN[forced_nondays]:
+                    if days[day] == club.id:
                         return False, 'Student in preselcted club on a forced nonday'
 
         return True, 'Valid'
@@ -242,4 +260,4 @@ class World:
         """
         Return a string representation of this world (its score).
         """
-        return f'{self.score}'
+        return f'{self.report.score}'
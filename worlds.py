@@ -1,16 +1,27 @@
+from __future__ import annotations
 from typing import Iterator
-import random
 import itertools
+import math
+import random
 
 from club import Club
 from school import School
+from instrumentation import INSTRUMENTATION
+import week
 
 # Factor to divide repulsion by for "fuzziness"
 REPULSION_SMOOTHING = 1
 
+# How many worlds to count at most when describing the search space
+SEARCH_SPACE_COUNT_LIMIT = 1_000
+
+# Repulsion at or below which two clubs are not linked in the co-choice graph
+# (see co_choice_components); above 0, weakly linked clubs are searched apart
+COMPONENT_LINK_THRESHOLD = 0
+
 # Helper functions
 
-def _filter_split_days(school: School, club: Club, days: set[int], club_to_days_used: dict[str, list[int]]) -> set[int]:
+def _filter_split_days(school: School, club: Club, days: int, club_to_days_used: dict[str, list[int]]) -> int:
     """
     Return the given set of days, minus any days taken by other branches,
     if the club is split and this branch requires separate days.
@@ -23,9 +34,14 @@ def _filter_split_days(school: School, club: Club, days: set[int], club_to_days_
     for (other_code, force_separate_days) in school.splits_to_separate_days[club.code].items():
         peer_codes = set(school.get_all_split_codes(other_code)).difference({club.code})
         for peer_code in peer_codes:
-            for i in range(3):
-                if i in days and club_to_days_used[peer_code][i] > 0:
-                    days.remove(i)
+
+            # Branches without enough votes to run never take up days
+            if peer_code not in club_to_days_used:
+                continue
+
+            for i in week.DAYS_IN[days]:
+                if club_to_days_used[peer_code][i] > 0:
+                    days &= ~(1 << i)
 
     return days
 
@@ -37,16 +53,16 @@ def _day_is_available(club: Club, day: int, club_to_days_used: dict[str, list[in
     and is free for the club's teacher (if it has one).
     """
     return all((
-        (day in club.pre_days),
+        (club.pre_days & (1 << day)),
         (club_to_days_used[club.code][day] < club.max_instances_per_day),
         (club.teacher is None) or (not teacher_to_days_used[club.teacher.name][day])
     ))
 
-def _available_days(school: School, club: Club, club_to_days_used: dict[str, list[int]], teacher_to_days_used: dict[str, list[bool]]) -> set[int]:
+def _available_days(school: School, club: Club, club_to_days_used: dict[str, list[int]], teacher_to_days_used: dict[str, list[bool]]) -> int:
     """
-    Return the available days for the given club.
+    Return the available days for the given club (as a set of days).
     """
-    base = set(filter(lambda day: _day_is_available(club, day, club_to_days_used, teacher_to_days_used), {0, 1, 2}))
+    base = week.mask_of(day for day in week.DAYS_IN[club.pre_days] if _day_is_available(club, day, club_to_days_used, teacher_to_days_used))
     return _filter_split_days(school, club, base, club_to_days_used)
 
 def _tally_block_repulsion_to_club(block: list[Club], club: Club) -> int:
@@ -72,28 +88,26 @@ def _tally_block_mutual_repulsions(blocks: list[Club]) -> list[int]:
     """
     return list(_tally_block_mutual_repulsion(b) for b in blocks)
 
-def _tally_repulsions(club: Club, blocks: list[Club], days: set[int]) -> dict[int, int]:
+def _tally_repulsions(club: Club, blocks: list[Club], days: int) -> dict[int, int]:
     """
-    Return a dictionary mapping days to their repulsion to the given club.
+    Return a dictionary mapping the given days to their repulsion to the given club.
     """
-    return {i: _tally_block_repulsion_to_club(blocks[i], club) for i in days}
+    return {i: _tally_block_repulsion_to_club(blocks[i], club) for i in week.DAYS_IN[days]}
 
 def _copy_blocks(blocks: list[list[Club]]) -> list[list[Club]]:
     """
     Return a deep copy of the given list of blocks.
     """
-    return [blocks[0][:], blocks[1][:], blocks[2][:]]
+    return [block[:] for block in blocks]
 
-def _copy_instances(orig: dict[str, list[set[int]]]) -> dict[str, list[set[int]]]:
+def _copy_instances(orig: dict[str, list[int]]) -> dict[str, list[int]]:
     """
     Return a deep copy of the given dictionary mapping club codes
     to a list of instance day sets.
     """
     new = {}
     for (key, instances) in orig.items():
-        new[key] = []
-        for days in instances:
-            new[key].append(days.copy())
+        new[key] = instances[:]
     return new
 
 def _copy_days_used(orig: dict[str, list[int]]) -> dict[str, list[int]]:
@@ -106,38 +120,297 @@ def _copy_days_used(orig: dict[str, list[int]]) -> dict[str, list[int]]:
         new[key] = inner[:]
     return new
 
-def _get_sets_of_days(days: list[int], n: int) -> Iterator[set[int]]:
+def _get_sets_of_days(days: list[int], n: int) -> list[int]:
     """
-    Yield all sets of size n from days (which is of size 3).
+    Return all sets of size n from days, in order of preference: the days
+    are listed best first, and sets are ordered as their best days are.
     """
-    
-    if n == 3:
-        yield set(days)
+    rank = {day: i for (i, day) in enumerate(days)}
+    sets_of_days = week.subsets_of(week.mask_of(days), n)
+    return sorted(sets_of_days, key=lambda mask: [rank[day] for day in week.DAYS_IN[mask]])
 
-    elif n == 2:
-        for pair in itertools.pairwise(days):
-            yield set(pair)
+def interchangeable_days(school: School, clubs: list[Club]) -> list[int]:
+    """
+    Return the classes of interchangeable days (as sets of days), in order.
 
-    elif n == 1:
-        for day in days:
-            yield {day}
+    Two days are interchangeable if nothing in the problem tells them apart:
+    every club can run on both or neither, every student is available on both
+    or neither, and every preselect forces (or forbids) both or neither.
+    Swapping two such days in any world gives a world that is just as good,
+    so only one of the two needs to be generated.
+    """
+    masks = {c.pre_days for c in clubs}
+    masks.update(s.days_unavailable for s in school.students.values())
+    for preselects in school.preselects.values():
+        for (_, _, forced_days, forced_nondays, _) in preselects:
+            masks.update((forced_days, forced_nondays))
+    masks = sorted(masks)
+
+    # Days with the same membership in every set are interchangeable
+    classes = {}
+    for day in range(week.N_DAYS):
+        column = tuple((mask >> day) & 1 for mask in masks)
+        classes[column] = classes.get(column, 0) | (1 << day)
+
+    return sorted(classes.values(), key=lambda days: week.DAYS_IN[days][0])
+
+def refine_days(classes: list[int], days: int) -> list[int]:
+    """
+    Return the given classes of interchangeable days, split by whether
+    their days are in the given set. Once a club has an instance on some
+    days of a class but not others, those days are no longer interchangeable.
+    """
+    refined = []
+    for days_class in classes:
+        for part in (days_class & days, days_class & ~days):
+            if part:
+                refined.append(part)
+    return refined
+
+def canonical_days(days: int, classes: list[int]) -> int:
+    """
+    Return the canonical set of days among those symmetric to the given one:
+    within each class of interchangeable days, the same number of days,
+    but the earliest ones.
+    """
+    canonical = 0
+    for days_class in classes:
+        for day in week.DAYS_IN[days_class][:week.N_DAYS_IN[days & days_class]]:
+            canonical |= 1 << day
+    return canonical
+
+def n_symmetric_copies(classes: list[int]) -> int:
+    """
+    Return the number of worlds symmetric to each other (at most) given
+    the classes of interchangeable days: the ways of permuting each class.
+    """
+    return math.prod(math.factorial(week.N_DAYS_IN[days_class]) for days_class in classes)
+
+def co_choice_components(school: School, clubs: list[Club], threshold: int=COMPONENT_LINK_THRESHOLD) -> list[list[Club]]:
+    """
+    Return the connected components of the co-choice graph of the given
+    clubs, as lists of clubs (in their given order).
+
+    Two clubs are linked if their repulsion is above the threshold, if they
+    share a teacher, or if they are branches of a split that must run on
+    separate days. Nothing else makes where one club runs change where
+    another should, so clubs in different components can be placed on days
+    independently of each other.
+
+    Components are in the order their clubs are placed in the search:
+    by their most repulsive club, descending.
+    """
+    index = {c.code: i for (i, c) in enumerate(clubs)}
+    parents = list(range(len(clubs)))
+
+    def _find(i: int) -> int:
+        """Return the root of the given club's component, halving the path."""
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    def _link(i: int, j: int) -> None:
+        """Join the given clubs' components."""
+        parents[_find(i)] = _find(j)
+
+    # Repulsion
+    for (i, a) in enumerate(clubs):
+        for j in range(i + 1, len(clubs)):
+            if a.repulsion(clubs[j]) > threshold:
+                _link(i, j)
+
+    # Teachers
+    teachers = {}
+    for (i, c) in enumerate(clubs):
+        if c.teacher is not None:
+            _link(i, teachers.setdefault(c.teacher.name, i))
+
+    # Splits to separate days
+    for (i, c) in enumerate(clubs):
+        for other_code in school.splits_to_separate_days.get(c.code, {}):
+            for peer_code in school.get_all_split_codes(other_code):
+                if peer_code in index:
+                    _link(i, index[peer_code])
+
+    components = {}
+    for i in sorted(range(len(clubs)), key=lambda i: -clubs[i].total_repulsion):
+        components.setdefault(_find(i), [])
+    for (i, c) in enumerate(clubs):
+        components[_find(i)].append(c)
+    return list(components.values())
+
+class _Cached:
+    """
+    The items of an iterator, taken from it as they are first needed and
+    kept, so that they can be gone over again.
+    """
+    __slots__ = ('iterator', 'items')
+
+    iterator: Iterator[object]
+    items: list[object]
+
+    def __init__(self: _Cached, iterable: Iterator[object]) -> None:
+        """Keep the given iterable's iterator, with no items taken yet."""
+        self.iterator = iter(iterable)
+        self.items = []
+
+    def has(self: _Cached, i: int) -> bool:
+        """
+        Return True iff there is an item at the given position, taking
+        items up to it if needed.
+        """
+        while len(self.items) <= i:
+            try:
+                self.items.append(next(self.iterator))
+            except StopIteration:
+                return False
+        return True
+
+    def first(self: _Cached) -> object|None:
+        """Return the first item, or None if there are none."""
+        return self.items[0] if self.has(0) else None
+
+def interleaved_product(iterables: list[Iterator[object]]) -> Iterator[tuple[object]]:
+    """
+    Yield the tuples of the product of the given iterables, consuming each
+    lazily, in order of the sum of their items' positions: first the tuple
+    of their first items, then those with one second item, then those with
+    one third item or two second items, and so on. Unlike itertools.product,
+    every iterable varies early on, rather than only the last ones.
+    """
+    cached = [iterable if isinstance(iterable, _Cached) else _Cached(iterable) for iterable in iterables]
+    if not cached:
+        return
+
+    def _positions(j: int, left: int) -> Iterator[tuple[int]]:
+        """
+        Yield the positions in the iterables from j on that sum to left.
+        """
+        if j == len(cached) - 1:
+            if cached[j].has(left):
+                yield (left,)
+            return
+
+        i = 0
+        while (i <= left) and cached[j].has(i):
+            for rest in _positions(j + 1, left - i):
+                yield (i, *rest)
+            i += 1
+
+    # Once no tuple has a given sum, none has a greater one
+    for total in itertools.count():
+        found = False
+        for positions in _positions(0, total):
+            found = True
+            yield tuple(c.items[i] for (c, i) in zip(cached, positions))
+        if not found:
+            return
 
 # The real deal
 
-def generate_worlds(school: School, clubs: list[Club], n_to_yield: int) -> Iterator[int]:
+def generate_layouts(school: School, clubs: list[Club], symmetry: bool=True, prefix: tuple[int]=(), decompose: bool=True) -> Iterator[dict[str, list[int]]]:
     """
-    Distribute up to n_to_yield worlds after distributing the given clubs.
-    A world is a distribution of clubs (specifically, club instances) to days.
+    Yield layouts for the given clubs. A layout is a dictionary mapping club
+    codes to a list of the sets of days of their instances: a distribution
+    of clubs (specifically, club instances) to days, before it is created.
+
+    Layouts are found by a depth-first search, placing one instance of a club
+    at a time on the least repulsive days, and branching on equally good sets
+    of days. With symmetry, sets of days that only differ by a swap of
+    interchangeable days (see interchangeable_days) are only taken once,
+    so no two layouts yielded are the same up to such a swap.
+
+    With decompose, the clubs are split into independent components (see
+    co_choice_components), each searched on its own, and their layouts
+    combined as an interleaved product (see interleaved_product): the search
+    space shrinks from the product of the components' trees to the product
+    of their leaves, and the first layouts already vary in every component.
+    Symmetry is only broken in the first component, since once its days are
+    chosen, the others' are no longer interchangeable.
+
+    Given a prefix (see generate_prefixes), only the layouts in the subtree
+    of the search that starts with it are yielded. With decompose, it is a
+    prefix of the first component's search.
+
+    The clubs are not changed. Layouts yielded must not be changed either.
+    """
+    components = co_choice_components(school, clubs) if decompose else [clubs]
+    if len(components) == 1:
+        for (_, layout) in _search(school, clubs, symmetry, prefix, None):
+            yield layout
+        return
+
+    (first, others) = _component_searches(school, clubs, components, symmetry, prefix, None)
+    for layouts in interleaved_product([(layout for (_, layout) in first), *others]):
+        combined = {}
+        for layout in layouts:
+            combined.update(layout)
+        yield combined
+
+def generate_prefixes(school: School, clubs: list[Club], depth: int, symmetry: bool=True, decompose: bool=True, root: tuple[int]=()) -> Iterator[tuple[int]]:
+    """
+    Yield the prefixes of the search for layouts at the given depth, in the
+    order the search would reach them: the sets of days chosen for the first
+    depth club instances placed along each path. (Paths that are shorter,
+    because there are fewer instances to place, are yielded whole.)
 
-    N.B. The actual data yielded is only the number of worlds created so far.
-    The clubs are changed in-place by creating the distributed instances,
-    and MUST be reset before the iterator is advanced to function properly.
+    The subtrees under these prefixes partition the search: each layout
+    is in exactly one of them (see generate_layouts). With decompose, they
+    are prefixes of the first component's search, and partition it.
+
+    Given a root prefix, only the prefixes that start with it are yielded,
+    and none shorter than it (if it is a whole path, it is the only one).
+    """
+    depth = max(depth, len(root))
+    components = co_choice_components(school, clubs) if decompose else [clubs]
+    if len(components) == 1:
+        search = _search(school, clubs, symmetry, root, depth)
+    else:
+        (search, _) = _component_searches(school, clubs, components, symmetry, root, depth)
+
+    for (path, _) in search:
+        yield path
+
+def _component_searches(school: School, clubs: list[Club], components: list[list[Club]], symmetry: bool, prefix: tuple[int], depth: int|None) -> tuple[Iterator[tuple[tuple[int], dict[str, list[int]]]], list[_Cached]]:
+    """
+    Return the searches of the given components of the clubs (see
+    generate_layouts): the first one's, following the prefix to the depth,
+    for (path, layout) tuples, and a list of the others', for layouts.
+
+    With symmetry, the first component is searched with the classes of
+    interchangeable days of all the clubs, refined by the foreknown instances
+    of the other components (which are the same in every one of their
+    layouts); the others are searched without symmetry.
+    """
+    others = [_Cached(layout for (_, layout) in _search(school, component, False, (), None)) for component in components[1:]]
+
+    day_classes = None
+    if symmetry:
+        day_classes = interchangeable_days(school, clubs)
+        for (component, layouts) in zip(components[1:], others):
+            first = layouts.first()
+            if first is None:
+                break
+            for c in component:
+                if c.instances_are_foreknown():
+                    for days in first[c.code]:
+                        day_classes = refine_days(day_classes, days)
+
+    return (_search(school, components[0], symmetry, prefix, depth, day_classes), others)
+
+def _search(school: School, clubs: list[Club], symmetry: bool, prefix: tuple[int], depth: int|None, day_classes: list[int]|None=None) -> Iterator[tuple[tuple[int], dict[str, list[int]]]]:
+    """
+    Yield (path, layout) tuples for the given clubs. See generate_layouts.
+
+    A path is the sequence of sets of days chosen for each distributable club
+    instance, in the order they are placed. The search follows the given
+    prefix of a path before branching; given a depth, it stops there
+    and yields paths (and partial layouts) of that length.
 
-    Hence, a "phantom" representation is kept of the instances to be created
-    at the end of each path. When yielding, these instances are created
-    on the fly, but the phantom copy remains until all base cases are reached.
+    With symmetry, the given classes of interchangeable days are used,
+    or else those of the clubs (see interchangeable_days).
     """
-    clubs_ = clubs[:]
 
     def _place_foreknown_instances(c: Club) -> bool:
         """
@@ -158,15 +431,16 @@ def generate_worlds(school: School, clubs: list[Club], n_to_yield: int) -> Itera
             if not available_days:
                 print(c, c.code, 'bad')
 
-            actual_days = set()
+            actual_days = 0
             for __ in range(c.days_per_instance):
 
                 # Choose the one with the least days used so far
-                i = min(available_days, key=lambda i: club_to_days_used[c.code][i])
-                actual_days.add(i)
-                available_days.remove(i)
+                i = min(week.DAYS_IN[available_days], key=lambda i: club_to_days_used[c.code][i])
+                actual_days |= 1 << i
+                available_days &= ~(1 << i)
             
-            _create_phantom_instance(c, actual_days, club_to_instances, club_to_days_used, teacher_to_days_used)
+            _create_phantom_instance(c, actual_days, blocks, club_to_instances, club_to_days_used, teacher_to_days_used)
+            day_classes[:] = refine_days(day_classes, actual_days)
         return True
 
     def _get_best_days(club: Club, blocks: list[list[Club]], club_to_days_used: dict[str, list[int]], teacher_to_days_used: dict[str, list[bool]]) -> list[int]:
@@ -174,38 +448,34 @@ def generate_worlds(school: School, clubs: list[Club], n_to_yield: int) -> Itera
         Return the day or days that have the least repulsion for the given club
         considering the given blocks of clubs distributed so far.
         """
-    
-        # If all 3 days are needed, short-circuit
-        if club.days_per_instance == 3:
-            return [0, 1, 2]
+        n = club.days_per_instance
+
+        # If all days are needed, short-circuit
+        if n >= week.N_DAYS:
+            return list(range(week.N_DAYS))
 
         # Get available days, tally repulsions, sort by repulsions
         available = _available_days(school, club, club_to_days_used, teacher_to_days_used)
         repulsions = _tally_repulsions(club, blocks, available)
         order = sorted(repulsions, key=repulsions.get)
         
-        # If 2 days are needed, take the first 2
-        if (club.days_per_instance == 2):
-            viable = order[:2]
-
-            # If 2+3 would make as good a pair as 1+2, add that option
-            if (len(order) > 2):
-                sum_first_two = (repulsions[order[0]] + repulsions[order[1]]) // REPULSION_SMOOTHING
-                sum_last_two = (repulsions[order[1]] + repulsions[order[2]]) // REPULSION_SMOOTHING
-                if sum_first_two == sum_last_two:
-                    viable.append(order[2])
-        
-        # If only 1 day is needed, add all options that are at the minimum
-        else:
-            viable = list(filter(lambda i: (repulsions[i] // REPULSION_SMOOTHING) == (repulsions[order[0]] // REPULSION_SMOOTHING), order))
+        # Take the n best days, and add any other day that would make as
+        # good a set if it replaced the best one (for 1 day, that's any day
+        # at the minimum; for 2, 2+3 being as good a pair as 1+2)
+        viable = order[:n]
+        if len(order) > n:
+            best_sum = sum(repulsions[i] for i in viable)
+            for i in order[n:]:
+                if ((best_sum - repulsions[order[0]] + repulsions[i]) // REPULSION_SMOOTHING) == (best_sum // REPULSION_SMOOTHING):
+                    viable.append(i)
 
         # Shuffle viable options, then sort by which have the fewest instances
         random.shuffle(viable)
-        viable.sort(key=lambda i: c.days_used_counts.get(i, 0))
+        viable.sort(key=lambda i: club_to_days_used[club.code][i])
 
         return viable
 
-    def _create_phantom_instance(club: Club, days: set[int], club_to_instances: dict[str, list[set[int]]], club_to_days_used: dict[str, list[int]], teacher_to_days_used: dict[str, list[bool]]) -> None:
+    def _create_phantom_instance(club: Club, days: int, blocks: list[list[Club]], club_to_instances: dict[str, list[int]], club_to_days_used: dict[str, list[int]], teacher_to_days_used: dict[str, list[bool]]) -> None:
         """
         Create a phantom instance for the given club on the given days.
         Tally it in the dictionary of clubs to instances, tally its days
@@ -213,69 +483,85 @@ def generate_worlds(school: School, clubs: list[Club], n_to_yield: int) -> Itera
         mark the day used. Add it to the list of blocks for repulsion tallying.
         """
         club_to_instances[club.code].append(days)
-        for day in days:
+        for day in week.DAYS_IN[days]:
             blocks[day].append(club)
 
             club_to_days_used[club.code][day] += 1
             if club.teacher is not None:
                 teacher_to_days_used[club.teacher.name][day] = True
 
-    def _create_real_instances(club_to_instances: dict[str, list[set[int]]]) -> None:
-        """
-        For each club in the given dict, create a new instance from each
-        of its sets of days. This amounts to distributing it to those days.
-        """
-        for club_ in clubs_:
-            for days_ in club_to_instances[club_.code]:
-                club_.create_instance(days_)
-
-    def _take_path(clubs: list[Club], blocks: list[list[Club]], club_to_instances: dict[str, list[set[int]]], club_to_days_used: dict[str, list[int]], teacher_to_days_used: dict[str, list[bool]]) -> Iterator[None]:
+    def _take_path(path: tuple[int], clubs: list[Club], blocks: list[list[Club]], club_to_instances: dict[str, list[int]], club_to_days_used: dict[str, list[int]], teacher_to_days_used: dict[str, list[bool]], day_classes: list[int]) -> Iterator[tuple[tuple[int], dict[str, list[int]]]]:
         """
         Recursively distribute each of the given clubs to days. This means
         identifying the best (least repulsive) days, dividing them into sets
         of a size equal to what the club needs for an instance, and creating
         a phantom instance using those days. Once all clubs have their phantom
-        instances, create the real instances and yield the option.
+        instances (or the path is as deep as asked), yield the path and layout.
+
+        Along the prefix, the set of days it has for each club is taken
+        instead of branching.
+
+        Days in the same class are still interchangeable given the instances
+        placed so far, so only the canonical set of days is taken among sets
+        that are symmetric to each other.
         """
 
-        # Are there still clubs to distribute?
-        if clubs:
+        # Are there still clubs to distribute (at this depth)?
+        if clubs and ((depth is None) or (len(path) < depth)):
             club = clubs[0]
 
             # Get the best (least repulsive) days and break them into sets
-            best_days = _get_best_days(club, blocks, club_to_days_used, teacher_to_days_used)
+            if len(path) < len(prefix):
+                sets_of_days = [prefix[len(path)]]
+            else:
+                best_days = _get_best_days(club, blocks, club_to_days_used, teacher_to_days_used)
+                sets_of_days = _get_sets_of_days(best_days, club.days_per_instance)
+            taken = set()
 
             # For each equivalent distribution in terms of repulsion...
-            for days in _get_sets_of_days(best_days, club.days_per_instance):
+            for days in sets_of_days:
+
+                # ...that is not a symmetric duplicate of one already taken
+                days = canonical_days(days, day_classes)
+                if days in taken:
+                    if INSTRUMENTATION.enabled:
+                        INSTRUMENTATION.event('symmetric duplicates skipped')
+                    continue
+                taken.add(days)
 
                 # Make copies for the next branch of the path
+                new_blocks = _copy_blocks(blocks)
                 new_club_to_instances = _copy_instances(club_to_instances)
                 new_club_to_days_used = _copy_days_used(club_to_days_used)
                 new_teacher_to_days_used = _copy_days_used(teacher_to_days_used)
 
                 # Create a phantom instance using those days
-                _create_phantom_instance(club, days, new_club_to_instances, new_club_to_days_used, new_teacher_to_days_used)
+                _create_phantom_instance(club, days, new_blocks, new_club_to_instances, new_club_to_days_used, new_teacher_to_days_used)
                 
                 # Continue for the remaining days
-                for path in _take_path(clubs[1:], _copy_blocks(blocks), new_club_to_instances, new_club_to_days_used, new_teacher_to_days_used):
-                    yield path
+                yield from _take_path(path + (days,), clubs[1:], new_blocks, new_club_to_instances, new_club_to_days_used, new_teacher_to_days_used, refine_days(day_classes, days))
         
         # No, they have all been distributed; end of the path
         else:
-            _create_real_instances(club_to_instances)
             # print(_tally_block_mutual_repulsions(blocks)) # Debugging
-            yield None
+            yield (path, club_to_instances)
 
     # Prepare the records of phantom instances
 
     club_to_instances = {c.code: [] for c in clubs}
-    club_to_days_used = {c.code: [0, 0, 0] for c in clubs}
-    teacher_to_days_used = {c.teacher.name: [False, False, False] for c in clubs if c.teacher is not None}
+    club_to_days_used = {c.code: [0] * week.N_DAYS for c in clubs}
+    teacher_to_days_used = {c.teacher.name: [False] * week.N_DAYS for c in clubs if c.teacher is not None}
 
-    # Prepare the lists used to track repulsions and progress
+    # Prepare the lists used to track repulsions, progress, and symmetry
 
-    blocks = [[], [], []]
+    blocks = [[] for _ in range(week.N_DAYS)]
     clubs_free = []
+    if not symmetry:
+        day_classes = [1 << day for day in range(week.N_DAYS)]
+    elif day_classes is None:
+        day_classes = interchangeable_days(school, clubs)
+    else:
+        day_classes = day_classes[:]
 
     # Distinguish foreknown instances from distributable clubs
 
@@ -290,14 +576,177 @@ def generate_worlds(school: School, clubs: list[Club], n_to_yield: int) -> Itera
 
     # Sort the free clubs by total repulsion factor (descending)
 
-    clubs_free.sort(key=lambda c: -c.repulsions['_total'])
+    clubs_free.sort(key=lambda c: -c.total_repulsion)
+
+    # Take all the possible paths
+    
+    yield from _take_path((), clubs_free, blocks, club_to_instances, club_to_days_used, teacher_to_days_used, day_classes)
+
+def foreknown_layout(school: School, clubs: list[Club]) -> dict[str, list[int]]:
+    """
+    Return the layout of the given clubs' foreknown instances (see
+    Club.instances_are_foreknown), placed as the search places them before
+    any other; the other clubs have no instances in it.
+    """
+    for (_, layout) in _search(school, clubs, False, (), 0):
+        return layout
+
+def layout_path(school: School, clubs: list[Club], layout: dict[str, list[int]], symmetry: bool=True, decompose: bool=True) -> tuple[int]:
+    """
+    Return the path of the search (see _search) to the given layout, for use
+    as a prefix: the sets of days of its instances of free clubs, in the
+    order the search places them. Its foreknown instances must be placed as
+    the search places them (see foreknown_layout). With decompose, it is the
+    path of the first component's search (see generate_layouts).
+
+    With symmetry, where the search would take a canonical set of days
+    instead (see canonical_days), the days of the rest of the path are
+    swapped to match, so the path leads to a layout symmetric to the given one.
+    """
+    components = co_choice_components(school, clubs) if decompose else [clubs]
+    clubs_free = [c for c in components[0] if not c.instances_are_foreknown() for _ in range(c.min_instances)]
+    clubs_free.sort(key=lambda c: -c.total_repulsion)
 
-    # Take all the possible paths and yield the number yielded so far
+    path = []
+    n_taken = {}
+    for c in clubs_free:
+        i = n_taken.get(c.code, 0)
+        n_taken[c.code] = i + 1
+        path.append(layout[c.code][i])
+
+    if not symmetry:
+        return tuple(path)
+
+    day_classes = interchangeable_days(school, clubs)
+    for c in clubs:
+        if c.instances_are_foreknown():
+            for days in layout[c.code]:
+                day_classes = refine_days(day_classes, days)
+
+    # Swap days within their classes so that each set of days is canonical,
+    # and carry the swaps over to the rest of the path
+    swapped = list(range(week.N_DAYS))
+    canonical_path = []
+    for days in path:
+        days = week.mask_of(swapped[day] for day in week.DAYS_IN[days])
+        swap = list(range(week.N_DAYS))
+        for days_class in day_classes:
+            members = week.DAYS_IN[days_class]
+            order = [day for day in members if days & (1 << day)] + [day for day in members if not days & (1 << day)]
+            for (day, to) in zip(order, members):
+                swap[day] = to
+        swapped = [swap[day] for day in swapped]
+
+        days = canonical_days(days, day_classes)
+        canonical_path.append(days)
+        day_classes = refine_days(day_classes, days)
+
+    return tuple(canonical_path)
+
+def layout_signature(layout: dict[str, list[int]]) -> tuple[tuple[str, tuple[int]]]:
+    """
+    Return the canonical signature of the given layout: for each club code
+    (in order), the sorted sets of days of its instances. Layouts that only
+    differ in the order their instances were placed have the same signature.
+    """
+    return tuple((code, tuple(sorted(sets_of_days))) for (code, sets_of_days) in sorted(layout.items()))
+
+class WorldSignatures:
+    """
+    The signatures of the worlds seen so far (see layout_signature),
+    and how many duplicates of them have been seen since.
+    """
+    __slots__ = ('seen', 'n_duplicates')
+
+    seen: set[tuple[tuple[str, tuple[int]]]]
+    n_duplicates: int
+
+    def __init__(self: WorldSignatures) -> None:
+        """Start with no signatures seen."""
+        self.seen = set()
+        self.n_duplicates = 0
+
+    def add(self: WorldSignatures, signature: tuple[tuple[str, tuple[int]]]) -> bool:
+        """
+        Add the given signature. Return True iff it had not been seen before;
+        otherwise, count it as a duplicate.
+        """
+        if signature in self.seen:
+            self.n_duplicates += 1
+            return False
 
+        self.seen.add(signature)
+        return True
+
+def generate_worlds(school: School, clubs: list[Club], n_to_yield: int, symmetry: bool=True, signatures: WorldSignatures|None=None, prefix: tuple[int]=()) -> Iterator[int]:
+    """
+    Distribute up to n_to_yield worlds after distributing the given clubs.
+    A world is a distribution of clubs (specifically, club instances) to days.
+
+    N.B. The actual data yielded is only the number of worlds created so far.
+    The clubs are changed in-place by creating the distributed instances,
+    and MUST be reset before the iterator is advanced to function properly.
+
+    Each world is created from a layout (see generate_layouts); with symmetry,
+    no two worlds are the same up to swapping interchangeable days. Given
+    signatures, worlds already seen are skipped (and counted as duplicates)
+    rather than yielded, so they do not count towards n_to_yield.
+
+    Given a prefix, only the worlds in its subtree of the search are created.
+    """
     n = 0
-    for _ in _take_path(clubs_free, _copy_blocks(blocks), _copy_instances(club_to_instances), _copy_days_used(club_to_days_used), _copy_days_used(teacher_to_days_used)):
-        if n < n_to_yield:
-            n += 1
-            yield n
-        else:
+    for layout in generate_layouts(school, clubs, symmetry, prefix):
+        if n >= n_to_yield:
             return
+
+        if (signatures is not None) and (not signatures.add(layout_signature(layout))):
+            continue
+
+        create_layout(clubs, layout)
+
+        n += 1
+        yield n
+
+def create_layout(clubs: list[Club], layout: dict[str, list[int]]) -> None:
+    """
+    Create the given layout: a new instance of each club on each of its
+    sets of days. The clubs must have been reset.
+    """
+    for club in clubs:
+        for days in layout[club.code]:
+            club.create_instance(days)
+
+def count_layouts(school: School, clubs: list[Club], limit: int, symmetry: bool=True) -> int:
+    """
+    Return the number of layouts for the given clubs, counting up to limit.
+    The random state is restored afterwards, so counting does not change
+    which worlds are generated next.
+    """
+    state = random.getstate()
+    try:
+        return sum(1 for _ in itertools.islice(generate_layouts(school, clubs, symmetry), limit))
+    finally:
+        random.setstate(state)
+
+def describe_search_space(school: School, clubs: list[Club], limit: int=SEARCH_SPACE_COUNT_LIMIT) -> str:
+    """
+    Return a description of the search space of worlds for the given clubs:
+    the independent components of clubs, the classes of interchangeable days,
+    and the numbers of worlds with and without symmetric duplicates (counted
+    up to limit).
+    """
+    classes = interchangeable_days(school, clubs)
+    interchangeable = [week.letters_of(days_class) for days_class in classes if week.N_DAYS_IN[days_class] > 1]
+    n_components = len(co_choice_components(school, clubs))
+    components = f'{n_components} independent components of clubs; ' if n_components > 1 else ''
+
+    def _count(symmetry: bool) -> str:
+        n = count_layouts(school, clubs, limit, symmetry)
+        return f'{n:,}' if n < limit else f'{limit:,}+'
+
+    if not interchangeable:
+        return f'World search: {components}no interchangeable days; {_count(True)} worlds'
+
+    return (f'World search: {components}days {", ".join(interchangeable)} interchangeable '
+            f'(up to {n_symmetric_copies(classes):,} symmetric copies of each world); '
+            f'{_count(True)} distinct worlds of {_count(False)}')